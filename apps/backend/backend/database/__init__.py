@@ -14,7 +14,7 @@ if not path.exists(AACessTalkConfig.database_dir_path):
     makedirs(AACessTalkConfig.database_dir_path)
 
 engine = create_database_engine(
-    AACessTalkConfig.database_file_path,
+    AACessTalkConfig.database_url or AACessTalkConfig.database_file_path,
     # verbose=True
 )
 
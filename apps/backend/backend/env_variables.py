@@ -2,4 +2,8 @@ AUTH_SECRET="AUTH_SECRET"
 ADMIN_ID="ADMIN_ID"
 ADMIN_HASHED_PASSWORD="ADMIN_HASHED_PASSWORD"
 SUPPORT_KOREAN="SUPPORT_KOREAN"
-USE_KAAC="USE_KAAC"
\ No newline at end of file
+USE_KAAC="USE_KAAC"
+SESSION_REGISTRY="SESSION_REGISTRY"
+SESSION_REGISTRY_MAX_SESSIONS="SESSION_REGISTRY_MAX_SESSIONS"
+SESSION_IDLE_TIMEOUT_SEC="SESSION_IDLE_TIMEOUT_SEC"
+SESSION_SWEEP_INTERVAL_SEC="SESSION_SWEEP_INTERVAL_SEC"
\ No newline at end of file
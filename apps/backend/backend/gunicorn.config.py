@@ -1,5 +1,14 @@
+import os
+
 bind = "0.0.0.0:3000"
-workers = 1
+
+# Moderator sessions are resident in a worker process by default (SESSION_REGISTRY=local).
+# With more than one worker, either route all requests of a session to the same worker (sticky routing by session id
+# at the reverse proxy, with one gunicorn instance per upstream), or let every worker restore sessions from the
+# database on each request (SESSION_REGISTRY=shared), which is the default when BACKEND_WORKERS > 1.
+workers = int(os.getenv("BACKEND_WORKERS", "1"))
+if workers > 1:
+    os.environ.setdefault("SESSION_REGISTRY", "shared")
 proc_name = "aacesstalk_backend"
 reload = False
 worker_class = "uvicorn.workers.UvicornWorker"
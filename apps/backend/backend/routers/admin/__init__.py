@@ -1,8 +1,9 @@
 from fastapi import APIRouter
-from . import auth, dyads, data
+from . import auth, dyads, data, monitoring
 
 router = APIRouter()
 
 router.include_router(auth.router, prefix='/auth')
 router.include_router(dyads.router, prefix="/dyads")
-router.include_router(data.router, prefix="/data")
\ No newline at end of file
+router.include_router(data.router, prefix="/data")
+router.include_router(monitoring.router, prefix="/monitoring")
\ No newline at end of file
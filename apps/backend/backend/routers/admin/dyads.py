@@ -15,7 +15,7 @@ from backend.crud.media import get_free_topic_image, process_uploaded_image
 from backend.database import with_db_session
 from backend.database.models import DyadLoginCode
 from backend.routers.admin.common import check_admin_credential
-from backend.routers.dyad.common import get_user_storage_with_id
+from backend.routers.dyad.common import dispose_session_instance, get_user_storage_with_id, invalidate_signed_in_dyad_cache
 from py_core.config import AACessTalkConfig
 from py_database.model import FreeTopicDetailORM
 from chatlib.utils.time import get_timestamp
@@ -68,6 +68,7 @@ async def update_dyad(dyad_id: str, update: DyadUpdateArgs, db: Annotated[AsyncS
             db.add(dyad)
             await db.commit()
             await db.refresh(dyad)
+            invalidate_signed_in_dyad_cache(dyad_id)
             return dyad
 
 class DyadCreateArgs(BaseModel):
@@ -165,6 +166,7 @@ async def _delete_session(dyad_id: str, session_id: str, db: Annotated[AsyncSess
     session = await db.get(SessionORM, session_id)
     if session is not None:
         print("Delete session")
+        await dispose_session_instance(session_id)
         await db.delete(session)
         await db.commit()
 
@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends
+from py_core.utils.embedding_service import embedding_service_metrics
+from py_core.utils.llm_scheduler import llm_scheduler
+from py_core.utils.response_cache import response_cache_metrics
+from py_core.utils.task_supervisor import TaskSupervisor
+from py_core.utils.translate.translation_memory import translation_memory
+
+from backend.routers.admin.common import check_admin_credential
+from backend.routers.dyad.common import session_registry
+
+
+router = APIRouter(dependencies=[Depends(check_admin_credential)])
+
+
+@router.get("/sessions")
+async def _get_session_registry_metrics() -> dict[str, int]:
+    return session_registry.metrics()
+
+
+@router.get("/tasks")
+async def _get_task_metrics() -> dict[str, int]:
+    return TaskSupervisor.global_metrics()
+
+
+@router.get("/llm")
+async def _get_llm_scheduler_metrics() -> dict:
+    return llm_scheduler().metrics()
+
+
+@router.get("/response_cache")
+async def _get_response_cache_metrics() -> dict[str, dict[str, int | float]]:
+    return response_cache_metrics()
+
+
+@router.get("/translation_memory")
+async def _get_translation_memory_metrics() -> dict[str, dict[str, int | float]]:
+    return translation_memory().metrics()
+
+
+@router.get("/embeddings")
+async def _get_embedding_service_metrics() -> dict[str, dict[str, int]]:
+    return embedding_service_metrics()
@@ -1,4 +1,5 @@
 from functools import lru_cache
+from time import monotonic, time
 from typing import Annotated
 
 from fastapi import Depends, HTTPException, status
@@ -7,7 +8,7 @@ from pydantic import BaseModel
 
 from backend import env_variables
 from backend.crud.dyad.account import get_dyad_by_id
-from backend.database import with_db_session, AsyncSession, db_sessionmaker
+from backend.database import AsyncSession, db_sessionmaker
 from py_database.model import DyadORM, SessionORM as SessionORM
 import jwt
 from chatlib.utils.env_helper import get_env_variable
@@ -19,7 +20,9 @@ from py_database import SQLSessionStorage, SQLUserStorage
 from py_core.system.moderator import ModeratorSession
 from py_core.system.storage import UserStorage
 from py_core.system.task.card_image_matching.card_image_matcher import CardImageMatcher 
-from py_core.system.model import Dyad, SessionTopicInfo, id_generator
+from py_core.system.model import ChildCardRecommendationResult, Dyad, SessionTopicInfo
+from backend.session_registry import SessionRegistry, make_session_registry
+from py_database.model import ChildCardRecommendationResultORM
 
 
 class FreeTopicDetailInfo(BaseModel):
@@ -29,7 +32,45 @@ class FreeTopicDetailInfo(BaseModel):
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
-async def get_signed_in_dyad_orm(token: Annotated[str, Depends(oauth2_scheme)], db: Annotated[AsyncSession, Depends(with_db_session)]) -> DyadORM:
+# A single child action issues several requests in a burst, so the decoded token and the dyad are kept briefly.
+SIGNED_IN_DYAD_CACHE_TTL_SEC = 60
+SIGNED_IN_DYAD_CACHE_MAX_SIZE = 1000
+
+# token -> (dyad snapshot, expiry on the monotonic clock)
+_signed_in_dyad_cache: dict[str, tuple[DyadORM, float]] = {}
+
+def invalidate_signed_in_dyad_cache(dyad_id: str | None = None):
+    """Drop the cached dyads of the id, or all of them if no id is given. Call this when a dyad is modified."""
+    if dyad_id is None:
+        _signed_in_dyad_cache.clear()
+    else:
+        for token in [token for token, (dyad, _) in _signed_in_dyad_cache.items() if dyad.id == dyad_id]:
+            _signed_in_dyad_cache.pop(token, None)
+
+def _cache_signed_in_dyad(token: str, dyad: DyadORM, token_expiry: float | None):
+    now = monotonic()
+    if len(_signed_in_dyad_cache) >= SIGNED_IN_DYAD_CACHE_MAX_SIZE:
+        for expired_token in [t for t, (_, expiry) in _signed_in_dyad_cache.items() if expiry <= now]:
+            _signed_in_dyad_cache.pop(expired_token, None)
+        if len(_signed_in_dyad_cache) >= SIGNED_IN_DYAD_CACHE_MAX_SIZE:
+            _signed_in_dyad_cache.pop(next(iter(_signed_in_dyad_cache)))
+
+    expiry = now + SIGNED_IN_DYAD_CACHE_TTL_SEC
+    if token_expiry is not None:
+        # Never outlive the token itself.
+        expiry = min(expiry, now + (token_expiry - time()))
+    _signed_in_dyad_cache[token] = (DyadORM(**dyad.model_dump()), expiry)
+
+async def get_signed_in_dyad_orm(token: Annotated[str, Depends(oauth2_scheme)]) -> DyadORM:
+    cached = _signed_in_dyad_cache.get(token)
+    if cached is not None:
+        dyad, expiry = cached
+        if expiry > monotonic():
+            # Return a copy so that a request cannot alter the shared snapshot.
+            return DyadORM(**dyad.model_dump())
+        else:
+            _signed_in_dyad_cache.pop(token, None)
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -46,15 +87,17 @@ async def get_signed_in_dyad_orm(token: Annotated[str, Depends(oauth2_scheme)],
         print(ex)
         raise credentials_exception
 
-    dyad = await get_dyad_by_id(dyad_id, db)
+    async with db_sessionmaker() as db:
+        dyad = await get_dyad_by_id(dyad_id, db)
 
     if dyad is None:
         raise credentials_exception
     else:
+        _cache_signed_in_dyad(token, dyad, payload.get("exp"))
         return dyad
 
 
-sessions: dict[str, ModeratorSession] = {}
+session_registry: SessionRegistry = make_session_registry()
 
 SQLSessionStorage.set_session_maker(db_sessionmaker)
 SQLUserStorage.set_session_maker(db_sessionmaker)
@@ -74,21 +117,23 @@ def get_user_storage(dyad_orm: Annotated[DyadORM, Depends(get_signed_in_dyad_orm
     return get_user_storage_with_id(dyad_orm.id)
             
 async def create_moderator_session(dyad: Dyad, topic: SessionTopicInfo, timezone: str) -> ModeratorSession:
-    return await ModeratorSession.create(dyad, topic, timezone, SQLSessionStorage(id_generator()))
+    return await session_registry.create(dyad, topic, timezone)
 
 async def retrieve_moderator_session(session_id: str, dyad_orm: Annotated[DyadORM, Depends(get_signed_in_dyad_orm)]):
-    print("Retrieve moderator session...")
-    if session_id in sessions:
-        session = sessions[session_id]
-        session.storage = await SQLSessionStorage.restore_instance(session_id)
-        return session
-    else:
-        storage = await SQLSessionStorage.restore_instance(session_id)
-        session = await ModeratorSession.restore_instance(dyad_orm.to_data_model(), storage)
-        sessions[session_id] = session
-        return session
+    session = await session_registry.retrieve(session_id, dyad_orm.to_data_model())
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No such session.")
+    return session
+
+async def find_card_recommendation_result(recommendation_id: str, dyad_id: str, db: AsyncSession) -> ChildCardRecommendationResult | None:
+    # Recent recommendations may still be in the write-behind queue of a resident session.
+    for session in session_registry.resident_sessions(dyad_id):
+        result = await session.storage.get_card_recommendation_result(recommendation_id)
+        if result is not None:
+            return result
+
+    orm = await db.get(ChildCardRecommendationResultORM, recommendation_id)
+    return orm.to_data_model() if orm is not None else None
 
 async def dispose_session_instance(session_id: str):
-    if session_id in sessions:
-        await sessions[session_id].storage.dispose()
-        sessions.__delitem__(session_id)
\ No newline at end of file
+    await session_registry.dispose(session_id)
@@ -8,7 +8,7 @@ from pydantic import BaseModel
 from backend.crud.media import get_free_topic_image
 from backend.database import with_db_session
 from py_database.database import AsyncSession
-from py_database.model import DyadORM, ChildCardRecommendationResultORM
+from py_database.model import DyadORM
 from sqlmodel import select
 from py_core.utils.speech import ClovaVoice, ClovaVoiceParams
 from py_core.utils.speech.dashscope_audio import DashscopeQwenTTS
@@ -16,7 +16,7 @@ from py_core.system.task.card_image_matching import CardType, CardImageMatcher,
 from py_core.system.storage import UserStorage
 from py_core.config import AACessTalkConfig
 
-from backend.routers.dyad.common import get_card_image_matcher, get_signed_in_dyad_orm, get_user_storage
+from backend.routers.dyad.common import find_card_recommendation_result, get_card_image_matcher, get_signed_in_dyad_orm, get_user_storage
 from backend.routers.errors import ErrorType
 
 
@@ -31,9 +31,8 @@ async def get_voiceover(
     dyad_orm: Annotated[DyadORM, Depends(get_signed_in_dyad_orm)],
     db: Annotated[AsyncSession, Depends(with_db_session)],
 ):
-    result = await db.get(ChildCardRecommendationResultORM, recommendation_id)
-    if result is not None:
-        recommendation = result.to_data_model()
+    recommendation = await find_card_recommendation_result(recommendation_id, dyad_orm.id, db)
+    if recommendation is not None:
         card = recommendation.find_card_by_id(card_id)
         if card is not None:
             return FileResponse(
@@ -60,10 +59,11 @@ async def match_card_images(
     image_matcher: Annotated[CardImageMatcher, Depends(get_card_image_matcher)],
 ):
     t_start = perf_counter()
-    card_recommendation = await db.get(
-        ChildCardRecommendationResultORM, recommendation_id
+    card_recommendation = await find_card_recommendation_result(
+        recommendation_id, dyad_orm.id, db
     )
-    card_recommendation = card_recommendation.to_data_model()
+    if card_recommendation is None:
+        raise HTTPException(status_code=400, detail="NoSuchRecommendation")
     matches = await image_matcher.match_card_images(
         card_recommendation.cards,
         dyad_orm.parent_type,
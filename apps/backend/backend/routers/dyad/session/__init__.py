@@ -64,7 +64,8 @@ async def _abort_session(session_id: str, session: Annotated[ModeratorSession, D
                          dyad: Annotated[DyadORM, Depends(get_signed_in_dyad_orm)],
                          db: Annotated[AsyncSession, Depends(with_db_session)]):
     try:
-        session.cancel_all_async_tasks()
+        # Background tasks must not write to the storage after the entities are deleted.
+        await session.close_async_tasks()
         await session.storage.delete_entities()
         session_orm = await find_session_orm(session_id, dyad.id, db)
         await db.delete(session_orm)
@@ -1,12 +1,12 @@
 import asyncio
-from typing import Annotated, Optional
+from typing import Annotated, Optional, AsyncIterator
 
 import aiofiles
 from py_core.utils.speech.speech_recognizer_base import SpeechRecognizerBase
 from py_core.utils.speech.whisper import WhisperSpeechRecognizer
 from py_core.utils.speech.aliyun_nls import AliyunSpeechRecognizer
 
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 
 from py_core.utils.speech.funasr_nano import FunASRNanoSpeechRecognizer
 from py_core.utils.speech.dashscope_audio import DashscopeFunAsrFileRecognizer
@@ -19,7 +19,7 @@ from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, R
 from py_core.system.moderator import ModeratorSession
 from chatlib.utils.time import get_timestamp
 from py_core.system.model import Dialogue, ParentGuideRecommendationResult, CardIdentity, ChildCardRecommendationResult, \
-    CardInfo, ParentExampleMessage, UserLocale
+    CardInfo, ParentExampleMessage, UserLocale, ChildCardRecommendationStreamEvent, ParentGuideElement
 from fastapi import (
     APIRouter,
     Depends,
@@ -34,6 +34,7 @@ from fastapi import (
 from py_core.system.task.parent_guide_recommendation.punctuator import Punctuator
 
 from py_core.config import AACessTalkConfig
+from py_core.utils.stage_timings import StageTimings, run_stage
 
 
 from backend.routers.dyad.common import (
@@ -85,13 +86,26 @@ class SendParentMessageArgs(BaseModel):
 async def send_parent_message_text(
     args: SendParentMessageArgs,
     session: Annotated[ModeratorSession, Depends(retrieve_moderator_session)],
+    response: Response,
 ) -> ResponseWithTurnId[ChildCardRecommendationResult]:
-    turn, recommendation = await session.submit_parent_message(
-        parent_message=args.message
-    )
+    with StageTimings("parent_message_text") as timings:
+        turn, recommendation = await session.submit_parent_message(
+            parent_message=args.message
+        )
+    response.headers["Server-Timing"] = timings.to_server_timing_header()
     return ResponseWithTurnId(payload=recommendation, next_turn_id=turn.id)
 
 
+@router.post("/parent/message/partial", status_code=204)
+async def send_parent_message_partial(
+    args: SendParentMessageArgs,
+    session: Annotated[ModeratorSession, Depends(retrieve_moderator_session)],
+):
+    # A partial transcript while the parent is still speaking. Child cards are generated speculatively from it.
+    await session.speculate_parent_message(partial_text=args.message)
+    return Response(status_code=204)
+
+
 @router.post("/parent/message/audio")
 async def send_parent_message_audio(
     file: Annotated[UploadFile, File()],
@@ -100,6 +114,7 @@ async def send_parent_message_audio(
     session_id: str,
     session: Annotated[ModeratorSession, Depends(retrieve_moderator_session)],
     request: Request,
+    response: Response,
 ) -> ResponseWithTurnId[ChildCardRecommendationResult]:
     try:
         if file is None or file.filename is None:
@@ -125,48 +140,59 @@ async def send_parent_message_audio(
             turn_info.audio_filename = target_filename
             await session.storage.upsert_dialogue_turn(turn_info)
 
-        await asyncio.gather(write_file_task(), write_turn_info())
-        url = request.url_for(
-            "get_parent_message_audio",
-            dyad_id=dyad.id,
-            file_name=target_filename,
+        with StageTimings("parent_message_audio") as timings:
+            # Only the recognizer depends on the audio file. The turn info is written meanwhile,
+            # and must land before the turn is switched.
+            turn_info_task = asyncio.create_task(run_stage("write_turn_info", write_turn_info()))
+            try:
+                await run_stage("write_audio_file", write_file_task())
+                url = request.url_for(
+                    "get_parent_message_audio",
+                    dyad_id=dyad.id,
+                    file_name=target_filename,
+                )
+                if AACessTalkConfig.public_base_url:
+                    audio_url = f"{AACessTalkConfig.public_base_url.rstrip('/')}{url.path}"
+                else:
+                    audio_url = str(url)
+
+                print(f"Dictate parent turn audio... {file.filename}")
+                print(f"Audio URL: {audio_url}")
+
+                asr_engine = DashscopeFunAsrFileRecognizer()
+
+                print("Start recognizing...")
+
+                if file.content_type is None:
+                    raise HTTPException(status_code=400, detail=ErrorType.DictationFail)
+
+                text = await run_stage("recognize_speech", asr_engine.recognize_speech(
+                    audio_url,
+                    file,
+                    file.content_type,
+                    dyad.locale,
+                    dyad.child_name,
+                ))
+            finally:
+                await turn_info_task
+
+            if len(text) > 0:
+                # Start generating the cards from the raw transcript while it is being punctuated.
+                await session.speculate_parent_message(partial_text=text)
+                processed_text = await run_stage("punctuate", punctuator.punctuate(text))
+                print(text, processed_text)
+                # Generate recommendation
+                turn, recommendation = await run_stage("submit_parent_message", session.submit_parent_message(
+                    parent_message=processed_text
+                ))
+            else:
+                print("Empty dictation received.")
+                raise HTTPException(status_code=500, detail=ErrorType.EmptyDictation)
+
+        response.headers["Server-Timing"] = timings.to_server_timing_header()
+        return ResponseWithTurnId(
+            payload=recommendation, next_turn_id=turn.id, resource_url=audio_url
         )
-        if AACessTalkConfig.public_base_url:
-            audio_url = f"{AACessTalkConfig.public_base_url.rstrip('/')}{url.path}"
-        else:
-            audio_url = str(url)
-
-        print(f"Dictate parent turn audio... {file.filename}")
-        print(f"Audio URL: {audio_url}")
-
-        asr_engine = DashscopeFunAsrFileRecognizer()
-
-        print("Start recognizing...")
-
-        if file.content_type is None:
-            raise HTTPException(status_code=400, detail=ErrorType.DictationFail)
-
-        text = await asr_engine.recognize_speech(
-            audio_url,
-            file,
-            file.content_type,
-            dyad.locale,
-            dyad.child_name,
-        )
-
-        if len(text) > 0:
-            processed_text = await punctuator.punctuate(text)
-            print(text, processed_text)
-            # Generate recommendation
-            turn, recommendation = await session.submit_parent_message(
-                parent_message=processed_text
-            )
-            return ResponseWithTurnId(
-                payload=recommendation, next_turn_id=turn.id, resource_url=audio_url
-            )
-        else:
-            print("Empty dictation received.")
-            raise HTTPException(status_code=500, detail=ErrorType.EmptyDictation)
     except Exception as ex:
         print(ex)
         raise HTTPException(status_code=500, detail=ex.__str__()) from ex
@@ -185,6 +211,37 @@ async def request_example_message(
     return await session.request_parent_example_message(**args.model_dump())
 
 
+class ParentGuideFeedbackEvent(BaseModel):
+    recommendation_id: str
+    guide: ParentGuideElement | None = None
+
+
+@router.get("/parent/guide/feedback/stream")
+async def stream_late_parent_guide_feedback(
+    recommendation_id: str,
+    session: Annotated[ModeratorSession, Depends(retrieve_moderator_session)],
+) -> StreamingResponse:
+    """
+    Server-Sent Events channel for the feedback guide of a parent guide recommendation that was generated before the
+    dialogue inspection finished. Emits a single "feedback" event with the guide to be prepended to the recommendation,
+    or a "none" event if there is nothing to add, and closes.
+    The feedback is persisted in the session storage, so this channel can be served by any worker.
+    """
+
+    async def stream():
+        feedback_guide = await session.wait_late_parent_guide_feedback(recommendation_id)
+        yield _format_server_sent_event(
+            "feedback" if feedback_guide is not None else "none",
+            ParentGuideFeedbackEvent(recommendation_id=recommendation_id, guide=feedback_guide),
+        )
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 class CardSelectionResult(BaseModel):
     interim_cards: list[CardInfo]
     new_recommendation: ChildCardRecommendationResult
@@ -203,6 +260,58 @@ async def append_card(
     )
 
 
+class InterimCardsEvent(BaseModel):
+    interim_cards: list[CardInfo]
+
+
+def _format_server_sent_event(event: str, data: BaseModel) -> str:
+    return f"event: {event}\ndata: {data.model_dump_json()}\n\n"
+
+
+def _make_card_event_stream_response(
+    events: AsyncIterator[ChildCardRecommendationStreamEvent], interim_cards: list[CardInfo] | None = None
+) -> StreamingResponse:
+    async def stream():
+        if interim_cards is not None:
+            yield _format_server_sent_event("selection", InterimCardsEvent(interim_cards=interim_cards))
+        async for event in events:
+            yield _format_server_sent_event(event.type, event)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/child/add_card/stream")
+async def append_card_stream(
+    card_identity: CardIdentity,
+    session: Annotated[ModeratorSession, Depends(retrieve_moderator_session)],
+) -> StreamingResponse:
+    """
+    Server-Sent Events version of /child/add_card. Emits a "selection" event with the interim cards,
+    "cards" events with the new recommendation's cards as they become available, and finally a "done" event
+    with the whole recommendation.
+    """
+    interim_selection = await session.append_child_card(card_identity)
+    interim_cards = await session.get_card_info_from_identities(interim_selection.cards)
+    events = await session.refresh_child_card_recommendation_stream()
+    return _make_card_event_stream_response(events, interim_cards)
+
+
+@router.put("/child/refresh_cards/stream")
+async def refresh_card_selection_stream(
+    session: Annotated[ModeratorSession, Depends(retrieve_moderator_session)],
+) -> StreamingResponse:
+    """
+    Server-Sent Events version of /child/refresh_cards. Emits "cards" events as the cards become available,
+    and finally a "done" event with the whole recommendation.
+    """
+    events = await session.refresh_child_card_recommendation_stream()
+    return _make_card_event_stream_response(events)
+
+
 @router.put("/child/refresh_cards", response_model=ChildCardRecommendationResult)
 async def refresh_card_selection(
     session: Annotated[ModeratorSession, Depends(retrieve_moderator_session)],
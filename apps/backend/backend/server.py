@@ -1,10 +1,12 @@
 from py_core.utils.speech.funasr_nano import FunASRNanoSpeechRecognizer
+import asyncio
 from contextlib import asynccontextmanager
 import json
 from os import getcwd, path
 import os
 from time import perf_counter
 from py_core.utils.default_cards import inspect_default_card_images
+from py_core.utils.lookup_translator import close_lookup_translators
 
 
 import logging
@@ -16,6 +18,7 @@ from fastapi.staticfiles import StaticFiles
 from backend.database import create_test_dyad, create_test_freetopics, engine
 from py_database.database import create_db_and_tables
 from backend.routers import dyad, admin
+from backend.routers.dyad.common import session_registry
 import re
 from pathlib import Path
 import uuid
@@ -58,6 +61,9 @@ async def server_lifespan(app: FastAPI):
 
         # await FunASRNanoSpeechRecognizer.initialize_service()
 
+        await session_registry.start()
+        logger.info("Session registry started.")
+
         app.state.ready = True
         logger.info("Service initialization complete.")
     except Exception as e:
@@ -70,6 +76,14 @@ async def server_lifespan(app: FastAPI):
     # Cleanup logic will come below.
     logger.info("Server shutting down.")
 
+    # Persist pending writes of the resident sessions.
+    await session_registry.stop()
+    logger.info(f"Session registry stopped. {session_registry.metrics()}")
+
+    # Fold the journals of the translation dictionaries into their files.
+    await asyncio.to_thread(close_lookup_translators)
+    logger.info("Lookup dictionaries closed.")
+
 
 app = FastAPI(lifespan=server_lifespan)
 
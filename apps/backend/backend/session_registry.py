@@ -0,0 +1,253 @@
+import asyncio
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from os import getenv
+from time import monotonic
+
+from py_core.system.model import Dyad, SessionTopicInfo, id_generator
+from py_core.system.moderator import ModeratorSession
+from py_core.system.storage.session.cached import CachedSessionStorage
+from py_core.utils.task_supervisor import TaskSupervisor
+from py_database import SQLSessionStorage
+
+from backend import env_variables
+
+
+class SessionRegistry(ABC):
+    """
+    Keeps track of the ModeratorSession instances serving the dyad API requests.
+    """
+
+    @abstractmethod
+    async def create(self, dyad: Dyad, topic: SessionTopicInfo, timezone: str) -> ModeratorSession:
+        pass
+
+    @abstractmethod
+    async def retrieve(self, session_id: str, dyad: Dyad) -> ModeratorSession | None:
+        pass
+
+    @abstractmethod
+    async def dispose(self, session_id: str):
+        pass
+
+    def resident_sessions(self, dyad_id: str) -> list[ModeratorSession]:
+        """Sessions of the dyad kept in this process, which may hold state not yet visible from the database."""
+        return []
+
+    async def start(self):
+        return
+
+    async def stop(self):
+        return
+
+    def metrics(self) -> dict[str, int]:
+        return {}
+
+
+@dataclass
+class _ResidentSession:
+    session: ModeratorSession
+    last_accessed_at: float
+
+
+class LocalSessionRegistry(SessionRegistry):
+    """
+    Keeps sessions resident in this process with their background tasks and in-memory state.
+    Requires all the requests of a session to reach this process, i.e., a single worker or sticky routing by session id.
+
+    At most max_sessions are kept; the least recently used one is evicted beyond that.
+    A sweeper evicts sessions idle for longer than idle_timeout seconds. Evicted sessions are restored from the database
+    on their next request.
+    """
+
+    def __init__(self, max_sessions: int = 200, idle_timeout: float = 30 * 60, sweep_interval: float = 60):
+        self.__max_sessions = max_sessions
+        self.__idle_timeout = idle_timeout
+        self.__sweep_interval = sweep_interval
+
+        # Ordered from the least recently used.
+        self.__sessions: OrderedDict[str, _ResidentSession] = OrderedDict()
+
+        # Sessions being evicted. Their pending writes must land before the session is restored again.
+        self.__disposing: dict[str, asyncio.Task] = {}
+
+        self.__sweeper_task: asyncio.Task | None = None
+
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions_lru = 0
+        self.__evictions_idle = 0
+
+    async def create(self, dyad: Dyad, topic: SessionTopicInfo, timezone: str) -> ModeratorSession:
+        storage = CachedSessionStorage(SQLSessionStorage(id_generator()))
+        session = await ModeratorSession.create(dyad, topic, timezone, storage)
+        # The session row should exist before the id is handed to the client.
+        await storage.flush()
+        self.__put(storage.session_id, session)
+        return session
+
+    async def retrieve(self, session_id: str, dyad: Dyad) -> ModeratorSession | None:
+        if session_id in self.__sessions:
+            self.__hits += 1
+            resident = self.__sessions[session_id]
+            # A resident session exists in the database unless it was disposed, so no query is needed.
+            if resident.session.dyad.id != dyad.id:
+                return None
+            resident.last_accessed_at = monotonic()
+            self.__sessions.move_to_end(session_id)
+            return resident.session
+        else:
+            self.__misses += 1
+            if session_id in self.__disposing:
+                await asyncio.shield(self.__disposing[session_id])
+
+            storage = await SQLSessionStorage.restore_instance(session_id)
+            if storage is None:
+                return None
+            session = await ModeratorSession.restore_instance(dyad, CachedSessionStorage(storage))
+            if session is None or (await session.storage.get_session_info()).dyad_id != dyad.id:
+                return None
+            if session_id in self.__sessions:
+                # Restored concurrently by another request. This instance must not keep a second writer open.
+                resident = self.__sessions[session_id]
+                await session.close_async_tasks()
+                await session.storage.dispose()
+                return resident.session
+            self.__put(session_id, session)
+            return session
+
+    async def dispose(self, session_id: str):
+        if session_id in self.__sessions:
+            resident = self.__sessions.pop(session_id)
+            await resident.session.close_async_tasks()
+            await resident.session.storage.dispose()
+
+    def resident_sessions(self, dyad_id: str) -> list[ModeratorSession]:
+        return [resident.session for resident in self.__sessions.values() if resident.session.dyad.id == dyad_id]
+
+    def __put(self, session_id: str, session: ModeratorSession):
+        self.__sessions[session_id] = _ResidentSession(session=session, last_accessed_at=monotonic())
+        self.__sessions.move_to_end(session_id)
+        while len(self.__sessions) > self.__max_sessions:
+            lru_session_id = next(iter(self.__sessions))
+            self.__evict(lru_session_id)
+            self.__evictions_lru += 1
+
+    def __evict(self, session_id: str):
+        resident = self.__sessions.pop(session_id)
+        print(f"Evict moderator session {session_id}.")
+        resident.session.cancel_all_async_tasks()
+
+        async def dispose():
+            try:
+                await resident.session.close_async_tasks()
+                await resident.session.storage.dispose()
+            except Exception as ex:
+                print(f"Error while disposing the evicted session {session_id}:", ex)
+            finally:
+                self.__disposing.pop(session_id, None)
+
+        self.__disposing[session_id] = asyncio.create_task(dispose())
+
+    def sweep(self):
+        deadline = monotonic() - self.__idle_timeout
+        expired = [session_id for session_id, resident in self.__sessions.items()
+                   if resident.last_accessed_at < deadline]
+        for session_id in expired:
+            self.__evict(session_id)
+            self.__evictions_idle += 1
+
+    async def __run_sweeper(self):
+        while True:
+            await asyncio.sleep(self.__sweep_interval)
+            try:
+                self.sweep()
+            except Exception as ex:
+                print("Error while sweeping idle sessions:", ex)
+
+    async def start(self):
+        if self.__sweeper_task is None:
+            self.__sweeper_task = asyncio.create_task(self.__run_sweeper())
+
+    async def stop(self):
+        if self.__sweeper_task is not None:
+            self.__sweeper_task.cancel()
+            self.__sweeper_task = None
+
+        for session_id in list(self.__sessions.keys()):
+            self.__evict(session_id)
+        if len(self.__disposing) > 0:
+            await asyncio.gather(*self.__disposing.values(), return_exceptions=True)
+
+    def metrics(self) -> dict[str, int]:
+        return dict(
+            live=len(self.__sessions),
+            disposing=len(self.__disposing),
+            hits=self.__hits,
+            misses=self.__misses,
+            evictions_lru=self.__evictions_lru,
+            evictions_idle=self.__evictions_idle,
+        )
+
+
+class SharedSessionRegistry(SessionRegistry):
+    """
+    Keeps no session across requests, so that any worker can serve any request.
+    Every request restores the session from the database and writes through to it.
+    Results of background tasks (dialogue inspections, parent examples) are stored in the session storage,
+    so the worker serving the next request picks them up. Speculations and prefetches are not started,
+    as no later request would be served by the instance that holds them.
+
+    The instance is discarded after the request, so the supervisors of its background tasks are held here until
+    the tasks finish. On stop, they are given shutdown_timeout seconds before being cancelled.
+    """
+
+    def __init__(self, shutdown_timeout: float = 30):
+        self.__shutdown_timeout = shutdown_timeout
+        self.__supervisors: set[TaskSupervisor] = set()
+
+    async def create(self, dyad: Dyad, topic: SessionTopicInfo, timezone: str) -> ModeratorSession:
+        session = await ModeratorSession.create(dyad, topic, timezone, SQLSessionStorage(id_generator()),
+                                                resident=False)
+        session.hold_async_tasks_while_pending(self.__supervisors)
+        return session
+
+    async def retrieve(self, session_id: str, dyad: Dyad) -> ModeratorSession | None:
+        storage = await SQLSessionStorage.restore_instance(session_id)
+        if storage is None:
+            return None
+        session = await ModeratorSession.restore_instance(dyad, storage, resident=False)
+        if session is None or (await session.storage.get_session_info()).dyad_id != dyad.id:
+            return None
+        session.hold_async_tasks_while_pending(self.__supervisors)
+        return session
+
+    async def dispose(self, session_id: str):
+        return
+
+    async def stop(self):
+        supervisors = list(self.__supervisors)
+        if len(supervisors) > 0:
+            _, timed_out = await asyncio.wait([asyncio.create_task(supervisor.drain()) for supervisor in supervisors],
+                                              timeout=self.__shutdown_timeout)
+            for task in timed_out:
+                task.cancel()
+            await asyncio.gather(*[supervisor.aclose() for supervisor in supervisors], return_exceptions=True)
+
+    def metrics(self) -> dict[str, int]:
+        return dict(background=len(self.__supervisors))
+
+
+def make_session_registry() -> SessionRegistry:
+    kind = getenv(env_variables.SESSION_REGISTRY, "local")
+    if kind == "shared":
+        return SharedSessionRegistry()
+    elif kind == "local":
+        return LocalSessionRegistry(
+            max_sessions=int(getenv(env_variables.SESSION_REGISTRY_MAX_SESSIONS, "200")),
+            idle_timeout=float(getenv(env_variables.SESSION_IDLE_TIMEOUT_SEC, str(30 * 60))),
+            sweep_interval=float(getenv(env_variables.SESSION_SWEEP_INTERVAL_SEC, "60")),
+        )
+    else:
+        raise ValueError(f"Unknown session registry: {kind}")
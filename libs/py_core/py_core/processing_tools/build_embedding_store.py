@@ -0,0 +1,36 @@
+from time import perf_counter
+
+from chatlib.global_config import GlobalConfig
+
+from py_core.config import AACessTalkConfig
+from py_core.utils.lookup_translator import LookupTranslator
+from py_core.utils.vector_db import VectorDB
+
+
+def build_embedding_store():
+    """
+    Embeds the rows of the translation dictionaries that are not in the embedding store yet, and drops the embeddings
+    of rows no longer in the dictionaries. The server then loads the dictionaries without embedding requests.
+    """
+    t_start = perf_counter()
+
+    vector_db = VectorDB(embedding_model=AACessTalkConfig.embedding_model,
+                         embedding_dimensions=AACessTalkConfig.embedding_dimensions)
+    num_stored = len(vector_db.store)
+
+    documents: list[str] = []
+    for name, dict_filepath in [("cards", AACessTalkConfig.card_translation_dictionary_path),
+                                ("parent_examples", AACessTalkConfig.parent_example_translation_dictionary_path)]:
+        dictionary = LookupTranslator(name, dict_filepath, vector_db=vector_db, verbose=True)
+        documents.extend(row.english for row in dictionary.dictionary.values())
+
+    vector_db.store.save(retain_texts=documents)
+
+    t_end = perf_counter()
+    print(f"Embedding store has {len(vector_db.store)} embeddings ({num_stored} before). Took {t_end - t_start} sec.")
+
+
+if __name__ == "__main__":
+    GlobalConfig.is_cli_mode = True
+
+    build_embedding_store()
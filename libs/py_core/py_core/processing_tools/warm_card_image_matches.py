@@ -0,0 +1,59 @@
+import argparse
+import asyncio
+import csv
+from time import perf_counter
+
+import orjson
+from chatlib.global_config import GlobalConfig
+
+from py_core.config import AACessTalkConfig
+from py_core.system.model import CardInfo, UserLocale
+from py_core.system.task.card_image_matching.card_image_db_retriever import CardImageDBRetriever
+from py_core.utils.models import DictionaryRow
+
+
+def _load_dictionary_cards() -> list[CardInfo]:
+    cards: list[CardInfo] = []
+    with open(AACessTalkConfig.card_translation_dictionary_path, mode='r', encoding='utf8') as csvfile:
+        reader = csv.DictReader(csvfile, fieldnames=DictionaryRow.field_names())
+        next(reader, None)
+        for row in reader:
+            row_model = DictionaryRow.model_validate(row)
+            localized = orjson.loads(row_model.localized)
+            for locale in UserLocale:
+                label_localized = row_model.english if locale == UserLocale.English else localized.get(locale)
+                if label_localized is not None:
+                    cards.append(CardInfo(label=row_model.english, label_localized=label_localized,
+                                          category=row_model.category, recommendation_id=""))
+    return cards
+
+
+async def warm_card_image_matches(rebuild: bool, batch_size: int = 50):
+    """
+    Matches the cards of the translation dictionary to the card images, filling the card image match memo.
+    With rebuild, the memo is emptied first.
+    """
+    t_start = perf_counter()
+
+    retriever = CardImageDBRetriever()
+    if rebuild:
+        retriever.match_memo.clear()
+
+    cards = [card for card in _load_dictionary_cards() if retriever.match_memo.get(card) is None]
+    print(f"Match {len(cards)} cards...")
+    for i in range(0, len(cards), batch_size):
+        await retriever.query_nearest_card_image_infos(cards[i: i + batch_size])
+        print(f"{min(i + batch_size, len(cards))}/{len(cards)}")
+
+    t_end = perf_counter()
+    print(f"The memo has {len(retriever.match_memo)} matches. Took {t_end - t_start} sec.")
+
+
+if __name__ == "__main__":
+    GlobalConfig.is_cli_mode = True
+
+    parser = argparse.ArgumentParser(description="Warm the card image match memo from the card translation dictionary.")
+    parser.add_argument("--rebuild", action="store_true", help="Empty the memo before warming it.")
+    args = parser.parse_args()
+
+    asyncio.run(warm_card_image_matches(args.rebuild))
@@ -139,6 +139,22 @@ class ChildCardRecommendationResult(ModelWithIdAndTimestamp, ModelWithTurnId):
             return None
 
 
+class ChildCardRecommendationStreamEventType(StrEnum):
+    Cards = "cards"
+    Done = "done"
+
+
+class ChildCardRecommendationStreamEvent(BaseModel):
+    model_config = ConfigDict(frozen=True, use_enum_values=True)
+
+    type: ChildCardRecommendationStreamEventType
+    recommendation_id: str
+    # Cards newly available in this event.
+    cards: list[CardInfo] = []
+    # The complete recommendation, with the Done event.
+    recommendation: Optional[ChildCardRecommendationResult] = None
+
+
 class ParentGuideType(StrEnum):
     Messaging = "messaging"
     Feedback = "feedback"
@@ -193,6 +209,32 @@ class ParentExampleMessage(ModelWithIdAndTimestamp):
     message: str
     message_localized: str | None = None
 
+
+class DialogueInspectionRecord(ModelWithIdAndTimestamp):
+    model_config = ConfigDict(frozen=True, use_enum_values=True)
+
+    # The parent message inspected.
+    message_id: str
+
+    # Empty if nothing noteworthy was found.
+    categories: list[DialogueInspectionCategory] = []
+    rationale: str | None = None
+    feedback: str | None = None
+
+class ParentGuideFeedbackRecord(ModelWithIdAndTimestamp):
+    """
+    Feedback guide of a parent guide recommendation generated before the dialogue inspection finished.
+    Recorded as pending along with the recommendation, and again once the feedback is resolved. The latest one counts.
+    """
+    model_config = ConfigDict(frozen=True)
+
+    recommendation_id: str
+
+    resolved: bool = False
+
+    # The guide to be prepended to the recommendation. None if the inspection found nothing to feed back.
+    guide: ParentGuideElement | None = None
+
 class FreeTopicDetail(ModelWithId):
 
     subtopic: str
@@ -1,6 +1,8 @@
 import asyncio
+import unicodedata
 from dataclasses import dataclass
-from typing import Optional
+from difflib import SequenceMatcher
+from typing import Optional, AsyncIterator
 
 from nanoid import generate
 
@@ -9,17 +11,23 @@ from chatlib.utils.time import get_timestamp
 from py_core.system.model import ChildCardRecommendationResult, DialogueMessage, DialogueRole, CardInfo, \
     CardIdentity, DialogueTurn, Interaction, InteractionType, \
     ParentGuideRecommendationResult, Dialogue, ParentGuideType, ParentExampleMessage, ParentGuideElement, \
-    InterimCardSelection, Dyad, SessionInfo, SessionStatus, UserLocale
+    InterimCardSelection, Dyad, SessionInfo, SessionStatus, UserLocale, DialogueInspectionRecord, \
+    ChildCardRecommendationStreamEvent, ChildCardRecommendationStreamEventType, CardCategory, \
+    ParentGuideFeedbackRecord
 from py_core.system.session_topic import SessionTopicInfo
 from py_core.system.storage import SessionStorage
 from py_core.system.task import ChildCardRecommendationGenerator
 from py_core.system.task.parent_guide_recommendation import ParentGuideRecommendationGenerator, \
     ParentExampleMessageGenerator
+from py_core.system.task.parent_guide_recommendation.common import DialogueInspectionResult
 from py_core.system.task.parent_guide_recommendation.dialogue_inspector import DialogueInspector
 from py_core.system.task.parent_guide_recommendation.static_guide_factory import StaticGuideFactory
 from py_core.utils.translate.aliyun_translator import AliyunTranslator
 from py_core.utils.translate.deepl_translator import DeepLTranslator
 from py_core.utils.models import AsyncTaskInfo
+from py_core.utils.stage_timings import run_stage, timed_stage
+from py_core.utils.task_supervisor import TaskSupervisor, TaskPriority
+from py_core.config import AACessTalkConfig
 from chatlib.llm.integration import GPTChatCompletionAPI
 
 from py_core.utils.speech import ClovaVoice
@@ -50,17 +58,51 @@ class ParentExampleGenerationTaskSet:
     recommendation_id: str
     tasks: dict[str, AsyncTaskInfo | None]
 
+@dataclass
+class LateParentGuideFeedback:
+    # The recommendation generated without the inspection result.
+    recommendation_id: str
+    # Resolves to the feedback guide, or None if the inspection found nothing to feed back.
+    task_info: AsyncTaskInfo
+
+@dataclass
+class ChildCardPrefetchTaskSet:
+    turn_id: str
+    # The recommendation shown to the child, from which the next selections are predicted.
+    recommendation_id: str
+    # Ids of the interim cards already selected when the prediction was made.
+    base_card_ids: list[str]
+    # Predicted next card id -> refreshed recommendation after selecting it.
+    tasks: dict[str, AsyncTaskInfo]
+
+@dataclass
+class ParentMessageSpeculation:
+    turn_id: str
+    text: str
+    # Resolves to the English translation of the text and the card recommendation for it.
+    task: asyncio.Task
+
+def _normalize_for_comparison(text: str) -> str:
+    return "".join(c for c in unicodedata.normalize("NFKC", text).lower()
+                   if unicodedata.category(c)[0] not in ("P", "Z", "C"))
+
 class ModeratorSession:
 
     class_variables_initialized = False
 
+    # A speculative card recommendation is reused only if its transcript is at least this similar to the submitted message.
+    speculation_similarity_threshold = 0.9
+
+    # Interval of reading the late parent guide feedback generated by another instance of the session.
+    late_parent_guide_feedback_poll_interval = 0.5
+
     @classmethod
     def __init_class_vars(cls):
         if cls.class_variables_initialized is False:
             print("Initialize Moderator session class variables..")
             vector_db = VectorDB()
             cls.__child_card_recommender = ChildCardRecommendationGenerator(vector_db)
-            cls.__parent_guide_recommender = ParentGuideRecommendationGenerator()
+            cls.__parent_guide_recommender = ParentGuideRecommendationGenerator(vector_db)
 
             cls.__translator = AliyunTranslator()
 
@@ -71,18 +113,32 @@ class ModeratorSession:
 
             cls.class_variables_initialized = True
 
-    def __init__(self, dyad: Dyad, storage: SessionStorage):
+    def __init__(self, dyad: Dyad, storage: SessionStorage, resident: bool = True):
+        """
+        resident: Whether this instance serves the subsequent requests of the session. Speculations and prefetches are
+        only picked up by the instance that started them, so a non-resident instance does not start them.
+        """
 
         self.__init_class_vars()
 
         self.__storage = storage
 
+        self.__speculation_enabled = resident and AACessTalkConfig.speculative_generation_enabled
+        self.__child_card_prefetch_count = AACessTalkConfig.child_card_prefetch_count if self.__speculation_enabled else 0
+
         self.__dyad = dyad
 
+        self.__tasks = TaskSupervisor(dyad.id)
+
         self.__dialogue_inspection_task_info: AsyncTaskInfo | None = None
 
         self.__parent_example_generation_tasks: ParentExampleGenerationTaskSet | None = None
 
+        self.__late_parent_guide_feedback: LateParentGuideFeedback | None = None
+
+        self.__parent_message_speculation: ParentMessageSpeculation | None = None
+
+        self.__child_card_prefetch_tasks: ChildCardPrefetchTaskSet | None = None
 
     @property
     def storage(self) -> SessionStorage:
@@ -121,25 +177,25 @@ class ModeratorSession:
 
     @classmethod
     async def create(
-        cls, dyad: Dyad, topic: SessionTopicInfo, timezone: str, storage: SessionStorage
+        cls, dyad: Dyad, topic: SessionTopicInfo, timezone: str, storage: SessionStorage, resident: bool = True
     ) -> "ModeratorSession":
         # Mount session info
         session_info = SessionInfo(
             id=storage.session_id, topic=topic, local_timezone=timezone, dyad_id=dyad.id
         )
         await storage.update_session_info(session_info)
-        return cls(dyad, storage)
+        return cls(dyad, storage, resident)
 
     @classmethod
     async def restore_instance(
-        cls, dyad: Dyad, storage: SessionStorage
+        cls, dyad: Dyad, storage: SessionStorage, resident: bool = True
     ) -> Optional["ModeratorSession"]:
         session_info = await storage.get_session_info()
         if session_info is None:
             # No session has been initialized.
             return None
         else:
-            instance = ModeratorSession(dyad, storage)
+            instance = ModeratorSession(dyad, storage, resident)
             if session_info.status == SessionStatus.Started:
                 # It has been started but somehow terminated.
                 current_turn = await storage.get_latest_turn()
@@ -162,36 +218,45 @@ class ModeratorSession:
         session_info = await self.storage.get_session_info()
 
         if session_info.status == SessionStatus.Initial:
-            session_info.status = SessionStatus.Started
-            await self.storage.update_session_info(session_info)
+            async with self.__storage.transaction():
+                session_info.status = SessionStatus.Started
+                await self.storage.update_session_info(session_info)
 
-            current_turn = await self.storage.get_latest_turn()
-            if current_turn is None or current_turn.ended_timestamp is not None:
-                new_turn = DialogueTurn(
-                    session_id=self.storage.session_id, role=DialogueRole.Parent
-                )
-                await self.__storage.upsert_dialogue_turn(new_turn)
-                print(
-                    f"Initiate new turn. Turn id: {new_turn.id}, SessionInfo id: {self.storage.session_id}"
-                )
-                current_turn = new_turn
-            else:
-                print(
-                    f"This session has already started. SessionInfo Id: {self.storage.session_id}"
-                )
+                current_turn = await self.storage.get_latest_turn()
+                if current_turn is None or current_turn.ended_timestamp is not None:
+                    new_turn = DialogueTurn(
+                        session_id=self.storage.session_id, role=DialogueRole.Parent
+                    )
+                    await self.__storage.upsert_dialogue_turn(new_turn)
+                    print(
+                        f"Initiate new turn. Turn id: {new_turn.id}, SessionInfo id: {self.storage.session_id}"
+                    )
+                    current_turn = new_turn
+                else:
+                    print(
+                        f"This session has already started. SessionInfo Id: {self.storage.session_id}"
+                    )
+
+            dialogue = await self.storage.get_dialogue()
 
-            parent_guides = await self.__generate_parent_guide_recommendation()
+            parent_guides = await self.__generate_parent_guide_recommendation(current_turn, dialogue)
 
-            session_info = await self.storage.get_session_info()
-            session_info.status = SessionStatus.Conversation
-            await self.storage.update_session_info(session_info)
+            async with self.__storage.transaction():
+                await self.__storage.add_parent_guide_recommendation_result(parent_guides)
+
+                session_info = await self.storage.get_session_info()
+                session_info.status = SessionStatus.Conversation
+                await self.storage.update_session_info(session_info)
+
+            # Invoke an example generation task in advance.
+            self.__place_parent_example_generation_tasks(dialogue, parent_guides)
 
             return current_turn, parent_guides
         else:
             raise WrongSessionStatusError()
 
     async def terminate(self):
-        self.cancel_all_async_tasks()
+        await self.close_async_tasks()
         session_info = await self.storage.get_session_info()
         session_info.ended_timestamp = get_timestamp()
         session_info.status = SessionStatus.Terminated
@@ -205,31 +270,52 @@ class ModeratorSession:
         else:
             return None
 
-    async def _switch_turn(self) -> DialogueTurn:
-        current_turn = await self.__storage.get_latest_turn()
-        if current_turn.ended_timestamp is None:
-            current_turn.ended_timestamp = get_timestamp()
-            await self.storage.upsert_dialogue_turn(current_turn)
-        next_turn = DialogueTurn(
+    def __make_next_turn(self, current_turn: DialogueTurn) -> DialogueTurn:
+        return DialogueTurn(
             session_id=self.storage.session_id,
             role=DialogueRole.Parent
             if current_turn.role == DialogueRole.Child
             else DialogueRole.Child,
         )
+
+    async def _switch_turn(self, current_turn: DialogueTurn | None = None,
+                           next_turn: DialogueTurn | None = None) -> DialogueTurn:
+        current_turn = current_turn or await self.__storage.get_latest_turn()
+        if current_turn.ended_timestamp is None:
+            current_turn.ended_timestamp = get_timestamp()
+            await self.storage.upsert_dialogue_turn(current_turn)
+        next_turn = next_turn or self.__make_next_turn(current_turn)
         await self.__storage.upsert_dialogue_turn(next_turn)
         return next_turn
 
+    @property
+    def task_metrics(self) -> dict[str, int]:
+        return self.__tasks.metrics()
+
     def cancel_all_async_tasks(self):
         print("Cancel all moderation session tasks.")
         self.__clear_parent_example_generation_tasks()
         if self.__dialogue_inspection_task_info is not None:
-            self.__dialogue_inspection_task_info.task.cancel()
+            self.__tasks.cancel(self.__dialogue_inspection_task_info.task)
+            self.__dialogue_inspection_task_info = None
+        self.__cancel_parent_message_speculation()
+        self.__clear_child_card_prefetch_tasks()
+        self.__clear_late_parent_guide_feedback()
+        self.__tasks.cancel_all()
+
+    async def close_async_tasks(self):
+        """Cancels all the background tasks and waits for them to finish."""
+        self.cancel_all_async_tasks()
+        await self.__tasks.aclose()
+
+    def hold_async_tasks_while_pending(self, holder: set[TaskSupervisor]):
+        """Keeps the background tasks running after this instance is discarded, by holding their supervisor."""
+        self.__tasks.hold_while_pending(holder)
 
     def __clear_parent_example_generation_tasks(self):
         if self.__parent_example_generation_tasks is not None:
             for k, t in self.__parent_example_generation_tasks.tasks.items():
-                if not t.task.done():
-                    t.task.cancel()
+                self.__tasks.cancel(t.task)
             self.__parent_example_generation_tasks = None
 
     async def __parent_example_generate_func(
@@ -247,41 +333,104 @@ class ModeratorSession:
         await self.__storage.add_parent_example_message(message)
         return message
 
+    async def __inspect_dialogue(self, dialogue: Dialogue, task_id: str) -> tuple[DialogueInspectionResult | None, str]:
+        result, task_id = await self.__dialogue_inspector.inspect(dialogue, task_id)
+
+        # Persist the result so that it can be picked up by a session instance on another worker.
+        try:
+            await self.__storage.add_dialogue_inspection_record(DialogueInspectionRecord(
+                message_id=dialogue[-1].id,
+                categories=result.categories if result is not None else [],
+                rationale=result.rationale if result is not None else None,
+                feedback=result.feedback if result is not None else None
+            ))
+        except Exception as ex:
+            print("Failed to store the dialogue inspection result:", ex)
+
+        return result, task_id
+
+    async def __load_dialogue_inspection_result(self, dialogue: Dialogue) -> DialogueInspectionResult | None:
+        last_parent_message = next((message for message in reversed(dialogue) if message.role == DialogueRole.Parent), None)
+        if last_parent_message is None:
+            return None
+
+        record = await self.__storage.get_dialogue_inspection_record(last_parent_message.id)
+        if record is not None and len(record.categories) > 0:
+            return DialogueInspectionResult(categories=record.categories, rationale=record.rationale,
+                                            feedback=record.feedback)
+        else:
+            return None
+
     def __place_parent_example_generation_tasks(
         self, dialogue: Dialogue, recommendation: ParentGuideRecommendationResult
     ):
+        self.__clear_parent_example_generation_tasks()
         self.__parent_example_generation_tasks = ParentExampleGenerationTaskSet(
             recommendation_id=recommendation.id,
             tasks={
-                guide.id: AsyncTaskInfo(
-                    task_id=guide.id,
-                    task=asyncio.create_task(
-                        self.__parent_example_generate_func(
-                            dialogue, guide, recommendation.id
-                        )
+                guide.id: self.__tasks.spawn(
+                    self.__parent_example_generate_func(
+                        dialogue, guide, recommendation.id
                     ),
+                    name=f"parent_example:{guide.id}",
+                    priority=TaskPriority.Background,
+                    task_id=guide.id,
                 )
                 for guide in recommendation.guides
                 if guide.type == ParentGuideType.Messaging
             },
         )
 
+    def __clear_late_parent_guide_feedback(self):
+        if self.__late_parent_guide_feedback is not None:
+            self.__tasks.cancel(self.__late_parent_guide_feedback.task_info.task)
+            self.__late_parent_guide_feedback = None
+
+    async def __late_parent_guide_feedback_func(self, recommendation_id: str,
+                                                inspection_task_info: AsyncTaskInfo) -> ParentGuideElement | None:
+        guide = None
+        try:
+            guide = await self.__generate_late_parent_guide_feedback(inspection_task_info)
+            return guide
+        finally:
+            # Resolved even on failure or cancellation, so that the waiters on other instances do not wait until the timeout.
+            await self.__storage.add_parent_guide_feedback_record(
+                ParentGuideFeedbackRecord(recommendation_id=recommendation_id, resolved=True, guide=guide))
+
+    async def __generate_late_parent_guide_feedback(self, inspection_task_info: AsyncTaskInfo) -> ParentGuideElement | None:
+        joined = await self.__tasks.join(inspection_task_info.task)
+        if joined is None:
+            return None
+
+        dialogue_inspection_result, task_id = joined
+        if task_id != inspection_task_info.task_id or dialogue_inspection_result is None:
+            return None
+
+        return await self.__parent_guide_recommender.generate_feedback_guide(self.__dyad, dialogue_inspection_result)
+
     async def __generate_parent_guide_recommendation(
-        self,
+        self, current_turn: DialogueTurn, dialogue: Dialogue
     ) -> ParentGuideRecommendationResult:
-        current_turn = await self.storage.get_latest_turn()
-
-        dialogue = await self.storage.get_dialogue()
+        self.__clear_late_parent_guide_feedback()
 
         # Join a dialogue inspection task
         dialogue_inspection_result = None
+        late_inspection_task_info: AsyncTaskInfo | None = None
         if self.__dialogue_inspection_task_info is not None:
-            (
-                dialogue_inspection_result,
-                task_id,
-            ) = await self.__dialogue_inspection_task_info.task
-            if task_id != self.__dialogue_inspection_task_info.task_id:
-                dialogue_inspection_result = None
+            # Within the latency budget only. Otherwise the guides go without the inspection,
+            # and its feedback is delivered later.
+            joined = await self.__tasks.join(self.__dialogue_inspection_task_info.task,
+                                             timeout=AACessTalkConfig.dialogue_inspection_latency_budget)
+            if joined is not None:
+                dialogue_inspection_result, task_id = joined
+                if task_id != self.__dialogue_inspection_task_info.task_id:
+                    dialogue_inspection_result = None
+            elif not self.__dialogue_inspection_task_info.task.done():
+                print("Dialogue inspection is over the latency budget. Generate guides without it.")
+                late_inspection_task_info = self.__dialogue_inspection_task_info
+        elif len(dialogue) > 0:
+            # The inspection was started by another instance of this session.
+            dialogue_inspection_result = await self.__load_dialogue_inspection_result(dialogue)
 
         # Clear
         self.__dialogue_inspection_task_info = None
@@ -293,52 +442,203 @@ class ModeratorSession:
                 session_topic, self.__dyad, current_turn.id
             )
         else:
-            recommendation = await self.__parent_guide_recommender.generate(
+            recommendation = await self.__tasks.run(self.__parent_guide_recommender.generate(
                 current_turn.id,
                 self.__dyad,
                 session_topic,
                 dialogue,
                 dialogue_inspection_result,
+            ), name="parent_guide_recommendation")
+
+        if late_inspection_task_info is not None:
+            # Recorded so that the feedback can be waited for from any instance of this session.
+            await self.__storage.add_parent_guide_feedback_record(
+                ParentGuideFeedbackRecord(recommendation_id=recommendation.id))
+            self.__late_parent_guide_feedback = LateParentGuideFeedback(
+                recommendation_id=recommendation.id,
+                task_info=self.__tasks.spawn(
+                    self.__late_parent_guide_feedback_func(recommendation.id, late_inspection_task_info),
+                    name="late_parent_guide_feedback",
+                    priority=TaskPriority.Background,
+                ),
             )
 
-        await self.__storage.add_parent_guide_recommendation_result(recommendation)
+        return recommendation
 
-        # Invoke an example generation task in advance.
-        self.__clear_parent_example_generation_tasks()
-        self.__place_parent_example_generation_tasks(dialogue, recommendation)
+    async def wait_late_parent_guide_feedback(self, recommendation_id: str) -> ParentGuideElement | None:
+        """
+        Waits for the feedback guide of the recommendation generated without the dialogue inspection result.
+        Returns None if there is no such feedback.
+        The feedback may be generated by another instance of this session, so it is read from the storage
+        unless the task is held by this instance.
+        """
+        late_feedback = self.__late_parent_guide_feedback
+        if late_feedback is not None and late_feedback.recommendation_id == recommendation_id:
+            return await self.__tasks.join(late_feedback.task_info.task)
+
+        deadline = asyncio.get_running_loop().time() + AACessTalkConfig.late_parent_guide_feedback_timeout
+        while True:
+            record = await self.__storage.get_parent_guide_feedback_record(recommendation_id)
+            if record is None:
+                return None
+            elif record.resolved:
+                return record.guide
+            elif asyncio.get_running_loop().time() >= deadline:
+                print(f"Timed out waiting for the late feedback of the recommendation {recommendation_id}.")
+                return None
+            await asyncio.sleep(self.late_parent_guide_feedback_poll_interval)
+
+    async def __translate_parent_message(self, parent_message: str) -> str:
+        if self.locale == UserLocale.English:
+            return parent_message
+        else:
+            print("Translate parent message..")
+            message_eng = await self.__translator.translate(
+                text=parent_message,
+                source_lang="auto",
+                target_lang="en",
+                context="The message is from a parent to their child.",
+                user_locale=self.locale,
+                domain="parent_message",
+            )
+            print("Translated parent message.")
+            return message_eng
+
+    def __is_similar_parent_message(self, a: str, b: str) -> bool:
+        a = _normalize_for_comparison(a)
+        b = _normalize_for_comparison(b)
+        if a == b:
+            return True
+        return SequenceMatcher(None, a, b).ratio() >= self.speculation_similarity_threshold
+
+    def __cancel_parent_message_speculation(self):
+        if self.__parent_message_speculation is not None:
+            self.__tasks.cancel(self.__parent_message_speculation.task)
+            self.__parent_message_speculation = None
+
+    async def __speculate_func(self, current_turn: DialogueTurn, text: str) -> tuple[str, ChildCardRecommendationResult]:
+        message_eng = await self.__translate_parent_message(text)
+        message = DialogueMessage(
+            role=DialogueRole.Parent,
+            content_localized=text,
+            content=message_eng,
+            turn_id=current_turn.id,
+        )
+        dialogue = [*(await self.__storage.get_dialogue()), message]
+
+        # The turn id is re-stamped with that of the next turn when the result is committed.
+        recommendation = await self.__child_card_recommender.generate(
+            topic_info=await self.session_topic(),
+            locale=self.__dyad.locale,
+            parent_type=self.__dyad.parent_type,
+            dialogue=dialogue,
+            interim_cards=None,
+            previous_recommendation=None,
+            turn_id=current_turn.id,
+        )
+        return message_eng, recommendation
 
-        return recommendation
+    @speaker(DialogueRole.Parent)
+    async def speculate_parent_message(self, partial_text: str):
+        """
+        Starts generating the child cards from a partial transcript while the parent is still speaking.
+        The result is committed by submit_parent_message if the final message is close enough to the transcript,
+        and discarded otherwise.
+        """
+        if not self.__speculation_enabled or len(partial_text.strip()) == 0:
+            return
+
+        current_turn = await self.storage.get_latest_turn()
+
+        speculation = self.__parent_message_speculation
+        if (speculation is not None and speculation.turn_id == current_turn.id
+                and self.__is_similar_parent_message(speculation.text, partial_text)):
+            # The running speculation already covers this transcript.
+            return
+
+        self.__cancel_parent_message_speculation()
+        self.__parent_message_speculation = ParentMessageSpeculation(
+            turn_id=current_turn.id,
+            text=partial_text,
+            task=self.__tasks.spawn(run_stage("speculate_cards", self.__speculate_func(current_turn, partial_text)),
+                                    name="parent_message_speculation", priority=TaskPriority.Speculative,
+                                    timeout=AACessTalkConfig.speculative_task_timeout).task
+        )
+
+    def __take_parent_message_speculation(self, current_turn: DialogueTurn,
+                                          parent_message: str) -> ParentMessageSpeculation | None:
+        speculation = self.__parent_message_speculation
+        self.__parent_message_speculation = None
+        if speculation is None:
+            return None
+        elif (speculation.turn_id == current_turn.id
+              and self.__is_similar_parent_message(speculation.text, parent_message)):
+            return speculation
+        else:
+            print("Discard speculative card recommendation.")
+            self.__tasks.cancel(speculation.task)
+            return None
+
+    async def __resolve_parent_message_translation(
+        self, parent_message: str, speculation: ParentMessageSpeculation | None
+    ) -> tuple[str, ChildCardRecommendationResult | None]:
+        """Returns the English translation of the message, and the speculative card recommendation if it can be reused."""
+        if speculation is None:
+            return await run_stage("translate", self.__translate_parent_message(parent_message)), None
+
+        if speculation.text != parent_message:
+            # The speculation was made from a slightly different wording. Translate the final message meanwhile.
+            translation_task = asyncio.create_task(run_stage("translate", self.__translate_parent_message(parent_message)))
+        else:
+            translation_task = None
+
+        with timed_stage("join_speculation"):
+            joined = await self.__tasks.join(speculation.task)
+
+        if joined is not None:
+            speculative_message_eng, speculative_recommendation = joined
+            print("Reuse speculative card recommendation.")
+        else:
+            print("Speculative card recommendation failed.")
+            speculative_message_eng, speculative_recommendation = None, None
+
+        if translation_task is not None:
+            message_eng = await translation_task
+        elif speculative_message_eng is not None:
+            message_eng = speculative_message_eng
+        else:
+            message_eng = await run_stage("translate", self.__translate_parent_message(parent_message))
+
+        return message_eng, speculative_recommendation
 
     @speaker(DialogueRole.Parent)
     async def submit_parent_message(
         self, parent_message: str
     ) -> tuple[DialogueTurn, ChildCardRecommendationResult]:
+        """
+        Runs the parent turn as a DAG of stages:
+
+        translate (or join speculation) ──┬─> dialogue inspection (background)
+        load dialogue, load topic ────────┴─> card generation ─> persist turn
+
+        Each stage is recorded to the active StageTimings, if any.
+        """
         try:
             current_turn = await self.storage.get_latest_turn()
 
             # Clear if there is a pending example generation task.
             self.__clear_parent_example_generation_tasks()
 
-            if self.locale == UserLocale.English:
-                message_eng = parent_message
-            else:
-                print("Translate parent message..")
-                message_eng = await self.__translator.translate(
-                    text=parent_message,
-                    source_lang="auto",
-                    target_lang="en",
-                    context="The message is from a parent to their child.",
-                    user_locale=self.locale,
-                )
+            self.__clear_child_card_prefetch_tasks()
 
-                print("Translated parent message.")
+            speculation = self.__take_parent_message_speculation(current_turn, parent_message)
 
-            current_guide = await self.storage.get_latest_parent_guide_recommendation(
-                turn_id=current_turn.id
+            # The translation does not depend on the stored dialogue and topic, so they are loaded meanwhile.
+            (message_eng, speculative_recommendation), prev_dialogue, session_topic = await asyncio.gather(
+                self.__resolve_parent_message_translation(parent_message, speculation),
+                run_stage("load_dialogue", self.__storage.get_dialogue()),
+                run_stage("load_topic", self.session_topic()),
             )
-            if current_guide is None:
-                # Load Initial guide
-                pass
 
             new_message = DialogueMessage(
                 role=DialogueRole.Parent,
@@ -347,51 +647,60 @@ class ModeratorSession:
                 turn_id=current_turn.id,
             )
 
-            await self.__storage.add_dialogue_message(new_message)
-
-            dialogue = await self.__storage.get_dialogue()
+            dialogue = [*prev_dialogue, new_message]
 
             # Start a background task for inspection.
             if self.__dialogue_inspection_task_info is not None:
-                self.__dialogue_inspection_task_info.task.cancel()
+                self.__tasks.cancel(self.__dialogue_inspection_task_info.task)
 
             inspection_task_id = generate(size=5)
 
-            self.__dialogue_inspection_task_info = AsyncTaskInfo(
+            self.__dialogue_inspection_task_info = self.__tasks.spawn(
+                run_stage("inspect_dialogue", self.__inspect_dialogue(dialogue, inspection_task_id)),
+                name="dialogue_inspection",
+                priority=TaskPriority.Background,
                 task_id=inspection_task_id,
-                task=asyncio.create_task(
-                    self.__dialogue_inspector.inspect(dialogue, inspection_task_id)
-                ),
             )
 
-            session_topic = await self.session_topic()
-
-            next_turn = await self._switch_turn()
+            next_turn = self.__make_next_turn(current_turn)
 
-            recommendation = await self.__child_card_recommender.generate(
-                topic_info=session_topic,
-                locale=self.__dyad.locale,
-                parent_type=self.__dyad.parent_type,
-                dialogue=dialogue,
-                interim_cards=None,
-                previous_recommendation=None,
-                turn_id=next_turn.id,
-            )
-
-            await self.__storage.add_card_recommendation_result(recommendation)
+            if speculative_recommendation is not None:
+                recommendation = speculative_recommendation.model_copy(
+                    update=dict(turn_id=next_turn.id, timestamp=get_timestamp()))
+            else:
+                recommendation = await run_stage("generate_cards", self.__tasks.run(self.__child_card_recommender.generate(
+                    topic_info=session_topic,
+                    locale=self.__dyad.locale,
+                    parent_type=self.__dyad.parent_type,
+                    dialogue=dialogue,
+                    interim_cards=None,
+                    previous_recommendation=None,
+                    turn_id=next_turn.id,
+                ), name="child_card_recommendation"))
+
+            # Persist the whole turn at once.
+            with timed_stage("persist_turn"):
+                async with self.__storage.transaction():
+                    await self.__storage.add_dialogue_message(new_message)
+
+                    await self._switch_turn(current_turn, next_turn)
+
+                    await self.__storage.add_card_recommendation_result(recommendation)
+
+                    await self.storage.add_interaction(
+                        Interaction(
+                            type=InteractionType.SubmitParentMessage,
+                            turn_id=current_turn.id,
+                            metadata=dict(
+                                message_eng=message_eng,
+                                message=parent_message,
+                                next_turn_id=next_turn.id,
+                                child_recommendation_id=recommendation.id,
+                            ),
+                        )
+                    )
 
-            await self.storage.add_interaction(
-                Interaction(
-                    type=InteractionType.SubmitParentMessage,
-                    turn_id=current_turn.id,
-                    metadata=dict(
-                        message_eng=message_eng,
-                        message=parent_message,
-                        next_turn_id=next_turn.id,
-                        child_recommendation_id=recommendation.id,
-                    ),
-                )
-            )
+            await self.__place_child_card_prefetch_tasks(next_turn.id, recommendation, None)
 
             return next_turn, recommendation
         except Exception as e:
@@ -412,39 +721,118 @@ class ModeratorSession:
         ]
         return [c for c in cards if c is not None]
 
-    @speaker(DialogueRole.Child)
-    async def refresh_child_card_recommendation(self) -> ChildCardRecommendationResult:
-        try:
-            current_turn = await self.storage.get_latest_turn()
-            dialogue = await self.__storage.get_dialogue()
+    def __clear_child_card_prefetch_tasks(self):
+        if self.__child_card_prefetch_tasks is not None:
+            for card_id, t in self.__child_card_prefetch_tasks.tasks.items():
+                self.__tasks.cancel(t.task)
+            self.__child_card_prefetch_tasks = None
+
+    def __predict_next_cards(self, recommendation: ChildCardRecommendationResult,
+                             base_card_ids: list[str]) -> list[CardInfo]:
+        # Topics and actions are what the children pick the most after a parent message, so they come first.
+        category_priority = [CardCategory.Topic, CardCategory.Action, CardCategory.Emotion]
+        candidates = sorted(
+            [card for card in recommendation.cards if card.category in category_priority and card.id not in base_card_ids],
+            key=lambda card: category_priority.index(card.category))
+        return candidates[:self.__child_card_prefetch_count]
+
+    async def __place_child_card_prefetch_tasks(self, turn_id: str, recommendation: ChildCardRecommendationResult,
+                                                interim_cards: list[CardInfo] | None):
+        self.__clear_child_card_prefetch_tasks()
+        if self.__child_card_prefetch_count <= 0:
+            return
+
+        base_cards = interim_cards or []
+        base_card_ids = [card.id for card in base_cards]
+
+        dialogue = await self.__storage.get_dialogue()
+        session_topic = await self.session_topic()
 
-            interim_card_selection = await self.storage.get_latest_card_selection(
-                turn_id=current_turn.id
-            )
-            prev_recommendation = (
-                await self.storage.get_latest_child_card_recommendation(
-                    turn_id=current_turn.id
+        self.__child_card_prefetch_tasks = ChildCardPrefetchTaskSet(
+            turn_id=turn_id,
+            recommendation_id=recommendation.id,
+            base_card_ids=base_card_ids,
+            tasks={
+                card.id: self.__tasks.spawn(
+                    self.__child_card_recommender.generate(
+                        turn_id=turn_id,
+                        locale=self.__dyad.locale,
+                        parent_type=self.__dyad.parent_type,
+                        topic_info=session_topic,
+                        dialogue=dialogue,
+                        interim_cards=[*base_cards, card],
+                        previous_recommendation=recommendation,
+                    ),
+                    name=f"child_card_prefetch:{card.id}",
+                    priority=TaskPriority.Speculative,
+                    timeout=AACessTalkConfig.speculative_task_timeout,
+                    task_id=card.id,
                 )
-            )
+                for card in self.__predict_next_cards(recommendation, base_card_ids)
+            },
+        )
 
-            interim_cards = (
-                (await self.get_card_info_from_identities(interim_card_selection.cards))
-                if interim_card_selection is not None
-                else None
-            )
+    async def __take_child_card_prefetch(self, current_turn: DialogueTurn,
+                                         interim_card_selection: InterimCardSelection | None,
+                                         prev_recommendation: ChildCardRecommendationResult | None
+                                         ) -> ChildCardRecommendationResult | None:
+        prefetch = self.__child_card_prefetch_tasks
+        if prefetch is None:
+            return None
 
-            session_topic = await self.session_topic()
+        task_info: AsyncTaskInfo | None = None
+        if (interim_card_selection is not None and len(interim_card_selection.cards) > 0
+                and prev_recommendation is not None
+                and prefetch.turn_id == current_turn.id
+                and prefetch.recommendation_id == prev_recommendation.id
+                and [card.id for card in interim_card_selection.cards[:-1]] == prefetch.base_card_ids):
+            task_info = prefetch.tasks.pop(interim_card_selection.cards[-1].id, None)
 
-            recommendation = await self.__child_card_recommender.generate(
-                current_turn.id,
-                self.__dyad.locale,
-                self.__dyad.parent_type,
-                session_topic,
-                dialogue,
-                interim_cards,
-                prev_recommendation,
+        # The other predictions are no longer relevant.
+        self.__clear_child_card_prefetch_tasks()
+
+        if task_info is None:
+            return None
+
+        prefetched = await self.__tasks.join(task_info.task)
+        if prefetched is not None:
+            print("Serve prefetched child card recommendation.")
+        return prefetched
+
+    async def __prepare_child_card_refresh(self) -> tuple[DialogueTurn, InterimCardSelection | None, dict]:
+        current_turn = await self.storage.get_latest_turn()
+        dialogue = await self.__storage.get_dialogue()
+
+        interim_card_selection = await self.storage.get_latest_card_selection(
+            turn_id=current_turn.id
+        )
+        prev_recommendation = (
+            await self.storage.get_latest_child_card_recommendation(
+                turn_id=current_turn.id
             )
+        )
+
+        interim_cards = (
+            (await self.get_card_info_from_identities(interim_card_selection.cards))
+            if interim_card_selection is not None
+            else None
+        )
 
+        session_topic = await self.session_topic()
+
+        return current_turn, interim_card_selection, dict(
+            turn_id=current_turn.id,
+            locale=self.__dyad.locale,
+            parent_type=self.__dyad.parent_type,
+            topic_info=session_topic,
+            dialogue=dialogue,
+            interim_cards=interim_cards,
+            previous_recommendation=prev_recommendation,
+        )
+
+    async def __persist_refreshed_child_card_recommendation(self, current_turn: DialogueTurn,
+                                                            recommendation: ChildCardRecommendationResult):
+        async with self.__storage.transaction():
             await self.__storage.add_card_recommendation_result(recommendation)
 
             await self.storage.add_interaction(
@@ -455,10 +843,69 @@ class ModeratorSession:
                 )
             )
 
+    @speaker(DialogueRole.Child)
+    async def refresh_child_card_recommendation(self) -> ChildCardRecommendationResult:
+        try:
+            current_turn, interim_card_selection, generation_args = await self.__prepare_child_card_refresh()
+
+            recommendation = await self.__take_child_card_prefetch(current_turn, interim_card_selection,
+                                                                   generation_args["previous_recommendation"])
+            if recommendation is None:
+                recommendation = await self.__tasks.run(self.__child_card_recommender.generate(**generation_args),
+                                                        name="child_card_recommendation")
+
+            await self.__persist_refreshed_child_card_recommendation(current_turn, recommendation)
+
+            await self.__place_child_card_prefetch_tasks(current_turn.id, recommendation,
+                                                         generation_args["interim_cards"])
+
             return recommendation
         except Exception as e:
             raise e
 
+    @speaker(DialogueRole.Child)
+    async def refresh_child_card_recommendation_stream(self) -> AsyncIterator[ChildCardRecommendationStreamEvent]:
+        """
+        Same as refresh_child_card_recommendation, but returns an iterator of the cards as they become available.
+        The generation and the persistence run in a supervised task which outlives the iterator,
+        so the recommendation is persisted even if the client disconnects before the Done event.
+        """
+        current_turn, interim_card_selection, generation_args = await self.__prepare_child_card_refresh()
+
+        prefetched = await self.__take_child_card_prefetch(current_turn, interim_card_selection,
+                                                           generation_args["previous_recommendation"])
+
+        async def generate():
+            if prefetched is not None:
+                events = [
+                    ChildCardRecommendationStreamEvent(type=ChildCardRecommendationStreamEventType.Cards,
+                                                       recommendation_id=prefetched.id, cards=prefetched.cards),
+                    ChildCardRecommendationStreamEvent(type=ChildCardRecommendationStreamEventType.Done,
+                                                       recommendation_id=prefetched.id, recommendation=prefetched)
+                ]
+            else:
+                events = self.__child_card_recommender.generate_stream(**generation_args)
+
+            async for event in self.__iterate(events):
+                if event.type == ChildCardRecommendationStreamEventType.Done:
+                    await self.__persist_refreshed_child_card_recommendation(current_turn, event.recommendation)
+                    await self.__place_child_card_prefetch_tasks(current_turn.id, event.recommendation,
+                                                                 generation_args["interim_cards"])
+                yield event
+
+        _, relay = self.__tasks.spawn_stream(generate(), name="child_card_recommendation_stream",
+                                             priority=TaskPriority.Interactive)
+        return relay
+
+    @staticmethod
+    async def __iterate(events: list | AsyncIterator):
+        if isinstance(events, list):
+            for event in events:
+                yield event
+        else:
+            async for event in events:
+                yield event
+
     @speaker(DialogueRole.Child)
     async def append_child_card(
         self, card_identity: CardIdentity
@@ -475,15 +922,16 @@ class ModeratorSession:
                 if current_card_selection is not None
                 else [card_identity],
             )
-            await self.storage.add_card_selection(new_card_selection)
+            async with self.__storage.transaction():
+                await self.storage.add_card_selection(new_card_selection)
 
-            await self.storage.add_interaction(
-                Interaction(
-                    type=InteractionType.AppendChildCard,
-                    turn_id=current_turn.id,
-                    metadata=dict(new_card_selection_id=new_card_selection.id),
+                await self.storage.add_interaction(
+                    Interaction(
+                        type=InteractionType.AppendChildCard,
+                        turn_id=current_turn.id,
+                        metadata=dict(new_card_selection_id=new_card_selection.id),
+                    )
                 )
-            )
 
             return new_card_selection
         except Exception as e:
@@ -504,7 +952,6 @@ class ModeratorSession:
                 new_card_selection = InterimCardSelection(
                     turn_id=current_turn.id, cards=current_card_selection.cards[:-1]
                 )
-                await self.storage.add_card_selection(new_card_selection)
 
                 prev_recommendation = await self.storage.get_card_recommendation_result(
                     last_card.recommendation_id
@@ -512,17 +959,25 @@ class ModeratorSession:
                 new_recommendation = ChildCardRecommendationResult(
                     **prev_recommendation.model_dump(exclude={"id"})
                 )
-                await self.storage.add_card_recommendation_result(new_recommendation)
 
-                await self.storage.add_interaction(Interaction(
-                    type=InteractionType.RemoveLastChildCard,
-                    turn_id=current_turn.id,
-                    metadata=dict(
-                        removed_card_id=last_card.id,
-                        orig_card_selection_id=current_card_selection.id,
-                        new_card_selection_id=new_card_selection.id
-                    )
-                ))
+                async with self.__storage.transaction():
+                    await self.storage.add_card_selection(new_card_selection)
+
+                    await self.storage.add_card_recommendation_result(new_recommendation)
+
+                    await self.storage.add_interaction(Interaction(
+                        type=InteractionType.RemoveLastChildCard,
+                        turn_id=current_turn.id,
+                        metadata=dict(
+                            removed_card_id=last_card.id,
+                            orig_card_selection_id=current_card_selection.id,
+                            new_card_selection_id=new_card_selection.id
+                        )
+                    ))
+
+                await self.__place_child_card_prefetch_tasks(
+                    current_turn.id, new_recommendation,
+                    await self.get_card_info_from_identities(new_card_selection.cards))
 
                 return new_card_selection, new_recommendation
             else:
@@ -537,25 +992,40 @@ class ModeratorSession:
             current_turn = await self.storage.get_latest_turn()
             interim_card_selection = await self.storage.get_latest_card_selection(turn_id=current_turn.id)
             if interim_card_selection is not None:
+                self.__clear_child_card_prefetch_tasks()
+
                 selected_cards = await self.get_card_info_from_identities(interim_card_selection.cards)
-                await self.__storage.add_dialogue_message(DialogueMessage(
+                new_message = DialogueMessage(
                     role=DialogueRole.Child,
                     content=selected_cards,
                     turn_id=current_turn.id
-                ))
-                next_turn = await self._switch_turn()
+                )
+                dialogue = [*(await self.__storage.get_dialogue()), new_message]
 
-                parent_recommendation = await self.__generate_parent_guide_recommendation()
+                next_turn = self.__make_next_turn(current_turn)
 
-                await self.storage.add_interaction(Interaction(
-                    type=InteractionType.ConfirmChildCardSelection,
-                    turn_id=current_turn.id,
-                    metadata=dict(
-                        next_turn_id=next_turn.id,
-                        confirmed_card_selection_id=interim_card_selection.id,
-                        parent_recommendation_id=parent_recommendation.id
-                        )
-                ))
+                parent_recommendation = await self.__generate_parent_guide_recommendation(next_turn, dialogue)
+
+                # Persist the whole turn at once.
+                async with self.__storage.transaction():
+                    await self.__storage.add_dialogue_message(new_message)
+
+                    await self._switch_turn(current_turn, next_turn)
+
+                    await self.__storage.add_parent_guide_recommendation_result(parent_recommendation)
+
+                    await self.storage.add_interaction(Interaction(
+                        type=InteractionType.ConfirmChildCardSelection,
+                        turn_id=current_turn.id,
+                        metadata=dict(
+                            next_turn_id=next_turn.id,
+                            confirmed_card_selection_id=interim_card_selection.id,
+                            parent_recommendation_id=parent_recommendation.id
+                            )
+                    ))
+
+                # Invoke an example generation task in advance.
+                self.__place_parent_example_generation_tasks(dialogue, parent_recommendation)
 
                 return next_turn, parent_recommendation
             else:
@@ -568,15 +1038,17 @@ class ModeratorSession:
     async def request_parent_example_message(self, recommendation_id: str, guide_id: str) -> ParentExampleMessage:
         if (self.__parent_example_generation_tasks is not None
                 and self.__parent_example_generation_tasks.recommendation_id == recommendation_id):
-            example_message: ParentExampleMessage = await self.__parent_example_generation_tasks.tasks[guide_id].task
+            example_message: ParentExampleMessage | None = await self.__tasks.join(
+                self.__parent_example_generation_tasks.tasks[guide_id].task)
         else:
             example_message: ParentExampleMessage | None = await self.__storage.get_parent_example_message(recommendation_id,
                                                                                                     guide_id)
-            if example_message is None:
-                dialogue = await self.__storage.get_dialogue()
-                recommendation = await self.__storage.get_parent_guide_recommendation_result(recommendation_id)
-                guide = [guide for guide in recommendation.guides if guide.id == guide_id][0]
-                example_message = await self.__parent_example_generate_func(dialogue, guide, recommendation.id)
+        if example_message is None:
+            dialogue = await self.__storage.get_dialogue()
+            recommendation = await self.__storage.get_parent_guide_recommendation_result(recommendation_id)
+            guide = [guide for guide in recommendation.guides if guide.id == guide_id][0]
+            example_message = await self.__tasks.run(self.__parent_example_generate_func(dialogue, guide, recommendation.id),
+                                                     name="parent_example")
 
         current_turn = await self.storage.get_latest_turn()
 
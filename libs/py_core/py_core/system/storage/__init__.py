@@ -1,2 +1,2 @@
-from .session.session_storage import SessionStorage
+from .session.session_storage import SessionStorage, RestorableSessionStorage
 from .user.user_storage import UserStorage
@@ -0,0 +1,352 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from weakref import WeakKeyDictionary
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+
+from py_core.system.model import ChildCardRecommendationResult, Dialogue, DialogueMessage, DialogueTurn, Interaction, \
+    InterimCardSelection, ModelWithIdAndTimestamp, ParentExampleMessage, ParentGuideRecommendationResult, SessionInfo, \
+    DialogueInspectionRecord, ParentGuideFeedbackRecord
+from py_core.system.storage.session.session_storage import SessionStorage
+
+_WriteJob = Callable[[], Awaitable[None]]
+
+logger = logging.getLogger(__name__)
+
+_M = TypeVar("_M", bound=ModelWithIdAndTimestamp)
+
+
+class CachedSessionStorage(SessionStorage):
+    """
+    Holds the state of a live session (session info, current turn, dialogue, latest selections and recommendations)
+    in memory in front of another SessionStorage. Reads are served from memory once loaded,
+    and writes are applied to the memory immediately and persisted to the underlying storage by a write-behind queue.
+    """
+
+    def __init__(self, storage: SessionStorage):
+        super().__init__(storage.session_id)
+
+        self.__storage = storage
+
+        # Each job is queued with the task that made the write, to which its failure is reported.
+        self.__write_queue: asyncio.Queue[tuple[_WriteJob, asyncio.Task | None]] = asyncio.Queue()
+        self.__writer_task: asyncio.Task | None = None
+        self.__write_errors: WeakKeyDictionary[asyncio.Task, Exception] = WeakKeyDictionary()
+        # Set when a write failed, so the memory is ahead of the underlying storage.
+        self.__stale = False
+
+        # Writes of an open unit of work, persisted together when it exits.
+        self.__transaction_jobs: list[_WriteJob] | None = None
+        self.__transaction_owner: asyncio.Task | None = None
+        self.__transaction_lock = asyncio.Lock()
+
+        self.__invalidate()
+
+    @property
+    def storage(self) -> SessionStorage:
+        return self.__storage
+
+    def __invalidate(self):
+        self.__session_info: SessionInfo | None = None
+        self.__session_info_loaded = False
+
+        self.__latest_turn: DialogueTurn | None = None
+        self.__latest_turn_loaded = False
+
+        self.__dialogue: Dialogue | None = None
+
+        # Keyed by turn id. None key denotes the latest one regardless of the turn.
+        self.__latest_card_selections: dict[str | None, InterimCardSelection | None] = {}
+        self.__latest_child_card_recommendations: dict[str | None, ChildCardRecommendationResult | None] = {}
+        self.__latest_parent_guide_recommendations: dict[str | None, ParentGuideRecommendationResult | None] = {}
+
+        self.__card_recommendations: dict[str, ChildCardRecommendationResult] = {}
+        self.__parent_guide_recommendations: dict[str, ParentGuideRecommendationResult] = {}
+        self.__parent_example_messages: dict[tuple[str, str], ParentExampleMessage] = {}
+        self.__dialogue_inspection_records: dict[str, DialogueInspectionRecord] = {}
+        # Keyed by recommendation id. Only resolved records, which are final.
+        self.__parent_guide_feedback_records: dict[str, ParentGuideFeedbackRecord] = {}
+
+    # Write-behind queue =================================================================================
+
+    def __in_transaction(self) -> bool:
+        # Background tasks (e.g., example generation) writing meanwhile are not part of the unit of work.
+        return self.__transaction_jobs is not None and self.__transaction_owner is asyncio.current_task()
+
+    def __enqueue(self, job: _WriteJob):
+        if self.__in_transaction():
+            self.__transaction_jobs.append(job)
+            return
+
+        if self.__writer_task is None or self.__writer_task.done():
+            self.__writer_task = asyncio.create_task(self.__run_writer())
+        self.__write_queue.put_nowait((job, asyncio.current_task()))
+
+    async def __run_writer(self):
+        while True:
+            job, owner = await self.__write_queue.get()
+            try:
+                await job()
+            except Exception as ex:
+                logger.error("Write-behind error on session %s: %r", self.session_id, ex)
+                if owner is not None and not owner.done() and owner not in self.__write_errors:
+                    self.__write_errors[owner] = ex
+                self.__stale = True
+            finally:
+                self.__invalidate_if_stale()
+                self.__write_queue.task_done()
+
+    def __invalidate_if_stale(self):
+        # The memory is dropped only once the queued writes have landed, as reloading before would miss them.
+        # A unit of work in progress relies on the memory, so it is dropped after its commit instead.
+        if self.__stale and self.__write_queue.qsize() == 0 and self.__transaction_jobs is None:
+            self.__stale = False
+            self.__invalidate()
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        if self.__in_transaction():
+            yield
+            return
+
+        # Units of work on the same session from different tasks do not interleave.
+        async with self.__transaction_lock:
+            self.__transaction_jobs = []
+            self.__transaction_owner = asyncio.current_task()
+            try:
+                yield
+                jobs = self.__transaction_jobs
+            except BaseException:
+                # The memory already reflects the discarded writes.
+                self.__invalidate()
+                raise
+            finally:
+                self.__transaction_jobs = None
+                self.__transaction_owner = None
+
+            if len(jobs) > 0:
+                async def commit():
+                    async with self.__storage.transaction():
+                        for job in jobs:
+                            await job()
+
+                self.__enqueue(commit)
+            else:
+                self.__invalidate_if_stale()
+
+    async def flush(self):
+        """
+        Wait until all the pending writes are persisted to the underlying storage.
+        Raises the error of a failed write made by the calling task. Failures of the writes of other tasks are logged.
+        """
+        await self.__write_queue.join()
+
+        owner = asyncio.current_task()
+        if owner is not None and owner in self.__write_errors:
+            raise self.__write_errors.pop(owner)
+
+    async def dispose(self):
+        try:
+            await self.flush()
+        finally:
+            if self.__writer_task is not None:
+                self.__writer_task.cancel()
+                self.__writer_task = None
+            self.__invalidate()
+            await self.__storage.dispose()
+
+    # Helpers ============================================================================================
+
+    @staticmethod
+    def __update_latest(cache: dict[str | None, _M | None], model: _M, turn_id: str | None):
+        for key in (turn_id, None):
+            if key in cache:
+                cached = cache[key]
+                if cached is None or cached.timestamp <= model.timestamp:
+                    cache[key] = model
+
+    async def __get_latest(self, cache: dict[str | None, _M | None], turn_id: str | None,
+                           loader: Callable[[str | None], Awaitable[_M | None]]) -> _M | None:
+        if turn_id not in cache:
+            await self.flush()
+            cache[turn_id] = await loader(turn_id)
+        return cache[turn_id]
+
+    async def __add_latest(self, cache: dict[str | None, _M | None], model: _M, turn_id: str | None,
+                           loader: Callable[[str | None], Awaitable[_M | None]]):
+        if self.__in_transaction():
+            # Within a unit of work, the underlying storage does not see the buffered writes yet.
+            # So load the entries before they are updated in memory.
+            for key in (turn_id, None):
+                await self.__get_latest(cache, key, loader)
+        self.__update_latest(cache, model, turn_id)
+
+    # Session info =======================================================================================
+
+    async def get_session_info(self) -> SessionInfo:
+        if not self.__session_info_loaded:
+            await self.flush()
+            self.__session_info = await self.__storage.get_session_info()
+            self.__session_info_loaded = True
+        return self.__session_info.model_copy(deep=True) if self.__session_info is not None else None
+
+    async def update_session_info(self, info: SessionInfo):
+        snapshot = info.model_copy(deep=True)
+        self.__session_info = snapshot
+        self.__session_info_loaded = True
+        self.__enqueue(lambda: self.__storage.update_session_info(snapshot))
+
+    # Turns ==============================================================================================
+
+    async def get_latest_turn(self) -> DialogueTurn | None:
+        if not self.__latest_turn_loaded:
+            await self.flush()
+            self.__latest_turn = await self.__storage.get_latest_turn()
+            self.__latest_turn_loaded = True
+        return self.__latest_turn.model_copy(deep=True) if self.__latest_turn is not None else None
+
+    async def upsert_dialogue_turn(self, turn: DialogueTurn):
+        snapshot = turn.model_copy(deep=True)
+        if self.__in_transaction():
+            await self.get_latest_turn()
+        if self.__latest_turn_loaded:
+            current = self.__latest_turn
+            if current is None or current.id == snapshot.id or current.started_timestamp <= snapshot.started_timestamp:
+                if current is None or current.id != snapshot.id:
+                    # A new turn has nothing selected or recommended yet.
+                    for cache in (self.__latest_card_selections, self.__latest_child_card_recommendations,
+                                  self.__latest_parent_guide_recommendations):
+                        cache[snapshot.id] = None
+                self.__latest_turn = snapshot
+        self.__enqueue(lambda: self.__storage.upsert_dialogue_turn(snapshot))
+
+    # Dialogue ===========================================================================================
+
+    async def get_dialogue(self) -> Dialogue:
+        if self.__dialogue is None:
+            await self.flush()
+            self.__dialogue = sorted(await self.__storage.get_dialogue(), key=lambda m: m.timestamp)
+        return list(self.__dialogue)
+
+    async def get_latest_dialogue_message(self) -> DialogueMessage | None:
+        if self.__dialogue is None:
+            await self.get_dialogue()
+        return self.__dialogue[-1] if len(self.__dialogue) > 0 else None
+
+    async def add_dialogue_message(self, message: DialogueMessage):
+        if self.__dialogue is None and self.__in_transaction():
+            await self.get_dialogue()
+        if self.__dialogue is not None:
+            self.__dialogue.append(message)
+        self.__enqueue(lambda: self.__storage.add_dialogue_message(message))
+
+    # Card selections and recommendations ================================================================
+
+    async def get_latest_card_selection(self, turn_id: str | None = None) -> InterimCardSelection | None:
+        return await self.__get_latest(self.__latest_card_selections, turn_id,
+                                       lambda t: self.__storage.get_latest_card_selection(turn_id=t))
+
+    async def add_card_selection(self, selection: InterimCardSelection):
+        await self.__add_latest(self.__latest_card_selections, selection, selection.turn_id,
+                                lambda t: self.__storage.get_latest_card_selection(turn_id=t))
+        self.__enqueue(lambda: self.__storage.add_card_selection(selection))
+
+    async def get_latest_child_card_recommendation(
+            self, turn_id: str | None = None) -> ChildCardRecommendationResult | None:
+        return await self.__get_latest(self.__latest_child_card_recommendations, turn_id,
+                                       lambda t: self.__storage.get_latest_child_card_recommendation(turn_id=t))
+
+    async def get_card_recommendation_result(self, recommendation_id: str) -> ChildCardRecommendationResult | None:
+        if recommendation_id not in self.__card_recommendations:
+            await self.flush()
+            result = await self.__storage.get_card_recommendation_result(recommendation_id)
+            if result is None:
+                return None
+            self.__card_recommendations[recommendation_id] = result
+        return self.__card_recommendations[recommendation_id]
+
+    async def add_card_recommendation_result(self, result: ChildCardRecommendationResult):
+        self.__card_recommendations[result.id] = result
+        await self.__add_latest(self.__latest_child_card_recommendations, result, result.turn_id,
+                                lambda t: self.__storage.get_latest_child_card_recommendation(turn_id=t))
+        self.__enqueue(lambda: self.__storage.add_card_recommendation_result(result))
+
+    async def get_latest_parent_guide_recommendation(
+            self, turn_id: str | None = None) -> ParentGuideRecommendationResult | None:
+        return await self.__get_latest(self.__latest_parent_guide_recommendations, turn_id,
+                                       lambda t: self.__storage.get_latest_parent_guide_recommendation(turn_id=t))
+
+    async def get_parent_guide_recommendation_result(self,
+                                                     recommendation_id: str) -> ParentGuideRecommendationResult | None:
+        if recommendation_id not in self.__parent_guide_recommendations:
+            await self.flush()
+            result = await self.__storage.get_parent_guide_recommendation_result(recommendation_id)
+            if result is None:
+                return None
+            self.__parent_guide_recommendations[recommendation_id] = result
+        return self.__parent_guide_recommendations[recommendation_id]
+
+    async def add_parent_guide_recommendation_result(self, result: ParentGuideRecommendationResult):
+        self.__parent_guide_recommendations[result.id] = result
+        await self.__add_latest(self.__latest_parent_guide_recommendations, result, result.turn_id,
+                                lambda t: self.__storage.get_latest_parent_guide_recommendation(turn_id=t))
+        self.__enqueue(lambda: self.__storage.add_parent_guide_recommendation_result(result))
+
+    # Parent examples ====================================================================================
+
+    async def get_parent_example_message(self, recommendation_id: str, guide_id: str) -> ParentExampleMessage | None:
+        key = (recommendation_id, guide_id)
+        if key not in self.__parent_example_messages:
+            await self.flush()
+            message = await self.__storage.get_parent_example_message(recommendation_id, guide_id)
+            if message is None:
+                return None
+            self.__parent_example_messages[key] = message
+        return self.__parent_example_messages[key]
+
+    async def add_parent_example_message(self, message: ParentExampleMessage):
+        self.__parent_example_messages[(message.recommendation_id, message.guide_id)] = message
+        self.__enqueue(lambda: self.__storage.add_parent_example_message(message))
+
+    # Dialogue inspections ===============================================================================
+
+    async def add_dialogue_inspection_record(self, record: DialogueInspectionRecord):
+        self.__dialogue_inspection_records[record.message_id] = record
+        self.__enqueue(lambda: self.__storage.add_dialogue_inspection_record(record))
+
+    async def get_dialogue_inspection_record(self, message_id: str) -> DialogueInspectionRecord | None:
+        if message_id not in self.__dialogue_inspection_records:
+            await self.flush()
+            record = await self.__storage.get_dialogue_inspection_record(message_id)
+            if record is None:
+                # The inspection may still be running elsewhere. Do not cache the absence.
+                return None
+            self.__dialogue_inspection_records[message_id] = record
+        return self.__dialogue_inspection_records[message_id]
+
+    # Parent guide feedbacks ===========================================================================
+
+    async def add_parent_guide_feedback_record(self, record: ParentGuideFeedbackRecord):
+        if record.resolved:
+            self.__parent_guide_feedback_records[record.recommendation_id] = record
+        self.__enqueue(lambda: self.__storage.add_parent_guide_feedback_record(record))
+
+    async def get_parent_guide_feedback_record(self, recommendation_id: str) -> ParentGuideFeedbackRecord | None:
+        if recommendation_id not in self.__parent_guide_feedback_records:
+            await self.flush()
+            record = await self.__storage.get_parent_guide_feedback_record(recommendation_id)
+            if record is None or not record.resolved:
+                # The feedback may still be resolved elsewhere. Do not cache a pending state.
+                return record
+            self.__parent_guide_feedback_records[recommendation_id] = record
+        return self.__parent_guide_feedback_records[recommendation_id]
+
+    # Others =============================================================================================
+
+    async def add_interaction(self, interaction: Interaction):
+        self.__enqueue(lambda: self.__storage.add_interaction(interaction))
+
+    async def delete_entities(self):
+        await self.flush()
+        self.__invalidate()
+        await self.__storage.delete_entities()
@@ -1,6 +1,10 @@
+import asyncio
 import os
 
 import json
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
 from pydantic import BaseModel
 from tinydb import TinyDB, Query
 from tinydb.storages import JSONStorage
@@ -9,11 +13,12 @@ from os import path, makedirs
 
 from py_core.config import AACessTalkConfig
 from py_core.system.model import DialogueTurn, Interaction, ParentGuideRecommendationResult, ChildCardRecommendationResult, Dialogue, \
-    DialogueMessage, DialogueTypeAdapter, ParentExampleMessage, InterimCardSelection, DialogueRole, SessionInfo
-from py_core.system.storage import SessionStorage
+    DialogueMessage, DialogueTypeAdapter, ParentExampleMessage, InterimCardSelection, DialogueRole, SessionInfo, \
+    DialogueInspectionRecord, ParentGuideFeedbackRecord
+from py_core.system.storage import RestorableSessionStorage
 
 
-class JsonSessionStorage(SessionStorage):
+class JsonSessionStorage(RestorableSessionStorage):
 
 
     TABLE_MESSAGES = "messages"
@@ -21,6 +26,8 @@ class JsonSessionStorage(SessionStorage):
     TABLE_PARENT_RECOMMENDATIONS = "parent_recommendations"
     TABLE_PARENT_EXAMPLE_MESSAGES = "parent_example_messages"
     TABLE_CARD_SELECTIONS = "card_selections"
+    TABLE_DIALOGUE_INSPECTIONS = "dialogue_inspections"
+    TABLE_PARENT_GUIDE_FEEDBACKS = "parent_guide_feedbacks"
     TABLE_CUSTOM_CARD_IMAGES = "custom_care_images"
 
     TABLE_TURNS = "turns"
@@ -30,6 +37,12 @@ class JsonSessionStorage(SessionStorage):
     def __init__(self, id: str):
         super().__init__(id)
 
+        # TinyDB instance and session info shared by the writes of an open unit of work.
+        self.__transaction_db: TinyDB | None = None
+        self.__transaction_session_info: SessionInfo | None = None
+        self.__transaction_owner: asyncio.Task | None = None
+        self.__transaction_lock = asyncio.Lock()
+
     @classmethod
     def session_db_dir_path(cls, id: str) -> str:
         dir_path = path.join(AACessTalkConfig.database_dir_path, "json/sessions", id)
@@ -56,7 +69,20 @@ class JsonSessionStorage(SessionStorage):
         else:
             return None
 
+    def __in_transaction(self) -> bool:
+        # Only the task that opened the unit of work joins it. Background tasks writing meanwhile write through.
+        return self.__transaction_db is not None and self.__transaction_owner is asyncio.current_task()
+
+    async def get_session_info(self) -> SessionInfo:
+        if self.__in_transaction() and self.__transaction_session_info is not None:
+            return self.__transaction_session_info
+        return await super().get_session_info()
+
     async def update_session_info(self, info: SessionInfo):
+        async with self.transaction():
+            self.__transaction_session_info = info
+
+    def __write_session_info(self, info: SessionInfo):
         session_info_path = self.session_info_path(self.session_id)
         with open(session_info_path, 'w') as f:
             json.dump(info.model_dump(), f)
@@ -65,28 +91,55 @@ class JsonSessionStorage(SessionStorage):
     def db(cls, id: str) -> TinyDB:
         return TinyDB(cls.session_db_path(id), CachingMiddleware(JSONStorage))
 
-    def __insert_one(self, table_name: str, model: BaseModel):
-        table = self.db(self.session_id).table(table_name)
-        table.insert(model.model_dump())
+    def __db(self) -> TinyDB:
+        return self.__transaction_db if self.__in_transaction() else self.db(self.session_id)
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        if self.__in_transaction():
+            yield
+            return
+
+        async with self.__transaction_lock:
+            self.__transaction_db = self.db(self.session_id)
+            self.__transaction_owner = asyncio.current_task()
+            try:
+                yield
+                # Closing the caching middleware writes all the buffered changes at once.
+                if self.__transaction_session_info is not None:
+                    self.__write_session_info(self.__transaction_session_info)
+                self.__transaction_db.close()
+            finally:
+                # On failure, the buffered changes are dropped without being written.
+                self.__transaction_db = None
+                self.__transaction_session_info = None
+                self.__transaction_owner = None
+
+    async def __insert_one(self, table_name: str, model: BaseModel):
+        # A write outside the caller's unit of work waits for the open one to finish,
+        # so that closing its buffered database does not overwrite the write.
+        async with self.transaction():
+            table = self.__db().table(table_name)
+            table.insert(model.model_dump())
 
     async def add_dialogue_message(self, message: DialogueMessage):
-        self.__insert_one(self.TABLE_MESSAGES, message)
+        await self.__insert_one(self.TABLE_MESSAGES, message)
 
     async def get_dialogue(self) -> Dialogue:
-        table = self.db(self.session_id).table(self.TABLE_MESSAGES)
+        table = self.__db().table(self.TABLE_MESSAGES)
         data = table.all()
         converted = DialogueTypeAdapter.validate_python(data)
         converted.sort(key=lambda m: m.timestamp)
         return converted
 
     async def add_card_recommendation_result(self, result: ChildCardRecommendationResult):
-        self.__insert_one(self.TABLE_CARD_RECOMMENDATIONS, result)
+        await self.__insert_one(self.TABLE_CARD_RECOMMENDATIONS, result)
 
     async def add_parent_guide_recommendation_result(self, result: ParentGuideRecommendationResult):
-        self.__insert_one(self.TABLE_PARENT_RECOMMENDATIONS, result)
+        await self.__insert_one(self.TABLE_PARENT_RECOMMENDATIONS, result)
 
     async def get_card_recommendation_result(self, recommendation_id: str) -> ChildCardRecommendationResult | None:
-        table = self.db(self.session_id).table(self.TABLE_CARD_RECOMMENDATIONS)
+        table = self.__db().table(self.TABLE_CARD_RECOMMENDATIONS)
         q = Query()
         result = table.search(q.id == recommendation_id)
         if len(result) > 0:
@@ -96,7 +149,7 @@ class JsonSessionStorage(SessionStorage):
 
     async def get_parent_guide_recommendation_result(self,
                                                      recommendation_id: str) -> ParentGuideRecommendationResult | None:
-        table = self.db(self.session_id).table(self.TABLE_PARENT_RECOMMENDATIONS)
+        table = self.__db().table(self.TABLE_PARENT_RECOMMENDATIONS)
         q = Query()
         result = table.search(q.id == recommendation_id)
         if len(result) > 0:
@@ -105,10 +158,10 @@ class JsonSessionStorage(SessionStorage):
             return None
 
     async def add_parent_example_message(self, message: ParentExampleMessage):
-        self.__insert_one(self.TABLE_PARENT_EXAMPLE_MESSAGES, message)
+        await self.__insert_one(self.TABLE_PARENT_EXAMPLE_MESSAGES, message)
 
     async def get_parent_example_message(self, recommendation_id: str, guide_id: str) -> ParentExampleMessage | None:
-        table = self.db(self.session_id).table(self.TABLE_PARENT_EXAMPLE_MESSAGES)
+        table = self.__db().table(self.TABLE_PARENT_EXAMPLE_MESSAGES)
         q = Query()
         result = table.search((q.recommendation_id == recommendation_id) & (q.guide_id == guide_id))
         if len(result) > 0:
@@ -116,8 +169,33 @@ class JsonSessionStorage(SessionStorage):
         else:
             return None
 
+    async def add_dialogue_inspection_record(self, record: DialogueInspectionRecord):
+        await self.__insert_one(self.TABLE_DIALOGUE_INSPECTIONS, record)
+
+    async def get_dialogue_inspection_record(self, message_id: str) -> DialogueInspectionRecord | None:
+        table = self.__db().table(self.TABLE_DIALOGUE_INSPECTIONS)
+        q = Query()
+        result = table.search(q.message_id == message_id)
+        if len(result) > 0:
+            return DialogueInspectionRecord(**result[0])
+        else:
+            return None
+
+    async def add_parent_guide_feedback_record(self, record: ParentGuideFeedbackRecord):
+        await self.__insert_one(self.TABLE_PARENT_GUIDE_FEEDBACKS, record)
+
+    async def get_parent_guide_feedback_record(self, recommendation_id: str) -> ParentGuideFeedbackRecord | None:
+        table = self.__db().table(self.TABLE_PARENT_GUIDE_FEEDBACKS)
+        q = Query()
+        result = sorted(table.search(q.recommendation_id == recommendation_id),
+                        key=lambda r: (r["timestamp"], r["resolved"]), reverse=True)
+        if len(result) > 0:
+            return ParentGuideFeedbackRecord(**result[0])
+        else:
+            return None
+
     async def __get_latest_model(self, table_name: str, timestamp_column: str = "timestamp", turn_id: str | None = None) -> dict | None:
-        table = self.db(self.session_id).table(table_name)
+        table = self.__db().table(table_name)
 
         if turn_id is not None:
             q = Query()
@@ -138,7 +216,7 @@ class JsonSessionStorage(SessionStorage):
         return InterimCardSelection(**d) if d is not None else None
 
     async def add_card_selection(self, selection: InterimCardSelection):
-        self.__insert_one(self.TABLE_CARD_SELECTIONS, selection)
+        await self.__insert_one(self.TABLE_CARD_SELECTIONS, selection)
 
     async def get_latest_parent_guide_recommendation(self, turn_id: str | None = None) -> ParentGuideRecommendationResult | None:
         d = await self.__get_latest_model(self.TABLE_PARENT_RECOMMENDATIONS, turn_id=turn_id)
@@ -149,7 +227,7 @@ class JsonSessionStorage(SessionStorage):
         return ChildCardRecommendationResult(**d) if d is not None else None
 
     async def get_latest_dialogue_message(self) -> DialogueMessage | None:
-        table = self.db(self.session_id).table(self.TABLE_MESSAGES)
+        table = self.__db().table(self.TABLE_MESSAGES)
         result = sorted(table.all(), key=lambda m: m["timestamp"], reverse=True)
         if len(result) > 0:
             return DialogueMessage(**result[0])
@@ -158,17 +236,18 @@ class JsonSessionStorage(SessionStorage):
 
 
     async def upsert_dialogue_turn(self, turn: DialogueTurn):
-        table = self.db(self.session_id).table(self.TABLE_TURNS)
+        async with self.transaction():
+            table = self.__db().table(self.TABLE_TURNS)
 
-        q = Query()
-        result = table.search((q.id == turn.id))
-        if len(result) > 0:
-            table.update(turn.model_dump(), q.id == turn.id)
-        else:
-            table.insert(turn.model_dump())
+            q = Query()
+            result = table.search((q.id == turn.id))
+            if len(result) > 0:
+                table.update(turn.model_dump(), q.id == turn.id)
+            else:
+                table.insert(turn.model_dump())
 
     async def add_interaction(self, interaction: Interaction):
-        self.__insert_one(self.TABLE_INTERACTIONS, interaction)
+        await self.__insert_one(self.TABLE_INTERACTIONS, interaction)
 
 
     async def get_latest_turn(self) -> DialogueTurn | None:
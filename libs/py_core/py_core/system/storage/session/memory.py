@@ -1,9 +1,17 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Any, Callable
+
 from py_core.system.model import Dialogue, DialogueTurn, Interaction, ParentGuideRecommendationResult, ChildCardRecommendationResult, \
-    DialogueMessage, ParentExampleMessage, InterimCardSelection, DialogueRole, ModelWithIdAndTimestamp, SessionInfo
-from py_core.system.storage.session.session_storage import SessionStorage
+    DialogueMessage, ParentExampleMessage, InterimCardSelection, DialogueRole, ModelWithIdAndTimestamp, SessionInfo, \
+    DialogueInspectionRecord, ParentGuideFeedbackRecord
+from py_core.system.storage.session.session_storage import RestorableSessionStorage
+
 
+_MISSING = object()
 
-class OnMemorySessionStorage(SessionStorage):
+
+class OnMemorySessionStorage(RestorableSessionStorage):
 
     __session_infos: dict[str, SessionInfo] = {}
 
@@ -16,25 +24,65 @@ class OnMemorySessionStorage(SessionStorage):
 
         self.__parent_example_messages: dict[tuple[str, str], ParentExampleMessage] = {}
 
+        self.__dialogue_inspection_records: dict[str, DialogueInspectionRecord] = {}
+
+        self.__parent_guide_feedback_records: dict[str, ParentGuideFeedbackRecord] = {}
+
         self.__interim_card_selections: dict[str, InterimCardSelection] = {}
 
         self.__turns: dict[str, DialogueTurn] = {}
 
         self.__interactions: dict[str, Interaction] = {}
 
-
+        # Undo operations of the writes in an open unit of work, recorded only for the task that opened it.
+        self.__transaction_undos: list[Callable[[], None]] | None = None
+        self.__transaction_owner: asyncio.Task | None = None
+        self.__transaction_lock = asyncio.Lock()
+
+    def __in_transaction(self) -> bool:
+        # Background tasks writing meanwhile are not part of the unit of work, and are not rolled back with it.
+        return self.__transaction_undos is not None and self.__transaction_owner is asyncio.current_task()
+
+    def __set(self, models: dict, key: Any, model: Any):
+        if self.__in_transaction():
+            previous = models.get(key, _MISSING)
+            self.__transaction_undos.append(
+                lambda: models.pop(key, None) if previous is _MISSING else models.__setitem__(key, previous))
+        models[key] = model
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        if self.__in_transaction():
+            yield
+            return
+
+        async with self.__transaction_lock:
+            self.__transaction_undos = []
+            self.__transaction_owner = asyncio.current_task()
+            try:
+                yield
+            except BaseException:
+                for undo in reversed(self.__transaction_undos):
+                    undo()
+                raise
+            finally:
+                self.__transaction_undos = None
+                self.__transaction_owner = None
 
     async def add_dialogue_message(self, message: DialogueMessage):
-        self.__dialogue.append(message)
+        dialogue = self.__dialogue
+        if self.__in_transaction():
+            self.__transaction_undos.append(lambda: dialogue.remove(message) if message in dialogue else None)
+        dialogue.append(message)
 
     async def get_dialogue(self) -> Dialogue:
         return self.__dialogue
 
     async def add_card_recommendation_result(self, result: ChildCardRecommendationResult):
-        self.__card_recommendations[result.id] = result
+        self.__set(self.__card_recommendations, result.id, result)
 
     async def add_parent_guide_recommendation_result(self, result: ParentGuideRecommendationResult):
-        self.__parent_guide_recommendations[result.id] = result
+        self.__set(self.__parent_guide_recommendations, result.id, result)
 
     async def get_card_recommendation_result(self, recommendation_id: str) -> ChildCardRecommendationResult | None:
         if recommendation_id in self.__card_recommendations:
@@ -50,7 +98,7 @@ class OnMemorySessionStorage(SessionStorage):
             return None
 
     async def add_parent_example_message(self, message: ParentExampleMessage):
-        self.__parent_example_messages[(message.recommendation_id, message.guide_id)] = message
+        self.__set(self.__parent_example_messages, (message.recommendation_id, message.guide_id), message)
 
     async def get_parent_example_message(self, recommendation_id: str, guide_id: str) -> ParentExampleMessage | None:
         if (recommendation_id, guide_id) in self.__parent_example_messages:
@@ -58,6 +106,23 @@ class OnMemorySessionStorage(SessionStorage):
         else:
             return None
 
+    async def add_dialogue_inspection_record(self, record: DialogueInspectionRecord):
+        self.__set(self.__dialogue_inspection_records, record.message_id, record)
+
+    async def get_dialogue_inspection_record(self, message_id: str) -> DialogueInspectionRecord | None:
+        if message_id in self.__dialogue_inspection_records:
+            return self.__dialogue_inspection_records[message_id]
+        else:
+            return None
+
+    async def add_parent_guide_feedback_record(self, record: ParentGuideFeedbackRecord):
+        self.__set(self.__parent_guide_feedback_records, record.id, record)
+
+    async def get_parent_guide_feedback_record(self, recommendation_id: str) -> ParentGuideFeedbackRecord | None:
+        records = [record for record in self.__parent_guide_feedback_records.values()
+                   if record.recommendation_id == recommendation_id]
+        return max(records, key=lambda record: (record.timestamp, record.resolved)) if len(records) > 0 else None
+
     async def __get_latest_model(self, model_dict: dict[str, ModelWithIdAndTimestamp],
                                  timestamp_column: str = "timestamp", turn_id: str | None = None) -> ModelWithIdAndTimestamp | None:
         sorted_selections = sorted(
@@ -72,7 +137,7 @@ class OnMemorySessionStorage(SessionStorage):
         return await self.__get_latest_model(self.__interim_card_selections, turn_id=turn_id)
 
     async def add_card_selection(self, selection: InterimCardSelection):
-        self.__interim_card_selections[selection.id] = selection
+        self.__set(self.__interim_card_selections, selection.id, selection)
 
     async def get_latest_parent_guide_recommendation(self, turn_id: str | None = None) -> ParentGuideRecommendationResult | None:
         return await self.__get_latest_model(self.__parent_guide_recommendations, turn_id=turn_id)
@@ -87,19 +152,35 @@ class OnMemorySessionStorage(SessionStorage):
             return self.__dialogue[len(self.__dialogue) - 1]
 
     async def delete_entities(self):
+        if self.__in_transaction():
+            containers = (self.__dialogue, self.__parent_guide_recommendations, self.__card_recommendations,
+                          self.__parent_example_messages, self.__dialogue_inspection_records,
+                          self.__parent_guide_feedback_records,
+                          self.__interim_card_selections, self.__interactions, self.__turns)
+
+            def restore():
+                (self.__dialogue, self.__parent_guide_recommendations, self.__card_recommendations,
+                 self.__parent_example_messages, self.__dialogue_inspection_records,
+                 self.__parent_guide_feedback_records, self.__interim_card_selections,
+                 self.__interactions, self.__turns) = containers
+
+            self.__transaction_undos.append(restore)
+
         self.__dialogue = []
         self.__parent_guide_recommendations = {}
         self.__card_recommendations = {}
         self.__parent_example_messages = {}
+        self.__dialogue_inspection_records = {}
+        self.__parent_guide_feedback_records = {}
         self.__interim_card_selections = {}
         self.__interactions = {}
         self.__turns = {}
 
     async def upsert_dialogue_turn(self, turn: DialogueTurn):
-        self.__turns[turn.id] = turn
+        self.__set(self.__turns, turn.id, turn)
 
     async def add_interaction(self, interaction: Interaction):
-        self.__interactions[interaction.id] = interaction
+        self.__set(self.__interactions, interaction.id, interaction)
 
     async def get_latest_turn(self) -> DialogueTurn | None:
         return await self.__get_latest_model(self.__turns)
@@ -109,7 +190,7 @@ class OnMemorySessionStorage(SessionStorage):
         return cls.__session_infos[session_id] if session_id in cls.__session_infos else None
 
     async def update_session_info(self, info: SessionInfo):
-        self.__session_infos[info.id] = info
+        self.__set(self.__session_infos, info.id, info)
 
 
 
@@ -1,8 +1,10 @@
 from abc import ABC, abstractmethod
+from contextlib import AbstractAsyncContextManager
 from typing import Optional
 
 from py_core.system.model import ChildCardRecommendationResult, Dialogue, DialogueMessage, \
-    ParentGuideRecommendationResult, ParentExampleMessage, InterimCardSelection, SessionInfo, Interaction, DialogueTurn
+    ParentGuideRecommendationResult, ParentExampleMessage, InterimCardSelection, SessionInfo, Interaction, DialogueTurn, \
+    DialogueInspectionRecord, ParentGuideFeedbackRecord
 
 
 class SessionStorage(ABC):
@@ -10,19 +12,6 @@ class SessionStorage(ABC):
     def __init__(self, session_id: str):
         self.__session_id = session_id
 
-    @classmethod
-    @abstractmethod
-    async def _load_session_info(cls, session_id: str) -> SessionInfo | None:
-        pass
-    
-    @classmethod
-    async def restore_instance(cls, id: str)->Optional['SessionStorage']:
-        session_info = await cls._load_session_info(id)
-        if session_info is not None:
-            return cls(session_id=session_info.id)
-        else:
-            return None
-
     async def dispose(self):
         return
 
@@ -30,13 +19,22 @@ class SessionStorage(ABC):
     def session_id(self) -> str:
         return self.__session_id
 
+    @abstractmethod
     async def get_session_info(self) -> SessionInfo:
-        return await self._load_session_info(self.session_id)
+        pass
 
     @abstractmethod
     async def update_session_info(self, info: SessionInfo):
         pass
 
+    @abstractmethod
+    def transaction(self) -> AbstractAsyncContextManager[None]:
+        """
+        Returns a unit of work. Writes made by the caller within the context are committed together when it exits,
+        and discarded if it exits with an exception. Nested units of work join the outermost one.
+        """
+        pass
+
     @abstractmethod
     async def add_dialogue_message(self, message: DialogueMessage):
         pass
@@ -70,6 +68,23 @@ class SessionStorage(ABC):
     async def get_parent_example_message(self, recommendation_id: str, guide_id: str) -> ParentExampleMessage | None:
         pass
 
+    @abstractmethod
+    async def add_dialogue_inspection_record(self, record: DialogueInspectionRecord):
+        pass
+
+    @abstractmethod
+    async def get_dialogue_inspection_record(self, message_id: str) -> DialogueInspectionRecord | None:
+        pass
+
+    @abstractmethod
+    async def add_parent_guide_feedback_record(self, record: ParentGuideFeedbackRecord):
+        pass
+
+    @abstractmethod
+    async def get_parent_guide_feedback_record(self, recommendation_id: str) -> ParentGuideFeedbackRecord | None:
+        """Returns the latest feedback record of the recommendation."""
+        pass
+
     @abstractmethod
     async def get_latest_card_selection(self, turn_id: str | None = None) -> InterimCardSelection | None:
         pass
@@ -105,3 +120,25 @@ class SessionStorage(ABC):
     @abstractmethod
     async def add_interaction(self, interaction: Interaction):
         pass
+
+
+class RestorableSessionStorage(SessionStorage, ABC):
+    """
+    A session storage that persists the session by itself, so that it can be restored with the session id.
+    """
+
+    @classmethod
+    @abstractmethod
+    async def _load_session_info(cls, session_id: str) -> SessionInfo | None:
+        pass
+
+    @classmethod
+    async def restore_instance(cls, id: str)->Optional['RestorableSessionStorage']:
+        session_info = await cls._load_session_info(id)
+        if session_info is not None:
+            return cls(session_id=session_info.id)
+        else:
+            return None
+
+    async def get_session_info(self) -> SessionInfo:
+        return await self._load_session_info(self.session_id)
@@ -7,8 +7,10 @@ import numpy
 from pandas import DataFrame
 
 from py_core.config import AACessTalkConfig
+from py_core.system.task.card_image_matching.card_image_match_memo import CardImageMatchMemo
 from py_core.utils.models import CardImageInfo
 from py_core.utils.vector_db import VectorDB
+from py_core.utils.vector_index import NearestNeighborIndex
 from py_core.system.model import CardInfo
 
 
@@ -37,43 +39,58 @@ class CardImageDBRetriever:
         desc_embeddings = embedding_store["emb_desc"]
         name_embeddings = embedding_store["emb_name"]
 
+        # Only used to embed the queries.
         self.__vector_db = VectorDB(embedding_model=AACessTalkConfig.embedding_model,
                                     embedding_dimensions=AACessTalkConfig.embedding_dimensions)
 
-        self.__collection_desc = self.__vector_db.get_collection("card_image_desc")
-        self.__collection_desc.add(
-            ids=[id for id in ids],
-            documents=[info.description_brief for info in info_list],
-            metadatas=[info.model_dump(include={"name", "name_ko", "category", "filename"}) for info in info_list],
-            embeddings=[emb.tolist() for emb in desc_embeddings]
-        )
+        metadatas = [info.model_dump(include={"name", "category"}) for info in info_list]
+        self.__desc_index = NearestNeighborIndex(ids, desc_embeddings, metadatas)
+        self.__name_index = NearestNeighborIndex(ids, name_embeddings, metadatas)
 
-        self.__collection_name = self.__vector_db.get_collection("names")
-        self.__collection_name.add(
-            ids=[id for id in ids],
-            documents=[info.name for info in info_list],
-            metadatas=[info.model_dump(include={"name", "name_ko", "category", "description_brief", "filename"}) for info in info_list],
-            embeddings=[emb.tolist() for emb in name_embeddings]
-        )
+        self.__ids_by_name: dict[str, list[str]] = {}
+        for info in info_list:
+            self.__ids_by_name.setdefault(info.name, []).append(info.id)
+
+        self.__match_memo = CardImageMatchMemo(CardImageMatchMemo.compute_corpus_fingerprint(
+            AACessTalkConfig.card_image_table_path, AACessTalkConfig.card_image_embeddings_path,
+            extra=f"{AACessTalkConfig.embedding_model}:{AACessTalkConfig.embedding_dimensions}"))
+
+    @property
+    def match_memo(self) -> CardImageMatchMemo:
+        return self.__match_memo
 
     def get_card_image_info(self, id: str)->CardImageInfo:
         return self.__card_info_dict[id]
 
-    def __query_result_to_info_list(self, query_result) -> list[list[tuple[CardImageInfo, float]]]:
-        list_length = len(query_result["ids"])
+    def __query_result_to_info_list(self, query_result: list[list[tuple[str, float]]]) -> list[list[tuple[CardImageInfo, float]]]:
+        return [[(self.__card_info_dict[id], distance) for id, distance in neighbors] for neighbors in query_result]
 
-        result = []
-        for i in range(list_length):
-            if len(query_result["ids"][i]) > 0:
-                objs = [self.__card_info_dict[id] for id in query_result["ids"][i]]
-                distances = [s for s in query_result["distances"][i]]
-                result.append([(o,d) for o,d in zip(objs, distances)])
-            else:
-                result.append([])
+    async def query_nearest_card_image_infos(
+        self, card_infos: list[CardInfo]
+    ) -> list[list[CardImageInfo]]:
+        """
+        Returns the matched card images of each card, the best first. Cards matched before are served from the memo.
+        """
+        result: list[list[CardImageInfo] | None] = [None] * len(card_infos)
+        for i, card_info in enumerate(card_infos):
+            image_id = self.__match_memo.get(card_info)
+            if image_id is not None and image_id in self.__card_info_dict:
+                result[i] = [self.__card_info_dict[image_id]]
+
+        idx_to_retrieve = [i for i, r in enumerate(result) if r is None]
+        print(f"{len(card_infos) - len(idx_to_retrieve)} cards matched from the memo.")
+        if len(idx_to_retrieve) > 0:
+            retrieved = await self.__retrieve_nearest_card_image_infos([card_infos[i] for i in idx_to_retrieve])
+            for i, infos in zip(idx_to_retrieve, retrieved):
+                result[i] = infos
+
+            await asyncio.to_thread(self.__match_memo.put_many, [(card_infos[i], infos[0].id)
+                                                                 for i, infos in zip(idx_to_retrieve, retrieved)
+                                                                 if infos is not None and len(infos) > 0])
 
         return result
 
-    async def query_nearest_card_image_infos(
+    async def __retrieve_nearest_card_image_infos(
         self, card_infos: list[CardInfo]
     ) -> list[list[CardImageInfo]]:
         t_start = perf_counter()
@@ -112,13 +129,10 @@ class CardImageDBRetriever:
             )
         ]
 
-        name_match_results = self.__collection_name.get(
-            where={"name": {"$in": no_name_matched_card_names}}
-        )
-
-        for id in name_match_results["ids"]:
-            card_image_info = self.__card_info_dict[id]
-            name_result_dict[card_image_info.name_en] = [card_image_info]
+        for name in no_name_matched_card_names:
+            for id in self.__ids_by_name.get(name, []):
+                card_image_info = self.__card_info_dict[id]
+                name_result_dict[card_image_info.name_en] = [card_image_info]
 
         no_name_matched_card_names = [
             name
@@ -138,24 +152,11 @@ class CardImageDBRetriever:
                 f"{len(no_name_matched_card_names)} cards will be matched through vector search..."
             )
 
-            name_query = asyncio.to_thread(self.__collection_name.query, query_texts = no_name_matched_card_names, n_results = 1)
-            desc_query = asyncio.to_thread(self.__collection_desc.query, query_texts = no_name_matched_card_names, n_results = 1)
-
-            name_query_results, desc_query_results = await asyncio.gather(name_query, desc_query)
-
-            #name_query_results = self.__collection_name.query(
-            #    query_texts=no_name_matched_card_names,
-            #    n_results=1
-            #)
-            name_query_results = self.__query_result_to_info_list(name_query_results)
-
-
-            #desc_query_results = self.__collection_desc.query(
-            #    query_texts=no_name_matched_card_names,
-            #    n_results=1
-            #)
-            desc_query_results = self.__query_result_to_info_list(desc_query_results)
+            # The name and description indices are queried with the same embeddings.
+            query_embeddings = await self.__vector_db.aembed(no_name_matched_card_names)
 
+            name_query_results = self.__query_result_to_info_list(self.__name_index.query(query_embeddings, k=1))
+            desc_query_results = self.__query_result_to_info_list(self.__desc_index.query(query_embeddings, k=1))
 
             for i, name in enumerate(no_name_matched_card_names):
                 if name_query_results[i][0][1] < 0.5:
@@ -165,7 +166,7 @@ class CardImageDBRetriever:
                     name_result_dict[name] = [desc_query_results[i][0][0]]
                     print(f"Description win - {name} => {name_result_dict[name][0].filename}")
 
-            result = [name_result_dict[name] for name in names]
+        result = [name_result_dict[name] for name in names]
 
         t_end = perf_counter()
         print(f"Card retrieval took {t_end - t_start} sec.")
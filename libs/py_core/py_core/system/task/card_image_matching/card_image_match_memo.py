@@ -0,0 +1,62 @@
+import hashlib
+import shutil
+from os import path, listdir
+
+from diskcache import Cache
+
+from py_core.config import AACessTalkConfig
+from py_core.system.model import CardInfo
+
+CardImageMatchKey = tuple[str, str, str]
+
+
+class CardImageMatchMemo:
+    """
+    Persistent memo of the stock card images matched to cards, keyed on (label, label_localized, category).
+    A memo belongs to a fingerprint of the image corpus, so a changed corpus starts an empty memo and the memos of
+    other fingerprints are removed. The whole memo is loaded into memory at startup.
+    """
+
+    def __init__(self, corpus_fingerprint: str, dir_path: str = AACessTalkConfig.card_image_match_memo_dir_path):
+        self.__dir_path = path.join(dir_path, corpus_fingerprint)
+
+        if path.exists(dir_path):
+            for name in listdir(dir_path):
+                if name != corpus_fingerprint:
+                    print(f"Remove the card image match memo of an outdated corpus: {name}")
+                    shutil.rmtree(path.join(dir_path, name), ignore_errors=True)
+
+        self.__cache = Cache(self.__dir_path)
+        self.__matches: dict[CardImageMatchKey, str] = {key: self.__cache[key] for key in self.__cache.iterkeys()}
+
+        print(f"Loaded {len(self.__matches)} card image matches.")
+
+    @staticmethod
+    def compute_corpus_fingerprint(*file_paths: str, extra: str = "") -> str:
+        digest = hashlib.md5(extra.encode("utf-8"))
+        for file_path in file_paths:
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def make_key(card: CardInfo) -> CardImageMatchKey:
+        return card.label.strip(), card.label_localized.strip(), card.category
+
+    def __len__(self) -> int:
+        return len(self.__matches)
+
+    def get(self, card: CardInfo) -> str | None:
+        return self.__matches.get(self.make_key(card))
+
+    def put_many(self, matches: list[tuple[CardInfo, str]]):
+        for card, image_id in matches:
+            key = self.make_key(card)
+            if self.__matches.get(key) != image_id:
+                self.__matches[key] = image_id
+                self.__cache.set(key, image_id)
+
+    def clear(self):
+        self.__matches.clear()
+        self.__cache.clear()
@@ -1,17 +1,21 @@
 from chatlib.tool.converter import generate_pydantic_converter
 from pydantic import BaseModel, ConfigDict
 from time import perf_counter
+from typing import AsyncIterator
 
-from chatlib.llm.integration import GPTChatCompletionAPI, ChatGPTModel
+from chatlib.llm.integration import ChatGPTModel
+from py_core.utils.llm_scheduler import shared_chat_completion_api
 from chatlib.tool.versatile_mapper import ChatCompletionFewShotMapper, ChatCompletionFewShotMapperParams
 
 from py_core.config import AACessTalkConfig
-from py_core.system.model import Dialogue, CardInfo, ChildCardRecommendationResult, ParentType, UserLocale, id_generator, CardCategory
+from py_core.system.model import Dialogue, CardInfo, ChildCardRecommendationResult, ParentType, UserLocale, id_generator, CardCategory, \
+    ChildCardRecommendationStreamEvent, ChildCardRecommendationStreamEventType
 from py_core.system.session_topic import SessionTopicInfo
 from py_core.system.task.card_recommendation.common import ChildCardRecommendationAPIResult
 from py_core.system.task.card_recommendation.translator import CardTranslator
 from py_core.system.task.dialogue_conversion import DialogueInput, DialogueInputToStrConversionFunction
 from py_core.utils.default_cards import DEFAULT_CORE_CARDS, DEFAULT_EMOTION_CARDS, DefaultCardInfo
+from py_core.utils.response_cache import response_cache, make_dialogue_context_text
 from py_core.utils.vector_db import VectorDB
 
 str_output_converter, output_str_converter = generate_pydantic_converter(ChildCardRecommendationAPIResult, 'yaml')
@@ -27,11 +31,12 @@ _convert_input_to_str = DialogueInputToStrConversionFunction(include_topic=True)
 class ChildCardRecommendationGenerator:
 
     def __init__(self, vector_db: VectorDB | None):
-        api = GPTChatCompletionAPI()
-        api.config().verbose = False
+        api = shared_chat_completion_api()
 
         self.__translator = CardTranslator(vector_db)
 
+        self.__cache = response_cache("child_cards", vector_db.embed if vector_db is not None else None)
+
         def __prompt_generator(input: DialogueInput, params: ChildCardRecommendationParams) -> str:
             prompt = (
                 f"""
@@ -76,33 +81,81 @@ class ChildCardRecommendationGenerator:
                        interim_cards: list[CardInfo] | None = None,
                        previous_recommendation: ChildCardRecommendationResult | None = None,
                        ) -> ChildCardRecommendationResult:
+        recommendation: ChildCardRecommendationResult | None = None
+        async for event in self.generate_stream(turn_id, locale, parent_type, topic_info, dialogue, interim_cards,
+                                                previous_recommendation):
+            if event.type == ChildCardRecommendationStreamEventType.Done:
+                recommendation = event.recommendation
+        return recommendation
+
+    async def generate_stream(self,
+                              turn_id: str,
+                              locale: UserLocale,
+                              parent_type: ParentType,
+                              topic_info: SessionTopicInfo,
+                              dialogue: Dialogue,
+                              interim_cards: list[CardInfo] | None = None,
+                              previous_recommendation: ChildCardRecommendationResult | None = None,
+                              ) -> AsyncIterator[ChildCardRecommendationStreamEvent]:
+        """
+        Yields the cards as soon as they are available: the static core cards first, then the emotion cards and the
+        topic/action cards found in the translation dictionary once the English cards are generated, then the rest
+        once translated. The last event is Done, carrying the complete recommendation.
+        """
         t_start = perf_counter()
 
-        recommendation = await self.__mapper.run(
-            None,
-            input=DialogueInput(
-                dialogue=dialogue, topic=topic_info, parent_type=parent_type
-            ),
-            params=ChildCardRecommendationParams(
-                prev_recommendation=previous_recommendation,
-                interim_cards=interim_cards,
-                model="qwen3-max",
-                api_params={},
-            ),
-        )
-
-        t_trans = perf_counter()
-
-        print(f"English cards generated: {t_trans - t_start} sec.")
+        rec_id = id_generator()
 
-        translated_keywords = None if locale == UserLocale.English else await self.__translator.translate(recommendation)
+        core_cards = [self.__make_default_card(c, locale, parent_type, rec_id) for c in DEFAULT_CORE_CARDS]
+        yield ChildCardRecommendationStreamEvent(type=ChildCardRecommendationStreamEventType.Cards,
+                                                 recommendation_id=rec_id, cards=core_cards)
+
+        # A refresh asks for cards distinct to the previous ones, so it is not served from the cache.
+        use_cache = self.__cache is not None and previous_recommendation is None
+        if use_cache:
+            cache_partition = "|".join([locale, parent_type, topic_info.model_dump_json(),
+                                        ",".join(card.label for card in interim_cards or [])])
+            cache_lookup = await self.__cache.get(
+                cache_partition, make_dialogue_context_text(dialogue, AACessTalkConfig.response_cache_context_messages))
+
+        def run_mapper():
+            return self.__mapper.run(
+                None,
+                input=DialogueInput(
+                    dialogue=dialogue, topic=topic_info, parent_type=parent_type
+                ),
+                params=ChildCardRecommendationParams(
+                    prev_recommendation=previous_recommendation,
+                    interim_cards=interim_cards,
+                    model="qwen3-max",
+                    api_params={},
+                ),
+            )
 
-        t_end = perf_counter()
+        if use_cache:
+            cached_cards = cache_lookup.value
+            if cached_cards is None:
+                cached_cards, recommendation = await self.__cache.generate(cache_lookup, run_mapper())
+            if cached_cards is not None:
+                cards = [CardInfo(label=label, label_localized=label_localized, category=category,
+                                  recommendation_id=rec_id)
+                         for label, label_localized, category in cached_cards]
+                print(f"Cards served from the cache: {perf_counter() - t_start} sec.")
+                yield ChildCardRecommendationStreamEvent(type=ChildCardRecommendationStreamEventType.Cards,
+                                                         recommendation_id=rec_id, cards=cards)
+                yield ChildCardRecommendationStreamEvent(
+                    type=ChildCardRecommendationStreamEventType.Done,
+                    recommendation_id=rec_id,
+                    recommendation=ChildCardRecommendationResult(id=rec_id, turn_id=turn_id,
+                                                                 cards=cards + core_cards)
+                )
+                return
+        else:
+            recommendation = await run_mapper()
 
-        print(f"Card translated {t_end - t_trans} sec.")
-        print(f"Total latency: {t_end - t_start} sec.")
+        t_trans = perf_counter()
 
-        rec_id = id_generator()
+        print(f"English cards generated: {t_trans - t_start} sec.")
 
         keyword_category_list = [(word, CardCategory.Topic) for word in recommendation.topics] + [
             (word, CardCategory.Action) for word in recommendation.actions]
@@ -115,29 +168,59 @@ class ChildCardRecommendationGenerator:
             else:
                 print(f"Emotion not matched - {emotion}")
 
-        return ChildCardRecommendationResult(
-            id=rec_id,
-            turn_id=turn_id,
-            cards=[
-                CardInfo(
-                    label=word,
-                    label_localized=translated_keywords[i]
-                    if locale != UserLocale.English
-                    else word,
-                    category=category,
-                    recommendation_id=rec_id,
-                )
+        emotion_cards = [self.__make_default_card(c, locale, parent_type, rec_id) for c in selected_emotion_cards]
+
+        if locale == UserLocale.English:
+            keyword_cards = [CardInfo(label=word, label_localized=word, category=category, recommendation_id=rec_id)
+                             for word, category in keyword_category_list]
+            yield ChildCardRecommendationStreamEvent(type=ChildCardRecommendationStreamEventType.Cards,
+                                                     recommendation_id=rec_id, cards=emotion_cards + keyword_cards)
+        else:
+            looked_up_words = self.__translator.lookup(recommendation)
+            keyword_cards: list[CardInfo | None] = [
+                CardInfo(label=word, label_localized=looked_up_words[i], category=category, recommendation_id=rec_id)
+                if looked_up_words[i] is not None else None
                 for i, (word, category) in enumerate(keyword_category_list)
             ]
-            + [
-                CardInfo(
-                    label=c.get_label_for_parent(parent_type),
-                    label_localized=c.get_label_localized_for_parent(
-                        locale, parent_type
-                    ),
-                    recommendation_id=rec_id,
-                    category=c.category,
-                )
-                for c in (selected_emotion_cards + DEFAULT_CORE_CARDS)
-            ],
+            yield ChildCardRecommendationStreamEvent(type=ChildCardRecommendationStreamEventType.Cards,
+                                                     recommendation_id=rec_id,
+                                                     cards=emotion_cards + [c for c in keyword_cards if c is not None])
+
+            if any(c is None for c in keyword_cards):
+                translated_keywords = await self.__translator.translate(recommendation, looked_up_words=looked_up_words)
+                translated_cards = []
+                for i, (word, category) in enumerate(keyword_category_list):
+                    if keyword_cards[i] is None:
+                        keyword_cards[i] = CardInfo(label=word, label_localized=translated_keywords[i],
+                                                    category=category, recommendation_id=rec_id)
+                        translated_cards.append(keyword_cards[i])
+                yield ChildCardRecommendationStreamEvent(type=ChildCardRecommendationStreamEventType.Cards,
+                                                         recommendation_id=rec_id, cards=translated_cards)
+
+        t_end = perf_counter()
+
+        print(f"Card translated {t_end - t_trans} sec.")
+        print(f"Total latency: {t_end - t_start} sec.")
+
+        if use_cache:
+            await self.__cache.put(cache_lookup, [(card.label, card.label_localized, card.category)
+                                                  for card in keyword_cards + emotion_cards])
+
+        yield ChildCardRecommendationStreamEvent(
+            type=ChildCardRecommendationStreamEventType.Done,
+            recommendation_id=rec_id,
+            recommendation=ChildCardRecommendationResult(
+                id=rec_id,
+                turn_id=turn_id,
+                cards=keyword_cards + emotion_cards + core_cards,
+            )
+        )
+
+    @staticmethod
+    def __make_default_card(card: DefaultCardInfo, locale: UserLocale, parent_type: ParentType, rec_id: str) -> CardInfo:
+        return CardInfo(
+            label=card.get_label_for_parent(parent_type),
+            label_localized=card.get_label_localized_for_parent(locale, parent_type),
+            recommendation_id=rec_id,
+            category=card.category,
         )
@@ -1,7 +1,8 @@
+import asyncio
 from itertools import groupby
 
 import spacy
-from chatlib.llm.integration import GPTChatCompletionAPI
+from py_core.utils.llm_scheduler import shared_chat_completion_api
 from chatlib.tool.converter import generate_type_converter
 from chatlib.tool.versatile_mapper import ChatCompletionFewShotMapper, ChatCompletionFewShotMapperParams
 from chatlib.utils.jinja_utils import convert_to_jinja_template
@@ -11,6 +12,7 @@ from py_core.config import AACessTalkConfig
 from py_core.system.model import UserLocale
 from py_core.utils.lookup_translator import LookupTranslator
 from py_core.utils.models import DictionaryRow
+from py_core.utils.translate.translation_memory import translation_memory
 from py_core.utils.vector_db import VectorDB
 from .common import ChildCardRecommendationAPIResult
 
@@ -62,8 +64,7 @@ str_output_converter, output_str_converter = generate_type_converter(list[str],
 class CardTranslator:
 
     def __init__(self, vector_db: VectorDB | None):
-        api = GPTChatCompletionAPI()
-        api.config().verbose = False
+        api = shared_chat_completion_api()
 
         auto_update_dictionary = env_helper.get_env_variable(env_variables.AUTO_UPDATE_CARD_TRANSLATIONS) or "false"
         self.__auto_update_dictionary = auto_update_dictionary.lower() == 'true'
@@ -87,28 +88,52 @@ class CardTranslator:
         doc = self.__nlp(word)
         return ' '.join([token.text.lower() if token.pos_ != "PROPN" else token.text for token in doc])
 
-    async def translate(
+    def __make_word_list(self, card_set: ChildCardRecommendationAPIResult) -> list[tuple[str, str]]:
+        return ([(self.__transform_original_word(word), "topic") for word in card_set.topics] +
+                [(self.__transform_original_word(word), "action") for word in card_set.actions])
+
+    def lookup(
         self,
         card_set: ChildCardRecommendationAPIResult,
         user_locale: UserLocale = UserLocale.SimplifiedChinese,
-    ) -> list[str]:
+    ) -> list[str | None]:
+        """Translates the topic and action cards only with the dictionary. Cards not in the dictionary are None."""
+        return self.__lookup(self.__make_word_list(card_set), user_locale)
 
-        word_list = ([(self.__transform_original_word(word), "topic") for word in card_set.topics] +
-                     [(self.__transform_original_word(word), "action") for word in card_set.actions])
-
-        # Lookup dictionary
+    def __lookup(self, word_list: list[tuple[str, str]], user_locale: UserLocale) -> list[str | None]:
         localized_words: list[str | None] = [None] * len(word_list)
 
-        dictionary_hit_count = 0
         for i, (word, category) in enumerate(word_list):
             localized = self.__dictionary.lookup(word, category, user_locale)
             if localized is not None:
                 localized_words[i] = localized
-                dictionary_hit_count += 1
 
         print("Lookup result:", localized_words)
+        return localized_words
 
-        if len(word_list) - dictionary_hit_count > 0:
+    async def translate(
+        self,
+        card_set: ChildCardRecommendationAPIResult,
+        user_locale: UserLocale = UserLocale.SimplifiedChinese,
+        looked_up_words: list[str | None] | None = None,
+    ) -> list[str]:
+        """
+        Translates the topic and action cards. Pass the result of lookup() as looked_up_words to skip the dictionary lookup.
+        """
+        word_list = self.__make_word_list(card_set)
+
+        # Lookup dictionary
+        localized_words = list(looked_up_words) if looked_up_words is not None else self.__lookup(word_list, user_locale)
+
+        if any(word is None for word in localized_words):
+            # Words the dictionary misses may have been translated by the LLM before.
+            indices_to_recall = [i for i, word in enumerate(localized_words) if word is None]
+            recalled_words = await translation_memory().aget_many(
+                [_stringify_english_word(*word_list[i]) for i in indices_to_recall], "card", UserLocale.English, user_locale)
+            for i, recalled in zip(indices_to_recall, recalled_words):
+                localized_words[i] = recalled
+
+        if any(word is None for word in localized_words):
 
             indices_to_translate = [i for i, word in enumerate(localized_words) if word is None]
 
@@ -116,9 +141,11 @@ class CardTranslator:
                                   if localized_words[i] is None]
 
             similar_card_set: set[DictionaryRow] = set()
-            for category, group in groupby(words_to_translate, key=lambda elm: elm[1]):
-                l = list(group)
-                similar_cards = self.__dictionary.query_similar_rows([word for word, category in l], category, k=5)
+            similar_card_lists = await asyncio.gather(*[
+                self.__dictionary.aquery_similar_rows([word for word, _ in group], category, k=5)
+                for category, group in groupby(words_to_translate, key=lambda elm: elm[1])
+            ])
+            for similar_cards in similar_card_lists:
                 for c in similar_cards:
                     similar_card_set.add(c)
 
@@ -141,15 +168,16 @@ class CardTranslator:
             if len(result) > len(input):
                 print("Resulting dict exceeds the input length.")
 
+            await translation_memory().aput_many(
+                [(input[i], translated) for i, translated in enumerate(result[:len(input)])],
+                "card", UserLocale.English, user_locale)
+
             for i, translated in enumerate(result):
                 localized_words[indices_to_translate[i]] = translated
 
                 if self.__auto_update_dictionary is True:
-                    # Update dictionary for future reuse
+                    # Update dictionary for future reuse. Persisted by the dictionary in the background.
                     word, category = word_list[indices_to_translate[i]]
                     self.__dictionary.update(word, category, translated)
 
-            if self.__auto_update_dictionary is True:
-                self.__dictionary.write_to_file()
-
         return localized_words
@@ -4,7 +4,8 @@ from time import perf_counter
 from chatlib.tool.converter import generate_pydantic_converter
 from chatlib.tool.versatile_mapper import ChatCompletionFewShotMapper, ChatCompletionFewShotMapperParams, \
     MapperInputOutputPair
-from chatlib.llm.integration import GPTChatCompletionAPI, ChatGPTModel
+from chatlib.llm.integration import ChatGPTModel
+from py_core.utils.llm_scheduler import shared_chat_completion_api
 
 from py_core.system.guide_categories import DialogueInspectionCategory
 from py_core.system.model import Dialogue, DialogueMessage, DialogueRole, CardCategory
@@ -90,7 +91,7 @@ class DialogueInspector:
 
         self.__mapper: ChatCompletionFewShotMapper[
             Dialogue, DialogueInspectionResult, ChatCompletionFewShotMapperParams] = ChatCompletionFewShotMapper(
-            api=GPTChatCompletionAPI(),
+            api=shared_chat_completion_api(),
             instruction_generator=_prompt_generator,
             input_str_converter=DialogueToStrConversionFunction(message_row_formatter=self.__format_dialogue_row),
             str_output_converter=str_output_converter,
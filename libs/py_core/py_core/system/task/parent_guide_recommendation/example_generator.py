@@ -1,6 +1,7 @@
 from time import perf_counter
 
-from chatlib.llm.integration import GPTChatCompletionAPI, ChatGPTModel
+from chatlib.llm.integration import ChatGPTModel
+from py_core.utils.llm_scheduler import shared_chat_completion_api
 from chatlib.tool.converter import str_to_str_noop
 from chatlib.utils.jinja_utils import convert_to_jinja_template
 from chatlib.tool.versatile_mapper import ChatCompletionFewShotMapperParams, ChatCompletionFewShotMapper, \
@@ -71,8 +72,7 @@ _EXAMPLES = [
 
 class ParentExampleMessageGenerator:
     def __init__(self, vector_db: VectorDB | None):
-        api = GPTChatCompletionAPI()
-        api.config().verbose = False
+        api = shared_chat_completion_api()
 
         self.__mapper: ChatCompletionFewShotMapper[
             ParentExampleMessageGenerationInput,
@@ -1,15 +1,18 @@
 import re
 
-from chatlib.llm.integration import GPTChatCompletionAPI, ChatGPTModel
+from chatlib.llm.integration import ChatGPTModel
+from py_core.utils.llm_scheduler import shared_chat_completion_api
 from chatlib.tool.versatile_mapper import ChatCompletionFewShotMapper, ChatCompletionFewShotMapperParams, \
     MapperInputOutputPair
 from chatlib.utils.jinja_utils import convert_to_jinja_template
 from time import perf_counter
 
 from py_core.config import AACessTalkConfig
+from py_core.system.model import UserLocale
 from py_core.system.task.parent_guide_recommendation.common import ParentGuideRecommendationAPIResult
 from py_core.utils.lookup_translator import LookupTranslator
 from py_core.utils.models import DictionaryRow
+from py_core.utils.translate.translation_memory import translation_memory
 from py_core.utils.vector_db import VectorDB
 
 template = convert_to_jinja_template("""You are a helpful translator who translates an utterance of a parent talking with their child with ASD.
@@ -28,8 +31,7 @@ def _generate_prompt(input, params) -> str:
 class ParentExampleMessageTranslator:
 
     def __init__(self, vector_db: VectorDB | None):
-        api = GPTChatCompletionAPI()
-        api.config().verbose = False
+        api = shared_chat_completion_api()
 
         self.__dictionary = LookupTranslator("parent_examples",
                                              AACessTalkConfig.parent_example_translation_dictionary_path,
@@ -42,7 +44,13 @@ class ParentExampleMessageTranslator:
     async def translate_example(self, original_message: str) -> str:
         t_start = perf_counter()
 
-        samples = self.__dictionary.query_similar_rows(original_message, None, k=3)
+        # The prompt translates to Korean.
+        memory = translation_memory()
+        [remembered] = await memory.aget_many([original_message], "parent_example", UserLocale.English, UserLocale.Korean)
+        if remembered is not None:
+            return remembered
+
+        samples = await self.__dictionary.aquery_similar_rows(original_message, None, k=3)
 
         samples_formatted = [
             MapperInputOutputPair(input=sample.english, output=sample.localized) for sample in samples
@@ -55,4 +63,6 @@ class ParentExampleMessageTranslator:
 
         print(f"LLM translation took {t_end - t_start} sec.")
 
+        await memory.aput_many([(original_message, result)], "parent_example", UserLocale.English, UserLocale.Korean)
+
         return result
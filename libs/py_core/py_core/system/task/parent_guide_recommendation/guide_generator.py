@@ -1,4 +1,5 @@
-from chatlib.llm.integration.openai_api import GPTChatCompletionAPI, ChatGPTModel
+from chatlib.llm.integration.openai_api import ChatGPTModel
+from py_core.utils.llm_scheduler import shared_chat_completion_api
 from chatlib.tool.converter import generate_pydantic_list_converter
 from chatlib.tool.versatile_mapper import ChatCompletionFewShotMapper, ChatCompletionFewShotMapperParams, \
     MapperInputOutputPair
@@ -12,6 +13,9 @@ from py_core.system.task.parent_guide_recommendation.common import ParentGuideRe
 from py_core.system.task.parent_guide_recommendation.guide_translator import GuideTranslator
 from py_core.system.task.dialogue_conversion import DialogueInput, DialogueInputToStrConversionFunction
 from py_core.system.session_topic import SessionTopicCategory, SessionTopicInfo
+from py_core.config import AACessTalkConfig
+from py_core.utils.response_cache import response_cache, make_dialogue_context_text
+from py_core.utils.vector_db import VectorDB
 
 class ParentGuideRecommendationParams(ChatCompletionFewShotMapperParams):
     dialogue_inspection_result: DialogueInspectionResult | None = None
@@ -138,7 +142,7 @@ PARENT_GUIDE_EXAMPLES: list[
 
 # Generator ==========================================
 class ParentGuideRecommendationGenerator:
-    def __init__(self):
+    def __init__(self, vector_db: VectorDB | None = None):
         str_output_converter, output_str_converter = generate_pydantic_list_converter(
             ParentGuideRecommendationAPIResult,
             ParentGuideElement,
@@ -146,8 +150,7 @@ class ParentGuideRecommendationGenerator:
             dict(include={"category", "guide"}),
         )
 
-        api = GPTChatCompletionAPI()
-        api.config().verbose = False
+        api = shared_chat_completion_api()
 
         self.__mapper: ChatCompletionFewShotMapper[
             DialogueInput,
@@ -163,6 +166,8 @@ class ParentGuideRecommendationGenerator:
 
         self.__translator = GuideTranslator()
 
+        self.__cache = response_cache("parent_guides", vector_db.embed if vector_db is not None else None)
+
     async def generate(
         self,
         turn_id: str,
@@ -175,11 +180,31 @@ class ParentGuideRecommendationGenerator:
 
         parent_type_str = dyad.parent_type.value
 
-        guide_list: ParentGuideRecommendationAPIResult = await self.__mapper.run(
-            PARENT_GUIDE_EXAMPLES,
-            DialogueInput(parent_type=parent_type_str, topic=topic, dialogue=dialogue),
-            ParentGuideRecommendationParams.instance(inspection_result),
-        )
+        # Guides with an inspection feedback depend on the feedback, so they are not served from the cache.
+        use_cache = self.__cache is not None and (inspection_result is None or inspection_result.feedback is None)
+        if use_cache:
+            cache_partition = "|".join([dyad.locale, parent_type_str, topic.model_dump_json()])
+            cache_lookup = await self.__cache.get(
+                cache_partition, make_dialogue_context_text(dialogue, AACessTalkConfig.response_cache_context_messages))
+
+        def run_mapper():
+            return self.__mapper.run(
+                PARENT_GUIDE_EXAMPLES,
+                DialogueInput(parent_type=parent_type_str, topic=topic, dialogue=dialogue),
+                ParentGuideRecommendationParams.instance(inspection_result),
+            )
+
+        if use_cache:
+            cached_guides = cache_lookup.value
+            if cached_guides is None:
+                cached_guides, guide_list = await self.__cache.generate(cache_lookup, run_mapper())
+            if cached_guides is not None:
+                print(f"Guides served from the cache: {perf_counter() - t_start} sec.")
+                return ParentGuideRecommendationResult(
+                    guides=[ParentGuideElement.model_validate(guide) for guide in cached_guides],
+                    turn_id=turn_id)
+        else:
+            guide_list: ParentGuideRecommendationAPIResult = await run_mapper()
 
         if inspection_result is not None and inspection_result.feedback is not None:
             guide_list = guide_list[:2]
@@ -197,4 +222,21 @@ class ParentGuideRecommendationGenerator:
         t_end = perf_counter()
         print(f"Translation took {t_end - t_trans} sec.")
         print(f"Total latency: {t_end - t_start} sec.")
+
+        if use_cache:
+            await self.__cache.put(cache_lookup, [guide.model_dump(exclude={"id"}) for guide in translated_guide_list])
+
         return ParentGuideRecommendationResult(guides=translated_guide_list, turn_id=turn_id)
+
+    async def generate_feedback_guide(
+        self, dyad: Dyad, inspection_result: DialogueInspectionResult
+    ) -> ParentGuideElement | None:
+        """Makes the feedback guide of an inspection result that arrived after the guides were generated."""
+        if inspection_result.feedback is None:
+            return None
+
+        guide = ParentGuideElement.feedback(inspection_result.categories, inspection_result.feedback)
+        if dyad.locale == UserLocale.English:
+            return guide
+        else:
+            return await self.__translator.translate(guide, dyad.locale)
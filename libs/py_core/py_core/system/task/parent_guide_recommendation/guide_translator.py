@@ -20,6 +20,7 @@ class GuideTranslator:
             user_locale=user_locale,
             target_lang=user_locale,
             context="The phrases are guides for parents' communication with children with Autism Spectrum Disorder. The sentences should be translated into casual lanauge so parents can easily understand and use them.",
+            domain="parent_guide",
         )
 
         return [entry.with_guide_localized(guide) for guide, entry in zip(translated_guides, guides)] if isinstance(guides, list) else guides.with_guide_localized(translated_guides)
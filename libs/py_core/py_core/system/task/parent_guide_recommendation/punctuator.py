@@ -1,10 +1,10 @@
-from chatlib.llm.integration import GPTChatCompletionAPI
+from py_core.utils.llm_scheduler import shared_chat_completion_api
 from chatlib.tool.versatile_mapper import ChatCompletionFewShotMapper, ChatCompletionFewShotMapperParams
 
 class Punctuator:
     def __init__(self) -> None:
         self.__mapper = ChatCompletionFewShotMapper.make_str_mapper(
-            GPTChatCompletionAPI(),
+            shared_chat_completion_api(),
             """
 The user will give you a utterance recorded and dictated by ASR.
 Put or modify punctuations to the sentence. It is important to put a question mark to sentences that are suspicious to be a question.""",
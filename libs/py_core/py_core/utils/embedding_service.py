@@ -0,0 +1,196 @@
+import asyncio
+import hashlib
+import threading
+from asyncio import to_thread
+from collections import OrderedDict, Counter
+
+from diskcache import Cache
+from openai import OpenAI, AsyncOpenAI
+
+from chatlib.llm.integration import GPTChatCompletionAPI
+from chatlib.utils.integration import APIAuthorizationVariableSpecPresets
+
+from py_core.config import AACessTalkConfig
+
+
+class EmbeddingService:
+    """
+    Embeds texts with a model, caching the embeddings in an in-memory LRU and on the disk, keyed on
+    (model, dimensions, text). Concurrent async requests for the same text share a single API request.
+    """
+
+    # Maximum number of texts in an embedding request.
+    batch_size = 10
+
+    def __init__(self, api_key: str, model: str, dimensions: int, cache_size: int, disk_dir_path: str | None):
+        self.__model = model
+        self.__dimensions = dimensions
+
+        self.__client = OpenAI(api_key=api_key)
+        self.__async_client = AsyncOpenAI(api_key=api_key)
+
+        self.__lock = threading.Lock()
+        self.__cache_size = cache_size
+        self.__memory: OrderedDict[str, list[float]] = OrderedDict()
+        self.__disk: Cache | None = Cache(disk_dir_path) if disk_dir_path is not None else None
+
+        self.__in_flight: dict[str, asyncio.Future] = {}
+        # Detached tasks resolving the in-flight futures, kept until they finish.
+        self.__resolving: set[asyncio.Task] = set()
+
+        self.__stats = Counter()
+
+    def __make_key(self, text: str) -> str:
+        return f"{self.__model}:{self.__dimensions}:{hashlib.md5(text.encode('utf-8')).hexdigest()}"
+
+    def __get_memory(self, key: str) -> list[float] | None:
+        with self.__lock:
+            embedding = self.__memory.get(key)
+            if embedding is not None:
+                self.__memory.move_to_end(key)
+            return embedding
+
+    def __put_memory(self, key: str, embedding: list[float]):
+        with self.__lock:
+            self.__memory[key] = embedding
+            self.__memory.move_to_end(key)
+            while len(self.__memory) > self.__cache_size:
+                self.__memory.popitem(last=False)
+
+    def __lookup(self, keys: list[str]) -> dict[str, list[float]]:
+        found: dict[str, list[float]] = {}
+        for key in keys:
+            embedding = self.__get_memory(key)
+            if embedding is not None:
+                self.__stats["hits_memory"] += 1
+                found[key] = embedding
+            elif self.__disk is not None:
+                embedding = self.__disk.get(key)
+                if embedding is not None:
+                    self.__stats["hits_disk"] += 1
+                    self.__put_memory(key, embedding)
+                    found[key] = embedding
+        return found
+
+    def __store(self, keys: list[str], embeddings: list[list[float]]):
+        for key, embedding in zip(keys, embeddings):
+            self.__put_memory(key, embedding)
+            if self.__disk is not None:
+                self.__disk.set(key, embedding)
+
+    def __request(self, texts: list[str]) -> list[list[float]]:
+        result = self.__client.embeddings.create(input=texts, model=self.__model, dimensions=self.__dimensions)
+        self.__stats["requests"] += 1
+        self.__stats["embedded"] += len(texts)
+        return [datum.embedding for datum in result.data]
+
+    async def __arequest(self, texts: list[str]) -> list[list[float]]:
+        result = await self.__async_client.embeddings.create(input=texts, model=self.__model,
+                                                             dimensions=self.__dimensions)
+        self.__stats["requests"] += 1
+        self.__stats["embedded"] += len(texts)
+        return [datum.embedding for datum in result.data]
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        keys = [self.__make_key(text) for text in texts]
+        found = self.__lookup(list(dict.fromkeys(keys)))
+
+        missing = list(dict.fromkeys((key, text) for key, text in zip(keys, texts) if key not in found))
+        for i in range(0, len(missing), self.batch_size):
+            batch = missing[i: i + self.batch_size]
+            embeddings = self.__request([text for _, text in batch])
+            self.__store([key for key, _ in batch], embeddings)
+            found.update({key: embedding for (key, _), embedding in zip(batch, embeddings)})
+
+        return [found[key] for key in keys]
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        keys = [self.__make_key(text) for text in texts]
+        unique_keys = list(dict.fromkeys(keys))
+
+        found = {key: embedding for key in unique_keys if (embedding := self.__get_memory(key)) is not None}
+        self.__stats["hits_memory"] += len(found)
+
+        waiting = {key: self.__in_flight[key] for key in unique_keys if key not in found and key in self.__in_flight}
+        self.__stats["coalesced"] += len(waiting)
+
+        to_resolve = [(key, text) for key, text in dict.fromkeys(zip(keys, texts))
+                      if key not in found and key not in waiting]
+        if len(to_resolve) > 0:
+            loop = asyncio.get_running_loop()
+            futures = {key: loop.create_future() for key, _ in to_resolve}
+            self.__in_flight.update(futures)
+            # Detached, so that cancelling this request does not cancel the requests that joined it.
+            task = asyncio.create_task(self.__resolve(to_resolve, futures))
+            self.__resolving.add(task)
+            task.add_done_callback(self.__resolving.discard)
+            waiting.update(futures)
+
+        for key, future in waiting.items():
+            found[key] = await asyncio.shield(future)
+
+        return [found[key] for key in keys]
+
+    async def __resolve(self, to_resolve: list[tuple[str, str]], futures: dict[str, asyncio.Future]):
+        """Resolves the futures with the embeddings from the disk or from the API, or with the exception."""
+        try:
+            if self.__disk is not None:
+                from_disk = await to_thread(self.__lookup, [key for key, _ in to_resolve])
+                for key, embedding in from_disk.items():
+                    futures[key].set_result(embedding)
+                to_request = [(key, text) for key, text in to_resolve if key not in from_disk]
+            else:
+                to_request = to_resolve
+
+            for i in range(0, len(to_request), self.batch_size):
+                batch = to_request[i: i + self.batch_size]
+                embeddings = await self.__arequest([text for _, text in batch])
+                await to_thread(self.__store, [key for key, _ in batch], embeddings)
+                for (key, _), embedding in zip(batch, embeddings):
+                    futures[key].set_result(embedding)
+        except Exception as ex:
+            for future in futures.values():
+                if not future.done():
+                    future.set_exception(ex)
+        except BaseException:
+            for future in futures.values():
+                future.cancel()
+            raise
+        finally:
+            for key in futures:
+                self.__in_flight.pop(key, None)
+            for future in futures.values():
+                if future.done() and not future.cancelled():
+                    # Mark the exception retrieved, for the futures nobody else waits for.
+                    future.exception()
+
+    def metrics(self) -> dict[str, int]:
+        return dict(
+            memory_entries=len(self.__memory),
+            hits_memory=self.__stats["hits_memory"],
+            hits_disk=self.__stats["hits_disk"],
+            coalesced=self.__stats["coalesced"],
+            requests=self.__stats["requests"],
+            embedded=self.__stats["embedded"],
+        )
+
+
+_services: dict[tuple[str, int], EmbeddingService] = {}
+_services_lock = threading.Lock()
+
+
+def embedding_service(model: str = AACessTalkConfig.embedding_model,
+                      dimensions: int = AACessTalkConfig.embedding_dimensions) -> EmbeddingService:
+    """The embedding service of the model, shared in the process."""
+    with _services_lock:
+        if (model, dimensions) not in _services:
+            GPTChatCompletionAPI.assert_authorize()
+            api_key = GPTChatCompletionAPI.get_auth_variable_for_spec(APIAuthorizationVariableSpecPresets.ApiKey)
+            _services[(model, dimensions)] = EmbeddingService(api_key, model, dimensions,
+                                                              cache_size=AACessTalkConfig.embedding_cache_size,
+                                                              disk_dir_path=AACessTalkConfig.embedding_cache_dir_path)
+        return _services[(model, dimensions)]
+
+
+def embedding_service_metrics() -> dict[str, dict[str, int]]:
+    return {f"{model}-{dimensions}": service.metrics() for (model, dimensions), service in _services.items()}
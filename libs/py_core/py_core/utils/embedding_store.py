@@ -0,0 +1,209 @@
+import fcntl
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from os import path, makedirs
+from time import time_ns
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator
+
+import numpy
+
+from py_core.config import AACessTalkConfig
+
+
+class EmbeddingStore:
+    """
+    Persistent store of the document embeddings of a model, keyed on the hash of the document text, so that a document
+    is embedded only once.
+
+    Saved as a float32 matrix and its keys in .npy files, which are memory-mapped at load. The manifest file names the
+    current pair and is replaced atomically on save(). New embeddings are kept in memory until then.
+    Worker processes may save the same store, so save() runs under a file lock and merges the embeddings saved by
+    others.
+    An unreadable store is ignored, as it only saves the embedding calls.
+    """
+
+    def __init__(self, dir_path: str, model: str, dimensions: int):
+        self.__dir_path = path.join(dir_path, f"{model.replace('/', '_')}-{dimensions}")
+        self.__model = model
+        self.__dimensions = dimensions
+
+        self.__lock = threading.RLock()
+        self.__matrix: numpy.ndarray = numpy.zeros((0, dimensions), dtype=numpy.float32)
+        self.__index: dict[str, int] = {}
+        self.__new_embeddings: dict[str, numpy.ndarray] = {}
+
+        self.__load()
+
+    @property
+    def __manifest_path(self) -> str:
+        return path.join(self.__dir_path, "manifest.json")
+
+    @staticmethod
+    def content_key(text: str) -> str:
+        return hashlib.md5(text.encode("utf-8")).hexdigest()
+
+    def __read(self) -> tuple[dict, numpy.ndarray, numpy.ndarray] | None:
+        """Reads the manifest and the memory-mapped keys and matrix it names. None if there is no usable store."""
+        if not path.exists(self.__manifest_path):
+            return None
+
+        try:
+            with open(self.__manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+
+            if manifest["model"] != self.__model or manifest["dimensions"] != self.__dimensions:
+                print(f"Embedding store at {self.__dir_path} was built for another model. Ignore it.")
+                return None
+            elif manifest["count"] == 0:
+                return None
+
+            keys = numpy.load(path.join(self.__dir_path, manifest["keys"]), mmap_mode="r")
+            matrix = numpy.load(path.join(self.__dir_path, manifest["matrix"]), mmap_mode="r")
+        except (OSError, ValueError, KeyError) as ex:
+            # Missing files (e.g., replaced by another worker in the meantime) or a corrupt manifest.
+            print(f"Embedding store at {self.__dir_path} is not readable. Ignore it.", ex)
+            return None
+
+        if len(keys) != len(matrix):
+            print(f"Embedding store at {self.__dir_path} is inconsistent. Ignore it.")
+            return None
+
+        return manifest, keys, matrix
+
+    def __load(self):
+        stored = self.__read()
+        if stored is not None:
+            _, keys, matrix = stored
+            self.__matrix = matrix
+            self.__index = {key.decode("ascii"): i for i, key in enumerate(keys.tolist())}
+
+    @contextmanager
+    def __locked_dir(self) -> Iterator[None]:
+        with open(path.join(self.__dir_path, ".lock"), mode="a") as lock_file:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def __len__(self) -> int:
+        return len(self.__index) + len(self.__new_embeddings)
+
+    @property
+    def is_dirty(self) -> bool:
+        return len(self.__new_embeddings) > 0
+
+    def get(self, texts: list[str]) -> list[numpy.ndarray | None]:
+        result = []
+        with self.__lock:
+            for text in texts:
+                key = self.content_key(text)
+                if key in self.__new_embeddings:
+                    result.append(self.__new_embeddings[key])
+                elif key in self.__index:
+                    result.append(self.__matrix[self.__index[key]])
+                else:
+                    result.append(None)
+        return result
+
+    def put(self, texts: list[str], embeddings: Iterable[Iterable[float]]):
+        with self.__lock:
+            for text, embedding in zip(texts, embeddings):
+                self.__new_embeddings[self.content_key(text)] = numpy.asarray(embedding, dtype=numpy.float32)
+
+    def embed(self, texts: list[str], embedding_function: Callable[[list[str]], list[list[float]]],
+              batch_size: int = 10) -> list[list[float]]:
+        """Returns the embeddings of the texts, computing only the ones not in the store."""
+        embeddings = self.get(texts)
+
+        missing_texts = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        if len(missing_texts) > 0:
+            for i in range(0, len(missing_texts), batch_size):
+                batch = missing_texts[i: i + batch_size]
+                self.put(batch, embedding_function(batch))
+            embeddings = self.get(texts)
+
+        return [embedding.tolist() for embedding in embeddings]
+
+    def save(self, retain_texts: Iterable[str] | None = None):
+        """
+        Writes the store to the disk. If retain_texts is given, the embeddings of the other texts are dropped.
+        """
+        with self.__lock:
+            if not path.exists(self.__dir_path):
+                makedirs(self.__dir_path)
+
+            with self.__locked_dir():
+                # Embeddings saved by other workers since this one loaded the store.
+                stored = self.__read()
+                entries: dict[str, numpy.ndarray] = {}
+                if stored is not None:
+                    previous_manifest, stored_keys, stored_matrix = stored
+                    entries.update({key.decode("ascii"): stored_matrix[i]
+                                    for i, key in enumerate(stored_keys.tolist())})
+                else:
+                    previous_manifest = None
+                entries.update({key: self.__matrix[i] for key, i in self.__index.items()})
+                entries.update(self.__new_embeddings)
+                if retain_texts is not None:
+                    retained_keys = {self.content_key(text) for text in retain_texts}
+                    entries = {key: embedding for key, embedding in entries.items() if key in retained_keys}
+
+                keys = numpy.array(list(entries.keys()), dtype="S32")
+                matrix = numpy.ascontiguousarray(numpy.stack(list(entries.values())) if len(entries) > 0
+                                                 else numpy.zeros((0, self.__dimensions)), dtype=numpy.float32)
+
+                version = time_ns()
+                manifest = dict(model=self.__model, dimensions=self.__dimensions, count=len(entries),
+                                keys=f"keys-{version}.npy", matrix=f"embeddings-{version}.npy")
+                self.__write_atomic(manifest["keys"], lambda f: numpy.save(f, keys))
+                self.__write_atomic(manifest["matrix"], lambda f: numpy.save(f, matrix))
+                self.__write_atomic("manifest.json", lambda f: f.write(json.dumps(manifest).encode("utf-8")))
+
+                # Files of the previous manifest are kept too, as another worker may have just read it
+                # and be loading them.
+                referenced = {manifest["keys"], manifest["matrix"]}
+                if previous_manifest is not None:
+                    referenced.update({previous_manifest["keys"], previous_manifest["matrix"]})
+                for filename in os.listdir(self.__dir_path):
+                    if filename.endswith(".npy") and filename not in referenced:
+                        try:
+                            os.remove(path.join(self.__dir_path, filename))
+                        except OSError:
+                            pass
+
+            self.__matrix = numpy.load(path.join(self.__dir_path, manifest["matrix"]), mmap_mode="r") \
+                if len(entries) > 0 else matrix
+            self.__index = {key: i for i, key in enumerate(entries.keys())}
+            self.__new_embeddings.clear()
+
+            print(f"Saved {len(entries)} embeddings to {self.__dir_path}.")
+
+    def __write_atomic(self, filename: str, write: Callable):
+        fd, temp_path = tempfile.mkstemp(dir=self.__dir_path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path.join(self.__dir_path, filename))
+        except BaseException:
+            if path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+_stores: dict[tuple[str, int], EmbeddingStore] = {}
+_stores_lock = threading.Lock()
+
+
+def embedding_store(model: str, dimensions: int) -> EmbeddingStore:
+    """The embedding store of the model, shared in the process."""
+    with _stores_lock:
+        if (model, dimensions) not in _stores:
+            _stores[(model, dimensions)] = EmbeddingStore(AACessTalkConfig.embedding_store_dir_path, model, dimensions)
+        return _stores[(model, dimensions)]
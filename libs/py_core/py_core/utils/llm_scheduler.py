@@ -0,0 +1,173 @@
+import asyncio
+import heapq
+import itertools
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager
+from time import monotonic
+from typing import AsyncIterator
+
+from chatlib.llm.integration import GPTChatCompletionAPI
+
+from py_core.config import AACessTalkConfig
+from py_core.utils.task_supervisor import TaskPriority, current_task_priority
+
+
+class _TokenBucket:
+
+    def __init__(self, rate_per_sec: float, capacity: int):
+        self.__rate = rate_per_sec
+        self.__capacity = max(1, capacity)
+        self.__tokens = float(self.__capacity)
+        self.__updated_at = monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.__rate <= 0
+
+    def __refill(self):
+        now = monotonic()
+        self.__tokens = min(self.__capacity, self.__tokens + (now - self.__updated_at) * self.__rate)
+        self.__updated_at = now
+
+    def try_take(self) -> bool:
+        if self.unlimited:
+            return True
+        self.__refill()
+        if self.__tokens >= 1:
+            self.__tokens -= 1
+            return True
+        else:
+            return False
+
+    def seconds_until_available(self) -> float:
+        self.__refill()
+        return max(0.0, (1 - self.__tokens) / self.__rate)
+
+
+class LLMScheduler:
+    """
+    Dispatches the LLM requests of the process. A request waits for both a concurrency slot and a rate limit token,
+    and waiting requests are dispatched in the order of their priority (see TaskPriority), then of their arrival.
+    """
+
+    def __init__(self):
+        self.__max_concurrency = max(1, AACessTalkConfig.llm_max_concurrency)
+        self.__bucket = _TokenBucket(AACessTalkConfig.llm_requests_per_minute / 60, AACessTalkConfig.llm_burst)
+
+        self.__in_flight = 0
+        self.__waiters: list[tuple[int, int, float, asyncio.Future]] = []
+        self.__counter = itertools.count()
+        self.__wake_handle: asyncio.TimerHandle | None = None
+
+        self.__dispatched: Counter = Counter()
+        self.__throttled: Counter = Counter()
+        self.__wait_sec_sum: defaultdict[str, float] = defaultdict(float)
+        self.__wait_sec_max: defaultdict[str, float] = defaultdict(float)
+
+    @asynccontextmanager
+    async def slot(self, priority: TaskPriority | None = None) -> AsyncIterator[None]:
+        await self.__acquire(priority if priority is not None else current_task_priority())
+        try:
+            yield
+        finally:
+            self.__release()
+
+    async def __acquire(self, priority: TaskPriority):
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.__waiters, (priority, next(self.__counter), monotonic(), future))
+        self.__dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Dispatched right before the cancellation.
+                self.__release()
+            raise
+
+    def __release(self):
+        self.__in_flight -= 1
+        self.__dispatch()
+
+    def __dispatch(self):
+        while len(self.__waiters) > 0 and self.__in_flight < self.__max_concurrency:
+            priority, _, enqueued_at, future = self.__waiters[0]
+            if future.done():
+                heapq.heappop(self.__waiters)
+                continue
+
+            if not self.__bucket.try_take():
+                self.__throttled[TaskPriority(priority).name] += 1
+                self.__schedule_wake(self.__bucket.seconds_until_available())
+                break
+
+            heapq.heappop(self.__waiters)
+            self.__in_flight += 1
+
+            lane = TaskPriority(priority).name
+            waited = monotonic() - enqueued_at
+            self.__dispatched[lane] += 1
+            self.__wait_sec_sum[lane] += waited
+            self.__wait_sec_max[lane] = max(self.__wait_sec_max[lane], waited)
+
+            future.set_result(None)
+
+    def __schedule_wake(self, delay: float):
+        if self.__wake_handle is None:
+            def wake():
+                self.__wake_handle = None
+                self.__dispatch()
+
+            self.__wake_handle = asyncio.get_running_loop().call_later(delay, wake)
+
+    def metrics(self) -> dict:
+        queue_depth = Counter(TaskPriority(priority).name
+                              for priority, _, _, future in self.__waiters if not future.done())
+        return dict(
+            in_flight=self.__in_flight,
+            max_concurrency=self.__max_concurrency,
+            lanes={
+                lane.name: dict(
+                    queue_depth=queue_depth[lane.name],
+                    dispatched=self.__dispatched[lane.name],
+                    throttled=self.__throttled[lane.name],
+                    mean_wait_ms=(self.__wait_sec_sum[lane.name] / self.__dispatched[lane.name] * 1000)
+                    if self.__dispatched[lane.name] > 0 else 0,
+                    max_wait_ms=self.__wait_sec_max[lane.name] * 1000,
+                )
+                for lane in TaskPriority
+            }
+        )
+
+
+_scheduler: LLMScheduler | None = None
+
+
+def llm_scheduler() -> LLMScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = LLMScheduler()
+    return _scheduler
+
+
+class ScheduledChatCompletionAPI(GPTChatCompletionAPI):
+    """
+    GPTChatCompletionAPI whose requests go through the LLMScheduler, in the lane of the priority of the calling context.
+    """
+
+    async def run_chat_completion(self, *args, **kwargs):
+        async with llm_scheduler().slot():
+            return await super().run_chat_completion(*args, **kwargs)
+
+
+_shared_chat_completion_api: ScheduledChatCompletionAPI | None = None
+
+
+def shared_chat_completion_api() -> ScheduledChatCompletionAPI:
+    """
+    The chat completion API shared by all the tasks of the process, so that they also share its pooled HTTP client.
+    """
+    global _shared_chat_completion_api
+    if _shared_chat_completion_api is None:
+        _shared_chat_completion_api = ScheduledChatCompletionAPI()
+        _shared_chat_completion_api.config().verbose = False
+    return _shared_chat_completion_api
@@ -1,8 +1,14 @@
 import csv
-from contextlib import AbstractContextManager
+import fcntl
+import os
+import queue
+import tempfile
+import threading
+import weakref
+from contextlib import AbstractContextManager, contextmanager
 
 from time import perf_counter
-from typing import TypeAlias
+from typing import TypeAlias, Iterator
 from os import path
 
 from py_core.utils.models import DictionaryRow
@@ -11,18 +17,52 @@ from py_core.utils.vector_db import VectorDB
 
 LookupDictionary: TypeAlias = dict[tuple[str, str], DictionaryRow]
 
+_instances: weakref.WeakSet['LookupTranslator'] = weakref.WeakSet()
+
+
+def close_lookup_translators():
+    """Writes the pending updates of all the dictionaries in the process. Call on shutdown."""
+    for translator in list(_instances):
+        try:
+            translator.close()
+        except Exception as ex:
+            print("Failed to close the lookup dictionary:", ex)
+
+
 class LookupTranslator(AbstractContextManager):
+    """
+    Dictionary of translations, persisted as a CSV file.
+    Updates are appended to a journal file next to it by a background writer, which compacts the journal into the CSV
+    file (written to a temporary file and renamed over it) once it grows past `compaction_threshold` rows.
+    The files may be shared by several worker processes, so they are accessed under a file lock, and the compaction
+    merges the rows other workers have written.
+    """
 
     def __init__(self, name: str, dict_filepath: str | None = None,
-                 vector_db: VectorDB | None = None, verbose: bool = False):
+                 vector_db: VectorDB | None = None, verbose: bool = False, compaction_threshold: int = 200):
         self.__name = name
         self.__dictionary: LookupDictionary = dict()
         self.verbose = verbose
         self.__dict_filepath: str | None = dict_filepath
+        self.__compaction_threshold = compaction_threshold
 
         self.__vector_db = vector_db or VectorDB()
 
+        self.__file_lock = threading.Lock()
+        self.__journal_size = 0
+        self.__write_queue: queue.Queue[DictionaryRow | None] = queue.Queue()
+        self.__writer: threading.Thread | None = None
+
         self.load_file()
+        _instances.add(self)
+
+    @property
+    def journal_filepath(self) -> str | None:
+        return f"{self.__dict_filepath}.journal" if self.__dict_filepath is not None else None
+
+    @property
+    def lock_filepath(self) -> str | None:
+        return f"{self.__dict_filepath}.lock" if self.__dict_filepath is not None else None
 
     @property
     def vector_db(self) -> VectorDB:
@@ -35,24 +75,19 @@ class LookupTranslator(AbstractContextManager):
 
     def load_file(self):
         if self.__dict_filepath is not None:
-            if path.exists(self.__dict_filepath):
+            # Rows written before a crash may only be in the journal.
+            if path.exists(self.__dict_filepath) or path.exists(self.journal_filepath):
                 if self.verbose:
-                    print(f"Loading a dictionary file...")
+                    print("Loading a dictionary file...")
                 t_start = perf_counter()
-                with open(self.__dict_filepath, mode='r', encoding='utf8') as csvfile:
-                    reader = csv.DictReader(csvfile, fieldnames=DictionaryRow.field_names())
-                    next(reader, None)
-
-                    num_lines = 0
-                    for row in reader:
-                        row_model = DictionaryRow.model_validate(row)
+                with self.__locked_files():
+                    dictionary, num_lines = self.__read_files()
+                self.__dictionary.update(dictionary)
 
-                        if row_model.lookup_key not in self.dictionary:
-                            self.__dictionary[row_model.lookup_key] = row_model
-                        num_lines += 1
-
-                    rows = [row for _, row in self.__dictionary.items()]
-                    self._upsert_in_batches(rows, batch_size=10)
+                rows = [row for _, row in self.__dictionary.items()]
+                self._upsert_in_batches(rows, batch_size=10)
+                # Keep the embeddings of new rows for the next startup.
+                self.__vector_db.save_embeddings()
 
                 t_end = perf_counter()
 
@@ -60,28 +95,168 @@ class LookupTranslator(AbstractContextManager):
                     print(f"File dictionary loading ({num_lines} entries) took {t_end - t_start} sec.")
             else:
                 if self.verbose:
-                    print(f"Dictionary file does not exist. Skip reading.")
+                    print("Dictionary file does not exist. Skip reading.")
         else:
             if self.verbose:
-                print(f"Dictionary file path was not set.")
+                print("Dictionary file path was not set.")
 
-    def write_to_file(self):
-        if self.__dict_filepath is not None:
+    @contextmanager
+    def __locked_files(self) -> Iterator[None]:
+        # The thread lock serializes the writer thread and the callers of write_to_file() in this process,
+        # and the file lock serializes the worker processes.
+        with self.__file_lock:
+            with open(self.lock_filepath, mode='a') as lock_file:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+    def __read_files(self) -> tuple[LookupDictionary, int]:
+        """Reads the file and replays the journal on it. Call with the files locked."""
+        dictionary: LookupDictionary = dict()
+        num_lines = 0
+        if path.exists(self.__dict_filepath):
+            with open(self.__dict_filepath, mode='r', encoding='utf8') as csvfile:
+                reader = csv.DictReader(csvfile, fieldnames=DictionaryRow.field_names())
+                next(reader, None)
+                for row in reader:
+                    row_model = DictionaryRow.model_validate(row)
+                    if row_model.lookup_key not in dictionary:
+                        dictionary[row_model.lookup_key] = row_model
+                    num_lines += 1
+
+        # Rows in the journal are newer than the ones in the file, and later rows override earlier ones.
+        if path.exists(self.journal_filepath):
+            journal_lines = 0
+            with open(self.journal_filepath, mode='r', encoding='utf8') as journal:
+                reader = csv.DictReader(journal, fieldnames=DictionaryRow.field_names())
+                for row in reader:
+                    try:
+                        row_model = DictionaryRow.model_validate(row)
+                    except ValueError:
+                        # A row partially written at a crash.
+                        print(f"Skip the malformed journal row: {row}")
+                        continue
+                    dictionary[row_model.lookup_key] = row_model
+                    journal_lines += 1
+            self.__journal_size = journal_lines
+            num_lines += journal_lines
+
+        return dictionary, num_lines
+
+    def __append_to_journal(self, rows: list[DictionaryRow]):
+        with self.__locked_files():
+            with open(self.journal_filepath, mode='a', encoding='utf8') as journal:
+                writer = csv.DictWriter(journal, fieldnames=DictionaryRow.field_names())
+                for row_model in rows:
+                    writer.writerow(row_model.model_dump())
+                journal.flush()
+                os.fsync(journal.fileno())
+            self.__journal_size += len(rows)
+
+    def __compact(self):
+        with self.__locked_files():
             if self.verbose:
                 print("Write lookup dictionary to file..")
 
-            with open(self.__dict_filepath, mode='w', encoding='utf8') as csvfile:
-                writer = csv.DictWriter(csvfile, fieldnames=DictionaryRow.field_names())
-                writer.writeheader()
+            # Other workers may have updated the files since this one loaded them. Their rows are kept, and rows only
+            # this worker has (e.g., whose journal append failed) are added.
+            merged, _ = self.__read_files()
+            for key, row_model in list(self.__dictionary.items()):
+                if key not in merged:
+                    merged[key] = row_model
+            for key, row_model in merged.items():
+                self.__dictionary.setdefault(key, row_model)
 
-                items = [v for k, v in self.__dictionary.items()]
+            items = list(merged.values())
+            items.sort(key=lambda elm: (elm.category, elm.english, elm.localized))
 
-                items.sort(key=lambda elm: elm.localized)
-                items.sort(key=lambda elm: elm.english)
-                items.sort(key=lambda elm: elm.category)
+            dir_path = path.dirname(path.abspath(self.__dict_filepath))
+            fd, temp_path = tempfile.mkstemp(dir=dir_path, prefix=path.basename(self.__dict_filepath), suffix=".tmp")
+            try:
+                with os.fdopen(fd, mode='w', encoding='utf8') as csvfile:
+                    writer = csv.DictWriter(csvfile, fieldnames=DictionaryRow.field_names())
+                    writer.writeheader()
+                    for row_model in items:
+                        writer.writerow(row_model.model_dump())
+                    csvfile.flush()
+                    os.fsync(csvfile.fileno())
+                os.replace(temp_path, self.__dict_filepath)
+            except BaseException:
+                if path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
 
-                for row_model in items:
-                    writer.writerow(row_model.model_dump())
+            # The journal is folded into the file. If the process stops before this, replaying it again is harmless.
+            if path.exists(self.journal_filepath):
+                open(self.journal_filepath, mode='w', encoding='utf8').close()
+            self.__journal_size = 0
+
+    def __ensure_writer(self):
+        if self.__writer is None or not self.__writer.is_alive():
+            self.__writer = threading.Thread(target=self.__write_loop, name=f"lookup_translator_writer:{self.__name}",
+                                             daemon=True)
+            self.__writer.start()
+
+    def __write_loop(self):
+        while True:
+            row = self.__write_queue.get()
+            if row is None:
+                self.__write_queue.task_done()
+                return
+
+            rows = [row]
+            while True:
+                try:
+                    next_row = self.__write_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if next_row is None:
+                    # Put the stop signal back for the next round.
+                    self.__write_queue.task_done()
+                    self.__write_queue.put(None)
+                    break
+                rows.append(next_row)
+
+            compacted = False
+            try:
+                # Journaled first, so that a failure of the embedding call does not lose the rows.
+                if self.__dict_filepath is not None:
+                    self.__append_to_journal(rows)
+                    if self.__journal_size >= self.__compaction_threshold:
+                        self.__compact()
+                        compacted = True
+            except Exception as ex:
+                print(f"Failed to persist the updates of the {self.__name} dictionary:", ex)
+
+            try:
+                self._upsert_in_batches(rows, batch_size=10)
+                if compacted:
+                    self.__vector_db.save_embeddings()
+            except Exception as ex:
+                print(f"Failed to index the updates of the {self.__name} dictionary:", ex)
+            finally:
+                for _ in rows:
+                    self.__write_queue.task_done()
+
+    def flush(self):
+        """Blocks until the pending updates are written to the journal."""
+        if self.__writer is not None and self.__writer.is_alive():
+            self.__write_queue.join()
+
+    def write_to_file(self):
+        """Writes the whole dictionary to the file, folding the journal into it."""
+        if self.__dict_filepath is not None:
+            self.flush()
+            self.__compact()
+
+    def close(self):
+        self.write_to_file()
+        if self.__writer is not None and self.__writer.is_alive():
+            self.__write_queue.put(None)
+            self.__writer.join()
+        self.__writer = None
 
     @property
     def dictionary(self) -> LookupDictionary:
@@ -106,9 +281,11 @@ class LookupTranslator(AbstractContextManager):
             return self._parse_localized(self.dictionary[key].localized, locale)
 
     def update(self, english: str, category: str, localized: str):
+        """Takes effect for lookups immediately. The vector DB and the file are updated by the background writer."""
         row = DictionaryRow(category=category, english=english, localized=localized)
         self.dictionary[(english, category)] = row
-        self.__vector_db.upsert(self.__name, row)
+        self.__write_queue.put(row)
+        self.__ensure_writer()
 
     def query_similar_rows(
         self,
@@ -121,8 +298,19 @@ class LookupTranslator(AbstractContextManager):
             self.__name, english, category, k, cutout_dist
         )
 
+    async def aquery_similar_rows(
+        self,
+        english: str | list[str],
+        category: str | None,
+        k: int = 5,
+        cutout_dist=0.7,
+    ) -> list[DictionaryRow]:
+        return await self.__vector_db.aquery_similar_rows(
+            self.__name, english, category, k, cutout_dist
+        )
+
     def __aenter__(self):
         return self
 
     def __exit__(self, __exc_type, __exc_value, __traceback):
-        self.write_to_file()
+        self.close()
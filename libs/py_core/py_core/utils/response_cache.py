@@ -0,0 +1,246 @@
+import asyncio
+import hashlib
+import re
+import unicodedata
+from asyncio import to_thread
+from collections import OrderedDict, Counter
+from dataclasses import dataclass
+from os import path
+from time import time
+from typing import Any, Callable, Coroutine, TypeVar
+
+import numpy as np
+from diskcache import Cache
+
+from py_core.config import AACessTalkConfig
+from py_core.system.model import Dialogue, DialogueRole
+
+T = TypeVar("T")
+
+EmbeddingFunction = Callable[[list[str]], list[list[float]]]
+
+
+def normalize_text(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text).lower()
+    text = "".join(c for c in text if unicodedata.category(c)[0] != "P")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def make_dialogue_context_text(dialogue: Dialogue, last_n: int) -> str:
+    """Normalized text of the last N messages, the part of the cache key compared by similarity."""
+    rows = []
+    for message in dialogue[-last_n:] if last_n > 0 else []:
+        if message.role == DialogueRole.Parent:
+            content = message.content if isinstance(message.content, str) else ""
+        else:
+            content = (", ".join(card.label for card in message.content) if isinstance(message.content, list)
+                       else message.content)
+        rows.append(f"{message.role}: {normalize_text(content)}")
+    return "\n".join(rows)
+
+
+@dataclass
+class _Entry:
+    # Hash of the partition. Neither the partition nor the context text is stored, as they contain the dialogue.
+    partition_key: str
+    value: Any
+    # Kept in the memory tier only.
+    embedding: np.ndarray | None
+    expires_at: float
+
+
+@dataclass
+class ResponseCacheLookup:
+    key: str
+    partition_key: str
+    # The cached value on an exact match.
+    value: Any | None
+    # Embedding of the context text, computed concurrently on a miss, for the similarity match and for put().
+    embedding_task: asyncio.Task | None = None
+
+
+class SemanticResponseCache:
+    """
+    Caches LLM mapper responses by a key of two parts: the partition, which must match exactly (e.g., topic,
+    parent type, locale), and the context text (e.g., the last messages), which matches exactly or by embedding
+    similarity.
+
+    Entries live in an in-memory LRU tier with a TTL, and in a disk tier if a directory is given. The disk tier is
+    looked up by exact match only; entries found there are promoted to the memory tier.
+    Only hashes of the keys are kept, and values must be picklable.
+
+    The similarity match is never on the critical path: the embedding of the context is computed while the response is
+    generated, and the generation is cancelled only if a similar entry is found before it finishes.
+    """
+
+    def __init__(self, name: str, max_entries: int = 512, ttl_sec: float = 24 * 60 * 60,
+                 similarity_threshold: float = 0.95, embed: EmbeddingFunction | None = None,
+                 disk_dir_path: str | None = None):
+        self.__name = name
+        self.__max_entries = max_entries
+        self.__ttl_sec = ttl_sec
+        self.__similarity_threshold = similarity_threshold
+        self.__embed = embed
+
+        self.__entries: OrderedDict[str, _Entry] = OrderedDict()
+        self.__disk: Cache | None = Cache(disk_dir_path) if disk_dir_path is not None else None
+
+        self.__stats = Counter()
+
+    @staticmethod
+    def __hash(text: str) -> str:
+        return hashlib.md5(text.encode()).hexdigest()
+
+    async def __get_embedding(self, text: str) -> np.ndarray | None:
+        if self.__embed is None or len(text) == 0:
+            return None
+        try:
+            [embedding] = await to_thread(self.__embed, [text])
+            embedding = np.asarray(embedding, dtype=np.float32)
+            return embedding / (np.linalg.norm(embedding) or 1)
+        except Exception as ex:
+            print(f"[{self.__name} cache] Failed to embed the context:", ex)
+            return None
+
+    def __put_memory(self, key: str, entry: _Entry):
+        self.__entries[key] = entry
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.__max_entries:
+            self.__entries.popitem(last=False)
+            self.__stats["evictions"] += 1
+
+    def __get_memory(self, key: str) -> _Entry | None:
+        entry = self.__entries.get(key)
+        if entry is None:
+            return None
+        elif entry.expires_at < time():
+            del self.__entries[key]
+            self.__stats["expirations"] += 1
+            return None
+        else:
+            self.__entries.move_to_end(key)
+            return entry
+
+    async def get(self, partition: str, text: str) -> ResponseCacheLookup:
+        """
+        Looks up the exact match. On a miss, starts computing the embedding of the text; pass the lookup to
+        generate() and put().
+        """
+        partition_key = self.__hash(partition)
+        key = self.__hash(f"{partition}\n{text}")
+
+        entry = self.__get_memory(key)
+        if entry is not None:
+            self.__stats["hits_exact"] += 1
+            return ResponseCacheLookup(key=key, partition_key=partition_key, value=entry.value)
+
+        if self.__disk is not None:
+            entry = await to_thread(self.__disk.get, key)
+            if entry is not None:
+                self.__stats["hits_disk"] += 1
+                self.__put_memory(key, entry)
+                return ResponseCacheLookup(key=key, partition_key=partition_key, value=entry.value)
+
+        embedding_task = asyncio.create_task(self.__get_embedding(text)) if self.__embed is not None else None
+        return ResponseCacheLookup(key=key, partition_key=partition_key, value=None, embedding_task=embedding_task)
+
+    async def __match_similar(self, lookup: ResponseCacheLookup) -> Any | None:
+        # Shielded, as put() still needs the embedding if the match is abandoned.
+        embedding = await asyncio.shield(lookup.embedding_task)
+        if embedding is None:
+            return None
+
+        now = time()
+        candidates = [(k, e) for k, e in self.__entries.items()
+                      if e.partition_key == lookup.partition_key and e.embedding is not None and e.expires_at >= now]
+        if len(candidates) == 0:
+            return None
+
+        similarities = np.stack([e.embedding for _, e in candidates]) @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.__similarity_threshold:
+            return None
+
+        best_key, best_entry = candidates[best]
+        self.__entries.move_to_end(best_key)
+        return best_entry.value
+
+    async def generate(self, lookup: ResponseCacheLookup, coro: Coroutine[Any, Any, T]) -> tuple[Any | None, T | None]:
+        """
+        Runs the generation of a missed lookup, while matching a similar entry concurrently.
+        Returns (similar value, None) if the match came first, in which case the generation is cancelled,
+        or (None, generated) otherwise.
+        """
+        if lookup.embedding_task is None:
+            self.__stats["misses"] += 1
+            return None, await coro
+
+        generation = asyncio.create_task(coro)
+        matching = asyncio.create_task(self.__match_similar(lookup))
+        try:
+            await asyncio.wait([generation, matching], return_when=asyncio.FIRST_COMPLETED)
+            if matching.done() and not matching.cancelled() and matching.exception() is None \
+                    and matching.result() is not None:
+                self.__stats["hits_similar"] += 1
+                return matching.result(), None
+
+            self.__stats["misses"] += 1
+            return None, await generation
+        finally:
+            generation.cancel()
+            matching.cancel()
+
+    async def put(self, lookup: ResponseCacheLookup, value: Any):
+        embedding = None
+        if lookup.embedding_task is not None:
+            # Mostly done by now, as it ran along with the generation.
+            embedding = await asyncio.shield(lookup.embedding_task)
+
+        expires_at = time() + self.__ttl_sec
+        self.__put_memory(lookup.key, _Entry(partition_key=lookup.partition_key, value=value, embedding=embedding,
+                                             expires_at=expires_at))
+        if self.__disk is not None:
+            try:
+                await to_thread(self.__disk.set, lookup.key,
+                                _Entry(partition_key=lookup.partition_key, value=value, embedding=None,
+                                       expires_at=expires_at),
+                                expire=self.__ttl_sec)
+            except Exception as ex:
+                print(f"[{self.__name} cache] Failed to write to the disk tier:", ex)
+
+    def metrics(self) -> dict[str, int | float]:
+        hits = self.__stats["hits_exact"] + self.__stats["hits_disk"] + self.__stats["hits_similar"]
+        lookups = hits + self.__stats["misses"]
+        return dict(
+            entries=len(self.__entries),
+            hits_exact=self.__stats["hits_exact"],
+            hits_disk=self.__stats["hits_disk"],
+            hits_similar=self.__stats["hits_similar"],
+            misses=self.__stats["misses"],
+            evictions=self.__stats["evictions"],
+            expirations=self.__stats["expirations"],
+            hit_rate=hits / lookups if lookups > 0 else 0,
+        )
+
+
+_caches: dict[str, SemanticResponseCache] = {}
+
+
+def response_cache(name: str, embed: EmbeddingFunction | None = None) -> SemanticResponseCache | None:
+    """
+    The response cache of the given name, shared in the process. None if the cache is disabled.
+    """
+    if not AACessTalkConfig.response_cache_enabled:
+        return None
+    if name not in _caches:
+        _caches[name] = SemanticResponseCache(name,
+                                              max_entries=AACessTalkConfig.response_cache_max_entries,
+                                              ttl_sec=AACessTalkConfig.response_cache_ttl_sec,
+                                              similarity_threshold=AACessTalkConfig.response_cache_similarity_threshold,
+                                              embed=embed,
+                                              disk_dir_path=path.join(AACessTalkConfig.response_cache_dir_path, name))
+    return _caches[name]
+
+
+def response_cache_metrics() -> dict[str, dict[str, int | float]]:
+    return {name: cache.metrics() for name, cache in _caches.items()}
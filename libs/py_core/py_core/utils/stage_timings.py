@@ -0,0 +1,75 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Awaitable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+_current_stage_timings: ContextVar['StageTimings | None'] = ContextVar("stage_timings", default=None)
+
+
+class StageTimings:
+    """
+    Records when each stage of a pipeline started and ended, relative to the start of the pipeline.
+    While activated with a `with` block, stages measured with timed_stage() in the same context, including the tasks
+    spawned from it, are recorded here.
+    """
+
+    def __init__(self, label: str):
+        self.__label = label
+        self.__started_at = perf_counter()
+        self.__stages: dict[str, tuple[float, float]] = {}
+        self.__token = None
+
+    def __enter__(self) -> 'StageTimings':
+        self.__token = _current_stage_timings.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        _current_stage_timings.reset(self.__token)
+        self.__token = None
+        self.print_summary()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = perf_counter() - self.__started_at
+        try:
+            yield
+        finally:
+            self.__stages[name] = (start, perf_counter() - self.__started_at)
+
+    @property
+    def elapsed_ms(self) -> float:
+        return (perf_counter() - self.__started_at) * 1000
+
+    def durations_ms(self) -> dict[str, float]:
+        return {name: (end - start) * 1000 for name, (start, end) in self.__stages.items()}
+
+    def to_server_timing_header(self) -> str:
+        entries = [f"{name};dur={duration:.1f}" for name, duration in self.durations_ms().items()]
+        entries.append(f"total;dur={self.elapsed_ms:.1f}")
+        return ", ".join(entries)
+
+    def print_summary(self):
+        print(f"[{self.__label}] total {self.elapsed_ms:.0f} ms")
+        for name, (start, end) in sorted(self.__stages.items(), key=lambda item: item[1][0]):
+            print(f"  {name:<28} {start * 1000:>8.0f} -> {end * 1000:>8.0f} ms ({(end - start) * 1000:.0f} ms)")
+
+
+def current_stage_timings() -> StageTimings | None:
+    return _current_stage_timings.get()
+
+
+@contextmanager
+def timed_stage(name: str) -> Iterator[None]:
+    timings = _current_stage_timings.get()
+    if timings is None:
+        yield
+    else:
+        with timings.stage(name):
+            yield
+
+
+async def run_stage(name: str, awaitable: Awaitable[T]) -> T:
+    with timed_stage(name):
+        return await awaitable
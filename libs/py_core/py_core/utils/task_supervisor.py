@@ -0,0 +1,353 @@
+import asyncio
+import heapq
+import itertools
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from weakref import WeakKeyDictionary
+from enum import IntEnum
+from typing import AsyncIterator, Coroutine, Any, TypeVar, Iterator
+
+from py_core.config import AACessTalkConfig
+from py_core.utils.models import AsyncTaskInfo
+
+T = TypeVar("T")
+
+
+class TaskPriority(IntEnum):
+    # A request is waiting for it.
+    Interactive = 0
+    # Its result is expected to be used by an upcoming request.
+    Background = 1
+    # Its result may be thrown away.
+    Speculative = 2
+    # Offline processing tools.
+    Batch = 3
+
+
+@dataclass
+class _TaskRecord:
+    name: str
+    priority: TaskPriority
+    joined: bool = False
+    cancel_requested: bool = False
+    # Pending request for a slot, while the task is queued, and the slots it was made to.
+    slot_request: asyncio.Future | None = None
+    slots: '_PrioritySlots | None' = None
+
+
+# Record of the supervised task running in the current context. Its priority is picked up by the LLM scheduler,
+# and reflects a later promotion of the task.
+_current_task_record: ContextVar[_TaskRecord | None] = ContextVar("task_record", default=None)
+
+
+def current_task_priority() -> TaskPriority:
+    record = _current_task_record.get()
+    return record.priority if record is not None else TaskPriority.Interactive
+
+
+@contextmanager
+def _bind_task_record(record: _TaskRecord) -> Iterator[None]:
+    token = _current_task_record.set(record)
+    try:
+        yield
+    finally:
+        _current_task_record.reset(token)
+
+
+class _PrioritySlots:
+    """
+    Bounds the number of concurrently running tasks. Waiters acquire the slots in the order of priority,
+    and the reserved slots can only be taken by interactive tasks.
+    """
+
+    def __init__(self, capacity: int, reserved_for_interactive: int):
+        self.__capacity = max(1, capacity)
+        self.__reserved = min(max(0, reserved_for_interactive), self.__capacity - 1)
+        self.__running = 0
+        self.__waiters: list[tuple[int, int, asyncio.Future]] = []
+        self.__counter = itertools.count()
+
+    @property
+    def running(self) -> int:
+        return self.__running
+
+    @property
+    def waiting(self) -> int:
+        # A promoted request has an entry for each priority it was queued with.
+        return len({id(w[2]) for w in self.__waiters if not w[2].done()})
+
+    def __can_acquire(self, priority: TaskPriority) -> bool:
+        limit = self.__capacity if priority == TaskPriority.Interactive else self.__capacity - self.__reserved
+        return self.__running < limit
+
+    def request(self, priority: TaskPriority) -> asyncio.Future:
+        """Queues a request for a slot. The returned future resolves when the slot is granted."""
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.__waiters, (priority, next(self.__counter), future))
+        self.__wake()
+        return future
+
+    def promote(self, request: asyncio.Future, priority: TaskPriority):
+        """Requeues a pending request with a higher priority. The stale entry is skipped once the request is granted."""
+        if not request.done():
+            heapq.heappush(self.__waiters, (priority, next(self.__counter), request))
+            self.__wake()
+
+    async def wait(self, request: asyncio.Future):
+        try:
+            await request
+        except asyncio.CancelledError:
+            if request.done() and not request.cancelled():
+                # The slot was granted right before the cancellation.
+                self.release()
+            raise
+
+    async def acquire(self, priority: TaskPriority):
+        await self.wait(self.request(priority))
+
+    def release(self):
+        self.__running -= 1
+        self.__wake()
+
+    def __wake(self):
+        while len(self.__waiters) > 0:
+            priority, _, future = self.__waiters[0]
+            if future.done():
+                heapq.heappop(self.__waiters)
+            elif self.__can_acquire(priority):
+                heapq.heappop(self.__waiters)
+                self.__running += 1
+                future.set_result(None)
+            else:
+                break
+
+
+class TaskSupervisor:
+    """
+    Runs the background tasks of a moderator session.
+    - Tasks of the same dyad share a bounded number of slots, acquired in the order of priority.
+    - A task can be given a deadline, after which it is cancelled.
+    - Joining a queued or running task promotes it to the priority of the joiner.
+    - Cancellation is cooperative: cancel() requests it, and aclose() waits for the tasks to finish.
+    - Exceptions of tasks nobody joins are logged rather than lost.
+    """
+
+    __slots_per_dyad: dict[str, _PrioritySlots] = {}
+
+    __global_metrics: Counter = Counter()
+
+    def __init__(self, dyad_id: str):
+        self.__dyad_id = dyad_id
+        # Kept while the task object is alive, so that a late cancel() can tell whether the result was used.
+        self.__records: WeakKeyDictionary[asyncio.Task, _TaskRecord] = WeakKeyDictionary()
+        self.__pending: set[asyncio.Task] = set()
+        self.__metrics: Counter = Counter()
+        self.__holder: set['TaskSupervisor'] | None = None
+
+    @classmethod
+    def __get_slots(cls, dyad_id: str) -> _PrioritySlots:
+        if dyad_id not in cls.__slots_per_dyad:
+            cls.__slots_per_dyad[dyad_id] = _PrioritySlots(AACessTalkConfig.task_concurrency_per_dyad,
+                                                           AACessTalkConfig.task_reserved_interactive_slots)
+        return cls.__slots_per_dyad[dyad_id]
+
+    @classmethod
+    def __discard_idle_slots(cls, dyad_id: str, slots: _PrioritySlots):
+        # Slots are created again on the next task, so that the dyads that finished do not pile up.
+        if slots.running == 0 and slots.waiting == 0 and cls.__slots_per_dyad.get(dyad_id) is slots:
+            del cls.__slots_per_dyad[dyad_id]
+
+    def __count(self, key: str):
+        self.__metrics[key] += 1
+        self.__global_metrics[key] += 1
+
+    async def __run_in_slot(self, coro: Coroutine[Any, Any, T], record: _TaskRecord, timeout: float | None) -> T:
+        slots = self.__get_slots(self.__dyad_id)
+        record.slot_request = slots.request(record.priority)
+        record.slots = slots
+        try:
+            await slots.wait(record.slot_request)
+        except asyncio.CancelledError:
+            # Cancelled while queued.
+            coro.close()
+            self.__discard_idle_slots(self.__dyad_id, slots)
+            raise
+        finally:
+            record.slot_request = None
+            record.slots = None
+        try:
+            with _bind_task_record(record):
+                if timeout is not None:
+                    try:
+                        async with asyncio.timeout(timeout):
+                            return await coro
+                    except TimeoutError:
+                        self.__count("deadline_exceeded")
+                        raise
+                else:
+                    return await coro
+        finally:
+            slots.release()
+            self.__discard_idle_slots(self.__dyad_id, slots)
+
+    def spawn(self, coro: Coroutine[Any, Any, T], name: str, priority: TaskPriority = TaskPriority.Background,
+              timeout: float | None = None, task_id: str | None = None) -> AsyncTaskInfo:
+        record = _TaskRecord(name=name, priority=priority)
+        task = asyncio.create_task(self.__run_in_slot(coro, record, timeout), name=name)
+        self.__records[task] = record
+        self.__pending.add(task)
+        if self.__holder is not None:
+            self.__holder.add(self)
+        task.add_done_callback(self.__on_task_done)
+        self.__count("spawned")
+        return AsyncTaskInfo(task=task, task_id=task_id or name)
+
+    def spawn_stream(self, events: AsyncIterator[T], name: str,
+                     priority: TaskPriority = TaskPriority.Interactive) -> tuple[AsyncTaskInfo, AsyncIterator[T]]:
+        """
+        Iterates the events in a spawned task, which outlives the returned relay of the events.
+        The relay ends when the task finishes, including when it is cancelled before it gets a slot,
+        and raises the exception the task failed with.
+        """
+        # Relayed events, terminated by None, or by the exception the task failed with.
+        relay_queue: asyncio.Queue[T | BaseException | None] = asyncio.Queue()
+
+        async def consume():
+            async for event in events:
+                relay_queue.put_nowait(event)
+
+        def on_done(task: asyncio.Task):
+            if not task.cancelled() and task.exception() is not None:
+                relay_queue.put_nowait(task.exception())
+            relay_queue.put_nowait(None)
+
+        task_info = self.spawn(consume(), name=name, priority=priority)
+        task_info.task.add_done_callback(on_done)
+
+        async def relay():
+            while True:
+                event = await relay_queue.get()
+                if event is None:
+                    return
+                elif isinstance(event, BaseException):
+                    raise event
+                else:
+                    yield event
+
+        return task_info, relay()
+
+    def __on_task_done(self, task: asyncio.Task):
+        self.__pending.discard(task)
+        if self.__holder is not None and len(self.__pending) == 0:
+            self.__holder.discard(self)
+        record = self.__records.get(task)
+        if record is None:
+            return
+
+        if task.cancelled():
+            self.__count("cancelled")
+        elif task.exception() is not None:
+            self.__count("failed")
+            if not record.joined:
+                print(f"Background task {record.name} failed:", repr(task.exception()))
+        else:
+            self.__count("completed")
+            if record.cancel_requested:
+                # The result came before the cancellation but is thrown away.
+                self.__count("wasted")
+
+    async def run(self, coro: Coroutine[Any, Any, T], name: str,
+                  priority: TaskPriority = TaskPriority.Interactive) -> T:
+        """Runs the coroutine in the current task, within the slots of the dyad. Exceptions propagate."""
+        self.__count("critical_path")
+        return await self.__run_in_slot(coro, _TaskRecord(name=name, priority=priority), None)
+
+    async def join(self, task: asyncio.Task, timeout: float | None = None) -> Any | None:
+        """
+        Waits for a spawned task. Returns None if the task failed, was cancelled, or did not finish within the timeout.
+        A task that times out keeps running.
+        """
+        record = self.__records.get(task)
+        if record is not None:
+            record.joined = True
+
+        if not task.done():
+            if record is not None:
+                self.__promote(record, current_task_priority())
+            self.__count("critical_path")
+            await asyncio.wait([task], timeout=timeout)
+            if not task.done():
+                self.__count("join_timeout")
+                print(f"Timed out joining the task {record.name if record is not None else task.get_name()}.")
+                return None
+        else:
+            self.__count("joined_ready")
+
+        if task.cancelled():
+            return None
+        elif task.exception() is not None:
+            print(f"Task {task.get_name()} failed:", repr(task.exception()))
+            return None
+        else:
+            return task.result()
+
+    def __promote(self, record: _TaskRecord, priority: TaskPriority):
+        # The joiner now waits for the task, so it should not wait behind the work of a lower priority.
+        if priority >= record.priority:
+            return
+
+        record.priority = priority
+        self.__count("promoted")
+        if record.slot_request is not None:
+            record.slots.promote(record.slot_request, priority)
+
+    def cancel(self, task: asyncio.Task):
+        record = self.__records.get(task)
+        if task.done():
+            if (record is not None and not record.joined and not record.cancel_requested
+                    and not task.cancelled() and task.exception() is None):
+                # Completed but never used.
+                record.cancel_requested = True
+                self.__count("wasted")
+        else:
+            if record is not None:
+                record.cancel_requested = True
+            task.cancel()
+
+    def cancel_all(self):
+        for task in list(self.__pending):
+            self.cancel(task)
+
+    async def aclose(self):
+        tasks = list(self.__pending)
+        self.cancel_all()
+        if len(tasks) > 0:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def hold_while_pending(self, holder: set['TaskSupervisor']):
+        """Keeps this supervisor in the holder while it has pending tasks, so that they outlive its owner."""
+        self.__holder = holder
+        if len(self.__pending) > 0:
+            holder.add(self)
+
+    async def drain(self):
+        """Waits for the pending tasks, including the ones they spawn, without cancelling them."""
+        while len(self.__pending) > 0:
+            await asyncio.gather(*self.__pending, return_exceptions=True)
+
+    def metrics(self) -> dict[str, int]:
+        return self.__make_metrics(self.__metrics, pending=len(self.__pending))
+
+    @classmethod
+    def global_metrics(cls) -> dict[str, int]:
+        return cls.__make_metrics(cls.__global_metrics,
+                                  running=sum(slots.running for slots in cls.__slots_per_dyad.values()),
+                                  waiting=sum(slots.waiting for slots in cls.__slots_per_dyad.values()))
+
+    @staticmethod
+    def __make_metrics(metrics: Counter, **extra: int) -> dict[str, int]:
+        keys = ["spawned", "completed", "failed", "cancelled", "wasted", "deadline_exceeded", "critical_path",
+                "joined_ready", "join_timeout", "promoted"]
+        return {**{key: metrics[key] for key in keys}, **extra}
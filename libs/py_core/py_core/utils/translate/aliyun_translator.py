@@ -12,6 +12,12 @@ from alibabacloud_alimt20181012.client import Client as alimt20181012Client
 from alibabacloud_alimt20181012 import models as alimt_20181012_models
 from alibabacloud_tea_util import models as util_models
 from py_core.system.model import UserLocale
+from py_core.utils.translate.translation_memory import translation_memory
+
+
+def _is_translated(source: str, translated: str) -> bool:
+    # Failures are reported as messages in place of the translation, or leave the source as is in the batch mode.
+    return not (translated.startswith("Failed to") or translated == "No translated text found" or translated == source)
 
 
 class AliyunTranslator(IntegrationService):
@@ -160,14 +166,21 @@ class AliyunTranslator(IntegrationService):
         target_lang: str,
         source_lang: str | None = None,
         context: str = "",
+        domain: str | None = None,
     ) -> Union[str, list[str]]:
+        """
+        If a domain is given, the translations are looked up from the translation memory first,
+        and new translations are stored there.
+        """
         fixed_source_lang = source_lang if source_lang is not None else "auto"
         fixed_source_lang = (
             fixed_source_lang
             if not user_locale == UserLocale.TraditionalChinese
             else "yue"
         )
-        if isinstance(text, str):
+        if domain is not None:
+            return await self.__translate_with_memory(text, user_locale, target_lang, fixed_source_lang, context, domain)
+        elif isinstance(text, str):
             return await self.translate_single(
                 text,
                 user_locale,
@@ -182,3 +195,36 @@ class AliyunTranslator(IntegrationService):
                 target_lang,
                 fixed_source_lang,
             )
+
+    async def __translate_with_memory(
+        self,
+        text: Union[str, Iterable[str]],
+        user_locale: UserLocale,
+        target_lang: str,
+        source_lang: str,
+        context: str,
+        domain: str,
+    ) -> Union[str, list[str]]:
+        texts = [text] if isinstance(text, str) else list(text)
+        memory = translation_memory()
+
+        translated = await memory.aget_many(texts, domain, source_lang, target_lang)
+        indices_to_translate = [i for i, t in enumerate(translated) if t is None]
+
+        if len(indices_to_translate) == 1:
+            i = indices_to_translate[0]
+            translated[i] = await self.translate_single(texts[i], user_locale, target_lang, source_lang, context)
+        elif len(indices_to_translate) > 1:
+            results = await self.translate_batch([texts[i] for i in indices_to_translate], user_locale, target_lang,
+                                                 source_lang)
+            if len(results) != len(indices_to_translate):
+                # The whole batch failed.
+                return results
+            for i, result in zip(indices_to_translate, results):
+                translated[i] = result
+
+        await memory.aput_many([(texts[i], translated[i]) for i in indices_to_translate
+                                if _is_translated(texts[i], translated[i])],
+                               domain, source_lang, target_lang)
+
+        return translated[0] if isinstance(text, str) else translated
@@ -0,0 +1,124 @@
+import sqlite3
+import threading
+from asyncio import to_thread
+from collections import Counter
+from os import path, makedirs
+from time import time
+
+from py_core.config import AACessTalkConfig
+
+
+class TranslationMemory:
+    """
+    Persistent store of translations, keyed on (domain, source locale, target locale, source text).
+    The domain separates translations of the same text made for different purposes, e.g., cards and guides.
+    Backed by SQLite in WAL mode; the connection is shared by threads and serialized by a lock.
+    """
+
+    def __init__(self, file_path: str):
+        dir_path = path.dirname(file_path)
+        if dir_path != "" and not path.exists(dir_path):
+            makedirs(dir_path)
+
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(file_path, check_same_thread=False, timeout=10)
+        with self.__lock:
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute("PRAGMA synchronous=NORMAL")
+            self.__connection.execute("""
+                CREATE TABLE IF NOT EXISTS translation (
+                    domain TEXT NOT NULL,
+                    source_locale TEXT NOT NULL,
+                    target_locale TEXT NOT NULL,
+                    source_text TEXT NOT NULL,
+                    translated_text TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (domain, source_locale, target_locale, source_text)
+                )
+            """)
+            self.__connection.commit()
+
+        self.__hits: Counter = Counter()
+        self.__misses: Counter = Counter()
+
+    @staticmethod
+    def __normalize(text: str) -> str:
+        return text.strip()
+
+    def get_many(self, texts: list[str], domain: str, source_locale: str, target_locale: str) -> list[str | None]:
+        keys = [self.__normalize(text) for text in texts]
+        if len(keys) == 0:
+            return []
+
+        with self.__lock:
+            rows = self.__connection.execute(
+                f"SELECT source_text, translated_text FROM translation "
+                f"WHERE domain = ? AND source_locale = ? AND target_locale = ? "
+                f"AND source_text IN ({', '.join('?' * len(keys))})",
+                [domain, source_locale, target_locale, *keys]).fetchall()
+        found = dict(rows)
+
+        # Hits are counted in memory only, so that lookups do not write to the database.
+        result = [found.get(key) for key in keys]
+        hits = len([t for t in result if t is not None])
+        self.__hits[domain] += hits
+        self.__misses[domain] += len(result) - hits
+        return result
+
+    def get(self, text: str, domain: str, source_locale: str, target_locale: str) -> str | None:
+        return self.get_many([text], domain, source_locale, target_locale)[0]
+
+    def put_many(self, pairs: list[tuple[str, str]], domain: str, source_locale: str, target_locale: str):
+        now = time()
+        rows = [(domain, source_locale, target_locale, self.__normalize(source), translated, now)
+                for source, translated in pairs
+                if len(source.strip()) > 0 and translated is not None and len(translated.strip()) > 0]
+        if len(rows) == 0:
+            return
+
+        with self.__lock:
+            self.__connection.executemany(
+                "INSERT INTO translation (domain, source_locale, target_locale, source_text, translated_text, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (domain, source_locale, target_locale, source_text) "
+                "DO UPDATE SET translated_text = excluded.translated_text, updated_at = excluded.updated_at",
+                rows)
+            self.__connection.commit()
+
+    def put(self, text: str, translated: str, domain: str, source_locale: str, target_locale: str):
+        self.put_many([(text, translated)], domain, source_locale, target_locale)
+
+    async def aget_many(self, texts: list[str], domain: str, source_locale: str, target_locale: str) -> list[str | None]:
+        return await to_thread(self.get_many, texts, domain, source_locale, target_locale)
+
+    async def aput_many(self, pairs: list[tuple[str, str]], domain: str, source_locale: str, target_locale: str):
+        try:
+            await to_thread(self.put_many, pairs, domain, source_locale, target_locale)
+        except sqlite3.Error as ex:
+            print("Failed to write to the translation memory:", ex)
+
+    def metrics(self) -> dict[str, dict[str, int | float]]:
+        with self.__lock:
+            entries = dict(self.__connection.execute(
+                "SELECT domain, COUNT(*) FROM translation GROUP BY domain").fetchall())
+
+        return {
+            domain: dict(
+                entries=entries.get(domain, 0),
+                hits=self.__hits[domain],
+                misses=self.__misses[domain],
+                hit_rate=self.__hits[domain] / (self.__hits[domain] + self.__misses[domain])
+                if self.__hits[domain] + self.__misses[domain] > 0 else 0,
+            )
+            for domain in sorted(set(entries.keys()) | set(self.__hits.keys()) | set(self.__misses.keys()))
+        }
+
+
+_translation_memory: TranslationMemory | None = None
+
+
+def translation_memory() -> TranslationMemory:
+    global _translation_memory
+    if _translation_memory is None:
+        _translation_memory = TranslationMemory(AACessTalkConfig.translation_memory_path)
+    return _translation_memory
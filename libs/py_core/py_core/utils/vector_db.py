@@ -1,29 +1,29 @@
+import asyncio
+
 import chromadb
 from chromadb import EmbeddingFunction, Documents
 import chromadb.utils.embedding_functions as ef
-from openai import OpenAI
 
 from chatlib.llm.integration import GPTChatCompletionAPI
 from chatlib.utils.integration import APIAuthorizationVariableSpecPresets
 from chromadb.api.models.Collection import Collection
 from numpy import ndarray
 
+from py_core.utils.embedding_service import embedding_service
+from py_core.utils.embedding_store import EmbeddingStore, embedding_store
 from py_core.utils.models import DictionaryRow
 
 
 class OpenAIEmbeddingFunction(EmbeddingFunction[Documents]):
 
-    def __init__(self, api_key: str, model: str, dimensions: int):
-        self.__model = model
-        self.__dimensions = dimensions
-        self.__client = OpenAI(api_key=api_key)
+    def __init__(self, model: str, dimensions: int):
+        self.__service = embedding_service(model, dimensions)
 
     def __call__(self, input: Documents):
-        result = self.__client.embeddings.create(input=input,
-                                 model=self.__model,
-                                 dimensions=self.__dimensions
-                                 )
-        return [datum.embedding for datum in result.data]
+        return self.__service.embed(list(input))
+
+    async def acall(self, input: list[str]) -> list[list[float]]:
+        return await self.__service.aembed(input)
 
 class VectorDB:
     def __init__(
@@ -32,32 +32,58 @@ class VectorDB:
         embedding_model: str = "text-embedding-v4",
         embedding_dimensions: int = 256,
     ):
-        #self.__client = chromadb.PersistentClient(path.join(AACessTalkConfig.dataset_dir_path, dir_name))
+        # The collections are in memory and filled at startup with the embeddings precomputed in the embedding store.
         self.__client = chromadb.Client()
+        self.__store = embedding_store(embedding_model, embedding_dimensions)
 
         print(
             f"OpenAI API KEY: {GPTChatCompletionAPI.get_auth_variable_for_spec(APIAuthorizationVariableSpecPresets.ApiKey)}"
         )
 
-        GPTChatCompletionAPI.assert_authorize()
-        api_key = GPTChatCompletionAPI.get_auth_variable_for_spec(
-            APIAuthorizationVariableSpecPresets.ApiKey)
+        self.__decode = OpenAIEmbeddingFunction(model=embedding_model, dimensions=embedding_dimensions)
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        return self.__decode(texts)
+
+    async def aembed(self, texts: list[str]) -> list[list[float]]:
+        return await self.__decode.acall(texts)
+
+    @property
+    def store(self) -> EmbeddingStore:
+        return self.__store
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embeddings of the documents, computed only for the ones not in the embedding store."""
+        return self.__store.embed(texts, self.__decode)
 
-        self.__decode = OpenAIEmbeddingFunction(api_key=api_key, model=embedding_model, dimensions=embedding_dimensions)
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        embeddings = self.__store.get(texts)
+        missing_texts = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        if len(missing_texts) > 0:
+            self.__store.put(missing_texts, await self.aembed(missing_texts))
+            embeddings = self.__store.get(texts)
+        return [embedding.tolist() for embedding in embeddings]
+
+    def save_embeddings(self):
+        if self.__store.is_dirty:
+            try:
+                self.__store.save()
+            except OSError as ex:
+                print("Failed to save the embedding store:", ex)
 
     def get_collection(self, name: str) -> Collection:
         return self.__client.get_or_create_collection(name, embedding_function=self.__decode)
 
+    def __to_collection(self, collection: str | Collection) -> Collection:
+        return collection if isinstance(collection, Collection) else self.get_collection(collection)
+
     def upsert(self, collection: str | Collection, dictionary_row: DictionaryRow | list[DictionaryRow]) -> ndarray | list[ndarray]:
 
         rows = [dictionary_row] if isinstance(dictionary_row, DictionaryRow) else dictionary_row
 
         try:
-            (collection if isinstance(collection, Collection) else self.get_collection(collection)).upsert(
-                ids=[row.id for row in rows],
-                metadatas=[row.model_dump(include={"category", "localized"}) for row in rows],
-                documents=[row.english for row in rows]
-            )
+            embeddings = self.embed_documents([row.english for row in rows])
+            self.__upsert_rows(collection, rows, embeddings)
         except Exception as ex:
             print("Erroneous row:", dictionary_row)
             print(ex)
@@ -65,26 +91,60 @@ class VectorDB:
 
             for row in rows:
                 try:
-                    (collection if isinstance(collection, Collection) else self.get_collection(collection)).upsert(
-                        ids=row.id,
-                        metadatas=row.model_dump(include={"category", "localized"}),
-                        documents=row.english
-                    )
+                    self.__upsert_rows(collection, [row], self.embed_documents([row.english]))
                 except Exception as row_ex:
                     print(row_ex)
                     print(f"Skip the erroneous row: {row}")
                     continue
 
+    async def aupsert(self, collection: str | Collection, dictionary_row: DictionaryRow | list[DictionaryRow]):
+        """Same as upsert(), without blocking the event loop."""
+        rows = [dictionary_row] if isinstance(dictionary_row, DictionaryRow) else dictionary_row
+        try:
+            embeddings = await self.aembed_documents([row.english for row in rows])
+        except Exception as ex:
+            print(ex)
+            print(f"Failed to embed the rows. Skip: {rows}")
+            return
+
+        try:
+            await asyncio.to_thread(self.__upsert_rows, collection, rows, embeddings)
+        except Exception as ex:
+            print(ex)
+            print(f"Failed to upsert the rows. Skip: {rows}")
+
+    def __upsert_rows(self, collection: str | Collection, rows: list[DictionaryRow], embeddings: list[list[float]]):
+        self.__to_collection(collection).upsert(
+            ids=[row.id for row in rows],
+            metadatas=[row.model_dump(include={"category", "localized"}) for row in rows],
+            documents=[row.english for row in rows],
+            embeddings=embeddings
+        )
 
     def query_similar_rows(self, collection: str | Collection, word: str | list[str], category: str | None, k: int = 5, cutout_dist:float = 0.5) -> list[DictionaryRow]:
         #print(f"Query similar cards: {word}, {category}")
-        collection_instance = (collection if isinstance(collection, Collection) else self.get_collection(collection))
-        query_result = collection_instance.query(
+        query_result = self.__to_collection(collection).query(
             query_texts=[word] if isinstance(word, str) else word,
             n_results=k,
             where={"category": category} if category is not None else None,
             include=["documents", "metadatas", "distances"],
         )
+        return self.__query_result_to_rows(query_result, cutout_dist)
+
+    async def aquery_similar_rows(self, collection: str | Collection, word: str | list[str], category: str | None, k: int = 5, cutout_dist: float = 0.5) -> list[DictionaryRow]:
+        """Same as query_similar_rows(), without blocking the event loop."""
+        query_embeddings = await self.aembed([word] if isinstance(word, str) else word)
+        query_result = await asyncio.to_thread(
+            self.__to_collection(collection).query,
+            query_embeddings=query_embeddings,
+            n_results=k,
+            where={"category": category} if category is not None else None,
+            include=["documents", "metadatas", "distances"],
+        )
+        return self.__query_result_to_rows(query_result, cutout_dist)
+
+    @staticmethod
+    def __query_result_to_rows(query_result, cutout_dist: float | None) -> list[DictionaryRow]:
         print(
             query_result
         )  # inspect distances: smaller == closer (depends on embedding function)
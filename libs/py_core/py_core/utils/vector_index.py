@@ -0,0 +1,91 @@
+from typing import Sequence, Any
+
+import numpy
+
+
+class NearestNeighborIndex:
+    """
+    In-process nearest neighbour index over a float32 matrix, for corpora small enough to keep in memory.
+    Distances are squared L2, as in Chroma's default space.
+
+    Queries are answered by a batched matrix product, or by an HNSW graph (hnswlib) once the index has more than
+    `hnsw_threshold` rows. Queries filtered on metadata always search the matching rows exhaustively.
+    """
+
+    def __init__(self, ids: Sequence[str], embeddings: numpy.ndarray | Sequence[Sequence[float]],
+                 metadatas: Sequence[dict[str, Any]] | None = None, hnsw_threshold: int = 20000):
+        self.__ids = numpy.asarray(ids)
+        self.__matrix = numpy.ascontiguousarray(embeddings, dtype=numpy.float32)
+        if len(self.__ids) != len(self.__matrix):
+            raise ValueError(f"{len(self.__ids)} ids were given for {len(self.__matrix)} embeddings.")
+
+        self.__squared_norms = numpy.einsum("ij,ij->i", self.__matrix, self.__matrix)
+        self.__metadatas = list(metadatas) if metadatas is not None else [{} for _ in range(len(self.__ids))]
+        self.__filter_cache: dict[tuple[tuple[str, Any], ...], numpy.ndarray] = {}
+
+        self.__hnsw = self.__build_hnsw() if len(self.__ids) > hnsw_threshold else None
+
+    def __len__(self) -> int:
+        return len(self.__ids)
+
+    def __build_hnsw(self):
+        try:
+            import hnswlib
+        except ImportError:
+            print("hnswlib is not installed. Search the index exhaustively.")
+            return None
+
+        index = hnswlib.Index(space="l2", dim=self.__matrix.shape[1])
+        index.init_index(max_elements=len(self.__matrix), ef_construction=200, M=16)
+        index.add_items(self.__matrix, numpy.arange(len(self.__matrix)))
+        return index
+
+    def __filter_rows(self, where: dict[str, Any]) -> numpy.ndarray:
+        key = tuple(sorted(where.items()))
+        if key not in self.__filter_cache:
+            self.__filter_cache[key] = numpy.array(
+                [i for i, metadata in enumerate(self.__metadatas)
+                 if all(metadata.get(field) == value for field, value in where.items())], dtype=numpy.int64)
+        return self.__filter_cache[key]
+
+    def query(self, queries: numpy.ndarray | Sequence[Sequence[float]], k: int = 1,
+              where: dict[str, Any] | None = None) -> list[list[tuple[str, float]]]:
+        """
+        Returns the ids of the k nearest rows and their distances, nearest first, for each query.
+        `where` restricts the search to the rows whose metadata have the given values.
+        """
+        queries = numpy.ascontiguousarray(queries, dtype=numpy.float32)
+        if queries.ndim == 1:
+            queries = queries[numpy.newaxis, :]
+
+        rows = self.__filter_rows(where) if where is not None else None
+        num_candidates = len(rows) if rows is not None else len(self.__ids)
+        k = min(k, num_candidates)
+        if k == 0 or len(queries) == 0:
+            return [[] for _ in range(len(queries))]
+
+        if rows is None and self.__hnsw is not None:
+            self.__hnsw.set_ef(max(50, k))
+            indices, distances = self.__hnsw.knn_query(queries, k=k)
+        else:
+            matrix = self.__matrix if rows is None else self.__matrix[rows]
+            squared_norms = self.__squared_norms if rows is None else self.__squared_norms[rows]
+
+            distances = (numpy.einsum("ij,ij->i", queries, queries)[:, numpy.newaxis]
+                         + squared_norms[numpy.newaxis, :] - 2 * (queries @ matrix.T))
+            numpy.maximum(distances, 0, out=distances)
+
+            if k < num_candidates:
+                indices = numpy.argpartition(distances, k - 1, axis=1)[:, :k]
+            else:
+                indices = numpy.tile(numpy.arange(num_candidates), (len(queries), 1))
+            distances = numpy.take_along_axis(distances, indices, axis=1)
+            order = numpy.argsort(distances, axis=1)
+            indices = numpy.take_along_axis(indices, order, axis=1)
+            distances = numpy.take_along_axis(distances, order, axis=1)
+
+            if rows is not None:
+                indices = rows[indices]
+
+        return [[(str(self.__ids[index]), float(distance)) for index, distance in zip(query_indices, query_distances)]
+                for query_indices, query_distances in zip(indices, distances)]
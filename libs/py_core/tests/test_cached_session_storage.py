@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("chatlib")
+
+from py_core.system.model import DialogueMessage
+from py_core.system.storage.session.cached import CachedSessionStorage
+from py_core.system.storage.session.memory import OnMemorySessionStorage
+
+
+class _FailingStorage(OnMemorySessionStorage):
+    """Fails to add the messages of the given contents."""
+
+    def __init__(self, id: str, failing_contents: set[str]):
+        super().__init__(id)
+        self.failing_contents = failing_contents
+
+    async def add_dialogue_message(self, message: DialogueMessage):
+        if message.content in self.failing_contents:
+            raise RuntimeError(f"Failed to write {message.content}")
+        await super().add_dialogue_message(message)
+
+
+def test_write_error_is_reported_to_its_owner():
+    async def body():
+        storage = CachedSessionStorage(_FailingStorage("session", {"fails"}))
+
+        async def write():
+            await storage.add_dialogue_message(DialogueMessage.example_parent_message("fails"))
+            with pytest.raises(RuntimeError):
+                await storage.flush()
+            # Reported once.
+            await storage.flush()
+
+        async def other():
+            await asyncio.sleep(0)
+            await storage.flush()
+
+        await asyncio.gather(write(), other())
+
+    asyncio.run(body())
+
+
+def test_queued_writes_land_before_the_memory_is_reloaded():
+    async def body():
+        storage = CachedSessionStorage(_FailingStorage("session", {"fails"}))
+        assert await storage.get_dialogue() == []
+
+        await storage.add_dialogue_message(DialogueMessage.example_parent_message("fails"))
+        await storage.add_dialogue_message(DialogueMessage.example_parent_message("lands"))
+        # Served from the memory meanwhile.
+        assert [m.content for m in await storage.get_dialogue()] == ["fails", "lands"]
+
+        with pytest.raises(RuntimeError):
+            await storage.flush()
+
+        # Reloaded from the underlying storage, with the write queued after the failed one.
+        assert [m.content for m in await storage.get_dialogue()] == ["lands"]
+
+    asyncio.run(body())
@@ -0,0 +1,66 @@
+import os
+
+import pytest
+
+pytest.importorskip("chatlib")
+
+from py_core.system.model import CardCategory, CardInfo
+from py_core.system.task.card_image_matching.card_image_match_memo import CardImageMatchMemo
+
+
+def _card(label: str, label_localized: str, category: CardCategory = CardCategory.Topic) -> CardInfo:
+    return CardInfo(label=label, label_localized=label_localized, category=category, recommendation_id="rec")
+
+
+def test_get_and_put(tmp_path):
+    memo = CardImageMatchMemo("corpus", dir_path=str(tmp_path))
+    assert memo.get(_card("apple", "苹果")) is None
+
+    memo.put_many([(_card("apple", "苹果"), "image_apple"), (_card("run", "跑", CardCategory.Action), "image_run")])
+
+    assert len(memo) == 2
+    # Keyed on the label, the localized label, and the category; surrounding whitespace is ignored.
+    assert memo.get(_card(" apple ", "苹果")) == "image_apple"
+    assert memo.get(_card("apple", "苹果", CardCategory.Action)) is None
+    assert memo.get(_card("run", "跑", CardCategory.Action)) == "image_run"
+
+
+def test_persists_across_instances(tmp_path):
+    memo = CardImageMatchMemo("corpus", dir_path=str(tmp_path))
+    memo.put_many([(_card("apple", "苹果"), "image_apple")])
+    memo.put_many([(_card("apple", "苹果"), "image_apple_2")])
+
+    reloaded = CardImageMatchMemo("corpus", dir_path=str(tmp_path))
+    assert len(reloaded) == 1
+    assert reloaded.get(_card("apple", "苹果")) == "image_apple_2"
+
+
+def test_changed_corpus_starts_empty(tmp_path):
+    memo = CardImageMatchMemo("old_corpus", dir_path=str(tmp_path))
+    memo.put_many([(_card("apple", "苹果"), "image_apple")])
+
+    changed = CardImageMatchMemo("new_corpus", dir_path=str(tmp_path))
+    assert len(changed) == 0
+    # The memo of the outdated corpus is removed.
+    assert os.listdir(str(tmp_path)) == ["new_corpus"]
+
+
+def test_clear(tmp_path):
+    memo = CardImageMatchMemo("corpus", dir_path=str(tmp_path))
+    memo.put_many([(_card("apple", "苹果"), "image_apple")])
+    memo.clear()
+
+    assert memo.get(_card("apple", "苹果")) is None
+    assert len(CardImageMatchMemo("corpus", dir_path=str(tmp_path))) == 0
+
+
+def test_corpus_fingerprint(tmp_path):
+    table_path = tmp_path / "table.csv"
+    table_path.write_text("id,name\n1,apple\n")
+
+    fingerprint = CardImageMatchMemo.compute_corpus_fingerprint(str(table_path), extra="v1")
+    assert fingerprint == CardImageMatchMemo.compute_corpus_fingerprint(str(table_path), extra="v1")
+    assert fingerprint != CardImageMatchMemo.compute_corpus_fingerprint(str(table_path), extra="v2")
+
+    table_path.write_text("id,name\n1,banana\n")
+    assert fingerprint != CardImageMatchMemo.compute_corpus_fingerprint(str(table_path), extra="v1")
@@ -0,0 +1,142 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("chatlib")
+pytest.importorskip("openai")
+
+from py_core.utils.embedding_service import EmbeddingService
+
+
+class _FakeEmbeddings:
+    """Stands in for the embeddings endpoint. Requests wait until released, so that they overlap."""
+
+    def __init__(self):
+        self.requests: list[list[str]] = []
+        self.release = asyncio.Event()
+        self.error: Exception | None = None
+
+    async def create(self, input: list[str], model: str, dimensions: int):
+        self.requests.append(list(input))
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(text)), 0.0]) for text in input])
+
+
+def _make_service(tmp_path=None) -> tuple[EmbeddingService, _FakeEmbeddings]:
+    service = EmbeddingService("test-key", "model", 2, cache_size=100,
+                               disk_dir_path=str(tmp_path) if tmp_path is not None else None)
+    embeddings = _FakeEmbeddings()
+    service._EmbeddingService__async_client = SimpleNamespace(embeddings=embeddings)
+    return service, embeddings
+
+
+def test_concurrent_requests_are_coalesced():
+    async def body():
+        service, embeddings = _make_service()
+
+        first = asyncio.create_task(service.aembed(["a", "bb"]))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(service.aembed(["bb", "ccc", "a"]))
+        await asyncio.sleep(0)
+        embeddings.release.set()
+
+        assert await first == [[1.0, 0.0], [2.0, 0.0]]
+        assert await second == [[2.0, 0.0], [3.0, 0.0], [1.0, 0.0]]
+
+        # "a" and "bb" are requested once.
+        assert embeddings.requests == [["a", "bb"], ["ccc"]]
+        assert service.metrics()["coalesced"] == 2
+
+        assert await service.aembed(["a"]) == [[1.0, 0.0]]
+        assert len(embeddings.requests) == 2
+
+    asyncio.run(body())
+
+
+def test_duplicates_in_a_request_are_embedded_once():
+    async def body():
+        service, embeddings = _make_service()
+        embeddings.release.set()
+
+        assert await service.aembed(["a", "a", "bb"]) == [[1.0, 0.0], [1.0, 0.0], [2.0, 0.0]]
+        assert embeddings.requests == [["a", "bb"]]
+
+    asyncio.run(body())
+
+
+def test_failure_is_shared_and_not_cached():
+    async def body():
+        service, embeddings = _make_service()
+        embeddings.error = RuntimeError("Embedding failed")
+
+        first = asyncio.create_task(service.aembed(["a"]))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(service.aembed(["a"]))
+        await asyncio.sleep(0)
+        embeddings.release.set()
+
+        for task in [first, second]:
+            with pytest.raises(RuntimeError):
+                await task
+
+        embeddings.error = None
+        assert await service.aembed(["a"]) == [[1.0, 0.0]]
+        assert embeddings.requests == [["a"], ["a"]]
+
+    asyncio.run(body())
+
+
+def test_cancelled_joiner_does_not_cancel_the_request():
+    async def body():
+        service, embeddings = _make_service()
+
+        first = asyncio.create_task(service.aembed(["a"]))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(service.aembed(["a"]))
+        await asyncio.sleep(0)
+
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+        embeddings.release.set()
+
+        assert await first == [[1.0, 0.0]]
+        assert second.cancelled()
+
+    asyncio.run(body())
+
+
+def test_cancelled_owner_does_not_cancel_the_joiners():
+    async def body():
+        service, embeddings = _make_service()
+
+        first = asyncio.create_task(service.aembed(["a"]))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(service.aembed(["a"]))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        embeddings.release.set()
+
+        assert await second == [[1.0, 0.0]]
+        assert first.cancelled()
+        assert embeddings.requests == [["a"]]
+
+    asyncio.run(body())
+
+
+def test_disk_cache(tmp_path):
+    async def body():
+        service, embeddings = _make_service(tmp_path)
+        embeddings.release.set()
+        await service.aembed(["a"])
+
+        restarted, restarted_embeddings = _make_service(tmp_path)
+        assert await restarted.aembed(["a"]) == [[1.0, 0.0]]
+        assert restarted_embeddings.requests == []
+        assert restarted.metrics()["hits_disk"] == 1
+
+    asyncio.run(body())
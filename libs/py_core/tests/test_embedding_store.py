@@ -0,0 +1,92 @@
+import json
+import os
+
+import numpy
+
+from py_core.utils.embedding_store import EmbeddingStore
+
+
+def _embed(texts: list[str]) -> list[list[float]]:
+    return [[float(len(text)), float(i)] for i, text in enumerate(texts)]
+
+
+def test_embeds_only_missing_texts(tmp_path):
+    store = EmbeddingStore(str(tmp_path), "model", 2)
+    calls = []
+
+    def embed(texts: list[str]) -> list[list[float]]:
+        calls.append(texts)
+        return _embed(texts)
+
+    store.embed(["a", "bb"], embed)
+    embeddings = store.embed(["bb", "ccc", "ccc"], embed)
+
+    assert calls == [["a", "bb"], ["ccc"]]
+    assert embeddings[0] == [2.0, 1.0]
+    assert embeddings[1] == embeddings[2] == [3.0, 0.0]
+    assert store.is_dirty
+
+
+def test_save_and_load(tmp_path):
+    store = EmbeddingStore(str(tmp_path), "model", 2)
+    store.put(["a", "bb"], _embed(["a", "bb"]))
+    store.save()
+    assert not store.is_dirty
+
+    loaded = EmbeddingStore(str(tmp_path), "model", 2)
+    assert len(loaded) == 2
+    assert loaded.get(["bb", "unknown"])[0].tolist() == [2.0, 1.0]
+    assert loaded.get(["bb", "unknown"])[1] is None
+
+    # Built for another model.
+    assert len(EmbeddingStore(str(tmp_path), "model", 3)) == 0
+
+
+def test_save_retains_only_given_texts(tmp_path):
+    store = EmbeddingStore(str(tmp_path), "model", 2)
+    store.put(["a", "bb"], _embed(["a", "bb"]))
+    store.save(retain_texts=["a"])
+
+    loaded = EmbeddingStore(str(tmp_path), "model", 2)
+    assert len(loaded) == 1
+    assert loaded.get(["bb"]) == [None]
+
+
+def test_save_merges_embeddings_saved_by_others(tmp_path):
+    first = EmbeddingStore(str(tmp_path), "model", 2)
+    second = EmbeddingStore(str(tmp_path), "model", 2)
+
+    first.put(["a"], _embed(["a"]))
+    first.save()
+    second.put(["bb"], _embed(["bb"]))
+    second.save()
+
+    loaded = EmbeddingStore(str(tmp_path), "model", 2)
+    assert len(loaded) == 2
+    assert all(embedding is not None for embedding in loaded.get(["a", "bb"]))
+
+    # Only the files of the current and the previous manifests are kept.
+    store_dir = os.path.join(str(tmp_path), "model-2")
+    assert len([filename for filename in os.listdir(store_dir) if filename.endswith(".npy")]) == 4
+
+
+def test_unreadable_store_is_ignored(tmp_path):
+    store = EmbeddingStore(str(tmp_path), "model", 2)
+    store.put(["a"], _embed(["a"]))
+    store.save()
+
+    store_dir = os.path.join(str(tmp_path), "model-2")
+    with open(os.path.join(store_dir, "manifest.json"), "r") as f:
+        manifest = json.load(f)
+    os.remove(os.path.join(store_dir, manifest["matrix"]))
+    assert len(EmbeddingStore(str(tmp_path), "model", 2)) == 0
+
+    with open(os.path.join(store_dir, "manifest.json"), "w") as f:
+        f.write("{")
+    broken = EmbeddingStore(str(tmp_path), "model", 2)
+    assert len(broken) == 0
+
+    # Saving over the unreadable store works.
+    broken.put(["a"], numpy.array([[1.0, 2.0]]))
+    broken.save()
+    assert EmbeddingStore(str(tmp_path), "model", 2).get(["a"])[0].tolist() == [1.0, 2.0]
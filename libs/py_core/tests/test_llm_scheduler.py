@@ -0,0 +1,112 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("chatlib")
+
+from py_core.config import AACessTalkConfig
+from py_core.utils.llm_scheduler import LLMScheduler
+from py_core.utils.task_supervisor import TaskPriority
+
+
+def _make_scheduler(monkeypatch, max_concurrency: int, requests_per_minute: float = 0, burst: int = 10) -> LLMScheduler:
+    monkeypatch.setattr(AACessTalkConfig, "llm_max_concurrency", max_concurrency)
+    monkeypatch.setattr(AACessTalkConfig, "llm_requests_per_minute", requests_per_minute)
+    monkeypatch.setattr(AACessTalkConfig, "llm_burst", burst)
+    return LLMScheduler()
+
+
+def test_dispatches_in_priority_order(monkeypatch):
+    async def body():
+        scheduler = _make_scheduler(monkeypatch, max_concurrency=1)
+        release = asyncio.Event()
+        dispatched = []
+
+        async def request(name: str, priority: TaskPriority):
+            async with scheduler.slot(priority):
+                dispatched.append(name)
+                await release.wait()
+
+        blocker = asyncio.create_task(request("blocker", TaskPriority.Interactive))
+        await asyncio.sleep(0)
+        waiters = [asyncio.create_task(request(priority.name, priority))
+                   for priority in [TaskPriority.Batch, TaskPriority.Speculative, TaskPriority.Background,
+                                    TaskPriority.Interactive]]
+        await asyncio.sleep(0)
+
+        assert scheduler.metrics()["in_flight"] == 1
+        assert scheduler.metrics()["lanes"]["Batch"]["queue_depth"] == 1
+
+        release.set()
+        await asyncio.gather(blocker, *waiters)
+
+        assert dispatched == ["blocker", "Interactive", "Background", "Speculative", "Batch"]
+        assert scheduler.metrics()["in_flight"] == 0
+
+    asyncio.run(body())
+
+
+def test_bounds_concurrency(monkeypatch):
+    async def body():
+        scheduler = _make_scheduler(monkeypatch, max_concurrency=2)
+        running = 0
+        max_running = 0
+
+        async def request():
+            nonlocal running, max_running
+            async with scheduler.slot(TaskPriority.Background):
+                running += 1
+                max_running = max(max_running, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*[request() for _ in range(6)])
+
+        assert max_running == 2
+        assert scheduler.metrics()["lanes"]["Background"]["dispatched"] == 6
+
+    asyncio.run(body())
+
+
+def test_rate_limit(monkeypatch):
+    async def body():
+        # A token every 50 ms beyond the burst of 2.
+        scheduler = _make_scheduler(monkeypatch, max_concurrency=10, requests_per_minute=1200, burst=2)
+
+        async def request():
+            async with scheduler.slot(TaskPriority.Interactive):
+                return asyncio.get_running_loop().time()
+
+        started_at = asyncio.get_running_loop().time()
+        dispatched_at = await asyncio.gather(*[request() for _ in range(4)])
+
+        assert max(dispatched_at) - started_at >= 0.08
+        assert scheduler.metrics()["lanes"]["Interactive"]["throttled"] > 0
+
+    asyncio.run(body())
+
+
+def test_cancel_while_queued(monkeypatch):
+    async def body():
+        scheduler = _make_scheduler(monkeypatch, max_concurrency=1)
+        release = asyncio.Event()
+
+        async def request():
+            async with scheduler.slot(TaskPriority.Interactive):
+                await release.wait()
+
+        blocker = asyncio.create_task(request())
+        queued = asyncio.create_task(request())
+        await asyncio.sleep(0)
+
+        queued.cancel()
+        await asyncio.gather(queued, return_exceptions=True)
+        release.set()
+        await blocker
+
+        # The cancelled request does not hold the slot.
+        assert scheduler.metrics()["in_flight"] == 0
+        async with scheduler.slot(TaskPriority.Interactive):
+            assert scheduler.metrics()["in_flight"] == 1
+
+    asyncio.run(body())
@@ -0,0 +1,240 @@
+import asyncio
+
+import pytest
+
+from nanoid import generate
+
+from py_core.config import AACessTalkConfig
+from py_core.utils.task_supervisor import TaskSupervisor, TaskPriority, current_task_priority, _PrioritySlots
+
+
+def _make_supervisor(monkeypatch, concurrency: int, reserved: int) -> TaskSupervisor:
+    monkeypatch.setattr(AACessTalkConfig, "task_concurrency_per_dyad", concurrency)
+    monkeypatch.setattr(AACessTalkConfig, "task_reserved_interactive_slots", reserved)
+    # Slots are shared per dyad, so each test takes a new dyad.
+    return TaskSupervisor(generate(size=10))
+
+
+def test_slots_are_granted_in_priority_order():
+    async def body():
+        slots = _PrioritySlots(capacity=1, reserved_for_interactive=0)
+        await slots.acquire(TaskPriority.Interactive)
+
+        requests = {priority: slots.request(priority)
+                    for priority in [TaskPriority.Batch, TaskPriority.Speculative, TaskPriority.Background,
+                                     TaskPriority.Interactive]}
+        assert slots.waiting == 4
+
+        granted = []
+        for _ in range(len(requests)):
+            slots.release()
+            granted.extend(priority for priority, request in requests.items()
+                           if request.done() and priority not in granted)
+
+        assert granted == [TaskPriority.Interactive, TaskPriority.Background, TaskPriority.Speculative,
+                           TaskPriority.Batch]
+
+    asyncio.run(body())
+
+
+def test_reserved_slots_are_only_for_interactive_tasks():
+    async def body():
+        slots = _PrioritySlots(capacity=2, reserved_for_interactive=1)
+        await slots.acquire(TaskPriority.Background)
+
+        background = slots.request(TaskPriority.Background)
+        interactive = slots.request(TaskPriority.Interactive)
+
+        assert interactive.done()
+        assert not background.done()
+        assert slots.running == 2
+
+    asyncio.run(body())
+
+
+def test_promoted_request_overtakes():
+    async def body():
+        slots = _PrioritySlots(capacity=1, reserved_for_interactive=0)
+        await slots.acquire(TaskPriority.Interactive)
+
+        background = slots.request(TaskPriority.Background)
+        speculative = slots.request(TaskPriority.Speculative)
+        slots.promote(speculative, TaskPriority.Interactive)
+        assert slots.waiting == 2
+
+        slots.release()
+        assert speculative.done() and not background.done()
+
+        slots.release()
+        assert background.done()
+        assert slots.waiting == 0
+
+    asyncio.run(body())
+
+
+def test_cancel_while_queued(monkeypatch):
+    async def body():
+        supervisor = _make_supervisor(monkeypatch, concurrency=1, reserved=0)
+        release = asyncio.Event()
+        started = []
+
+        async def work(name: str):
+            started.append(name)
+            await release.wait()
+            return name
+
+        blocker = supervisor.spawn(work("blocker"), name="blocker")
+        queued = supervisor.spawn(work("queued"), name="queued")
+        await asyncio.sleep(0)
+
+        supervisor.cancel(queued.task)
+        release.set()
+
+        assert await supervisor.join(blocker.task) == "blocker"
+        assert await supervisor.join(queued.task) is None
+        assert queued.task.cancelled()
+        assert started == ["blocker"]
+
+        # The slot of the cancelled task is not leaked.
+        assert await supervisor.run(work("after"), name="after") == "after"
+        assert supervisor.metrics()["cancelled"] == 1
+
+    asyncio.run(body())
+
+
+def test_join_promotes_queued_task(monkeypatch):
+    async def body():
+        supervisor = _make_supervisor(monkeypatch, concurrency=1, reserved=0)
+        release = asyncio.Event()
+        started = []
+
+        async def work(name: str):
+            started.append((name, current_task_priority()))
+            await release.wait()
+            return name
+
+        blocker = supervisor.spawn(work("blocker"), name="blocker")
+        background = supervisor.spawn(work("background"), name="background", priority=TaskPriority.Background)
+        speculative = supervisor.spawn(work("speculative"), name="speculative", priority=TaskPriority.Speculative)
+        await asyncio.sleep(0)
+
+        # Joined from an interactive request.
+        joining = asyncio.create_task(supervisor.join(speculative.task))
+        await asyncio.sleep(0)
+        release.set()
+
+        assert await joining == "speculative"
+        await supervisor.join(background.task)
+        await supervisor.join(blocker.task)
+
+        assert [name for name, _ in started] == ["blocker", "speculative", "background"]
+        assert dict(started)["speculative"] == TaskPriority.Interactive
+        assert supervisor.metrics()["promoted"] == 1
+
+    asyncio.run(body())
+
+
+def test_deadline(monkeypatch):
+    async def body():
+        supervisor = _make_supervisor(monkeypatch, concurrency=1, reserved=0)
+
+        task_info = supervisor.spawn(asyncio.sleep(10), name="slow", priority=TaskPriority.Speculative, timeout=0.01)
+
+        assert await supervisor.join(task_info.task) is None
+        assert supervisor.metrics()["deadline_exceeded"] == 1
+
+    asyncio.run(body())
+
+
+def test_held_while_pending(monkeypatch):
+    async def body():
+        supervisor = _make_supervisor(monkeypatch, concurrency=2, reserved=0)
+        holder: set[TaskSupervisor] = set()
+        supervisor.hold_while_pending(holder)
+        assert holder == set()
+
+        finished = []
+
+        async def work(name: str):
+            await asyncio.sleep(0.01)
+            if name == "first":
+                # Spawned by a pending task.
+                supervisor.spawn(work("second"), name="second")
+            finished.append(name)
+
+        supervisor.spawn(work("first"), name="first")
+        assert holder == {supervisor}
+
+        await supervisor.drain()
+        assert finished == ["first", "second"]
+        assert holder == set()
+
+    asyncio.run(body())
+
+
+def test_idle_slots_are_discarded(monkeypatch):
+    async def body():
+        supervisor = _make_supervisor(monkeypatch, concurrency=1, reserved=0)
+        slots_per_dyad = TaskSupervisor._TaskSupervisor__slots_per_dyad
+        dyad_id = supervisor._TaskSupervisor__dyad_id
+        release = asyncio.Event()
+
+        blocker = supervisor.spawn(release.wait(), name="blocker")
+        queued = supervisor.spawn(release.wait(), name="queued")
+        await asyncio.sleep(0)
+        assert dyad_id in slots_per_dyad
+
+        supervisor.cancel(queued.task)
+        await asyncio.gather(queued.task, return_exceptions=True)
+        assert dyad_id in slots_per_dyad
+
+        release.set()
+        await supervisor.join(blocker.task)
+        assert dyad_id not in slots_per_dyad
+
+    asyncio.run(body())
+
+
+def test_stream_is_relayed(monkeypatch):
+    async def body():
+        supervisor = _make_supervisor(monkeypatch, concurrency=1, reserved=0)
+
+        async def events():
+            yield "a"
+            yield "b"
+
+        _, relay = supervisor.spawn_stream(events(), name="stream")
+        assert [event async for event in relay] == ["a", "b"]
+
+        async def failing_events():
+            yield "a"
+            raise RuntimeError("Generation failed")
+
+        _, relay = supervisor.spawn_stream(failing_events(), name="failing_stream")
+        assert await anext(relay) == "a"
+        with pytest.raises(RuntimeError):
+            await anext(relay)
+
+    asyncio.run(body())
+
+
+def test_stream_cancelled_while_queued(monkeypatch):
+    async def body():
+        supervisor = _make_supervisor(monkeypatch, concurrency=1, reserved=0)
+        release = asyncio.Event()
+
+        async def events():
+            yield "never"
+
+        blocker = supervisor.spawn(release.wait(), name="blocker")
+        task_info, relay = supervisor.spawn_stream(events(), name="stream")
+        await asyncio.sleep(0)
+
+        supervisor.cancel(task_info.task)
+        # The relay ends rather than waiting forever.
+        assert await asyncio.wait_for(anext(relay, None), timeout=1) is None
+
+        release.set()
+        await supervisor.join(blocker.task)
+
+    asyncio.run(body())
@@ -0,0 +1,68 @@
+import numpy
+import pytest
+
+from py_core.utils.vector_index import NearestNeighborIndex
+
+
+def _make_index() -> NearestNeighborIndex:
+    return NearestNeighborIndex(
+        ids=["a", "b", "c", "d"],
+        embeddings=[[0.0, 0.0], [1.0, 0.0], [0.0, 2.0], [3.0, 3.0]],
+        metadatas=[{"category": "topic"}, {"category": "action"}, {"category": "topic"}, {"category": "action"}],
+    )
+
+
+def test_top_k():
+    index = _make_index()
+
+    [result] = index.query([0.9, 0.1], k=2)
+
+    assert [id for id, _ in result] == ["b", "a"]
+    # Squared L2 distances.
+    assert result[0][1] == pytest.approx(0.02)
+    assert result[1][1] == pytest.approx(0.82)
+
+
+def test_batched_queries_match_brute_force():
+    rng = numpy.random.default_rng(0)
+    embeddings = rng.normal(size=(50, 8))
+    queries = rng.normal(size=(5, 8))
+    index = NearestNeighborIndex([str(i) for i in range(len(embeddings))], embeddings)
+
+    results = index.query(queries, k=3)
+
+    for query, result in zip(queries, results):
+        expected = numpy.argsort(((embeddings - query) ** 2).sum(axis=1))[:3]
+        assert [id for id, _ in result] == [str(i) for i in expected]
+
+
+def test_where_filter():
+    index = _make_index()
+
+    [result] = index.query([0.9, 0.1], k=2, where={"category": "topic"})
+    assert [id for id, _ in result] == ["a", "c"]
+
+    [result] = index.query([0.9, 0.1], k=2, where={"category": "unknown"})
+    assert result == []
+
+
+def test_k_larger_than_the_index():
+    index = _make_index()
+
+    [result] = index.query([0.0, 0.0], k=10)
+    assert [id for id, _ in result] == ["a", "b", "c", "d"]
+
+    [result] = index.query([0.0, 0.0], k=10, where={"category": "action"})
+    assert [id for id, _ in result] == ["b", "d"]
+
+
+def test_empty_index():
+    index = NearestNeighborIndex([], numpy.zeros((0, 2)))
+
+    assert len(index) == 0
+    assert index.query([[0.0, 0.0], [1.0, 1.0]], k=3) == [[], []]
+
+
+def test_mismatched_ids():
+    with pytest.raises(ValueError):
+        NearestNeighborIndex(["a"], [[0.0, 0.0], [1.0, 1.0]])
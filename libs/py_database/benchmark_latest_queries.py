@@ -0,0 +1,133 @@
+import argparse
+import asyncio
+import sqlite3
+import tempfile
+import time
+from os import path
+
+from py_core.system.model import id_generator
+from py_database import SQLSessionStorage
+from py_database.database import create_database_engine, make_async_session_maker, create_db_and_tables
+
+# Measures the "latest row per session/turn" lookups of SQLSessionStorage while the tables grow.
+# With the composite indexes, the query plans must not contain a full scan or a temp b-tree for ORDER BY,
+# and the lookup time should stay nearly flat as the row count grows by orders of magnitude.
+
+LATEST_ROW_TABLES = ["message", "child_card_recommendation_result", "interim_card_selection",
+                     "parent_guide_recommendation_result"]
+
+ROWS_PER_TURN = 4
+TURNS_PER_SESSION = 50
+
+
+def populate(db_path: str, dyad_id: str, num_rows: int, start_row: int):
+    conn = sqlite3.connect(db_path)
+    try:
+        rows_per_session = ROWS_PER_TURN * TURNS_PER_SESSION
+        sessions = []
+        turns = []
+        per_table_rows = {table: [] for table in LATEST_ROW_TABLES}
+        for i in range(start_row, num_rows):
+            session_index = i // rows_per_session
+            turn_index = i // ROWS_PER_TURN
+            session_id = f"s{session_index}"
+            turn_id = f"t{turn_index}"
+            if i % rows_per_session == 0:
+                sessions.append((session_id, dyad_id, "Initial", "Plan", "UTC", i))
+            if i % ROWS_PER_TURN == 0:
+                turns.append((turn_id, session_id, "Parent", i, i + ROWS_PER_TURN))
+            for table in LATEST_ROW_TABLES:
+                per_table_rows[table].append((f"{table}_{i}", session_id, turn_id, i))
+
+        conn.executemany("INSERT INTO session (id, dyad_id, status, topic_category, local_timezone, started_timestamp) "
+                         "VALUES (?, ?, ?, ?, ?, ?)", sessions)
+        conn.executemany("INSERT INTO dialogue_turn (id, session_id, role, started_timestamp, ended_timestamp) "
+                         "VALUES (?, ?, ?, ?, ?)", turns)
+        conn.executemany("INSERT INTO message (id, session_id, turn_id, timestamp, role, content_type, content_str) "
+                         "VALUES (?, ?, ?, ?, 'Parent', 'text', 'Hello')", per_table_rows["message"])
+        for table in ["child_card_recommendation_result", "interim_card_selection"]:
+            conn.executemany(f"INSERT INTO {table} (id, session_id, turn_id, timestamp, cards) VALUES (?, ?, ?, ?, '[]')",
+                             per_table_rows[table])
+        conn.executemany("INSERT INTO parent_guide_recommendation_result (id, session_id, turn_id, timestamp, guides) "
+                         "VALUES (?, ?, ?, ?, '[]')", per_table_rows["parent_guide_recommendation_result"])
+        conn.commit()
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+
+
+def print_query_plans(db_path: str, session_id: str, turn_id: str):
+    conn = sqlite3.connect(db_path)
+    try:
+        queries = [("dialogue_turn", "SELECT * FROM dialogue_turn WHERE session_id = ? ORDER BY started_timestamp DESC LIMIT 1", (session_id,))]
+        for table in LATEST_ROW_TABLES:
+            queries.append((table, f"SELECT * FROM {table} WHERE session_id = ? ORDER BY timestamp DESC LIMIT 1", (session_id,)))
+            queries.append((table, f"SELECT * FROM {table} WHERE session_id = ? AND turn_id = ? ORDER BY timestamp DESC LIMIT 1", (session_id, turn_id)))
+
+        for table, query, params in queries:
+            plan = " / ".join(row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + query, params))
+            flag = "  <-- NOT INDEXED" if ("SCAN" in plan and "USING" not in plan) or "TEMP B-TREE" in plan else ""
+            print(f"  {table:<36} {plan}{flag}")
+    finally:
+        conn.close()
+
+
+async def measure(storage: SQLSessionStorage, turn_id: str, repeat: int) -> dict[str, float]:
+    lookups = {
+        "latest_turn": lambda: storage.get_latest_turn(),
+        "latest_card_selection": lambda: storage.get_latest_card_selection(turn_id=turn_id),
+        "latest_child_card_recommendation": lambda: storage.get_latest_child_card_recommendation(turn_id=turn_id),
+        "latest_parent_guide_recommendation": lambda: storage.get_latest_parent_guide_recommendation(),
+        "latest_dialogue_message": lambda: storage.get_latest_dialogue_message(),
+    }
+
+    results = {}
+    for name, lookup in lookups.items():
+        await lookup()
+        t_start = time.perf_counter()
+        for _ in range(repeat):
+            await lookup()
+        results[name] = (time.perf_counter() - t_start) / repeat * 1000
+    return results
+
+
+async def run(sizes: list[int], repeat: int):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = path.join(tmp_dir, "benchmark.sqlite3")
+        engine = create_database_engine(db_path)
+        await create_db_and_tables(engine)
+        SQLSessionStorage.set_session_maker(make_async_session_maker(engine))
+
+        dyad_id = id_generator()
+        conn = sqlite3.connect(db_path)
+        conn.execute("INSERT INTO dyad (id, alias, child_name, child_gender, parent_type, locale) VALUES (?, 'benchmark', 'child', 'Boy', 'Mother', 'SimplifiedChinese')", (dyad_id,))
+        conn.commit()
+        conn.close()
+
+        num_rows = 0
+        for size in sorted(sizes):
+            print(f"Populating up to {size} rows per table...")
+            populate(db_path, dyad_id, size, num_rows)
+            num_rows = size
+
+            # Pick the session in the middle of the table.
+            middle_row = num_rows // 2
+            session_id = f"s{middle_row // (ROWS_PER_TURN * TURNS_PER_SESSION)}"
+            turn_id = f"t{middle_row // ROWS_PER_TURN}"
+
+            print_query_plans(db_path, session_id, turn_id)
+
+            storage = SQLSessionStorage(session_id)
+            for name, elapsed in (await measure(storage, turn_id, repeat)).items():
+                print(f"  {name:<36} {elapsed:.3f} ms")
+
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the latest-row lookups of SQLSessionStorage.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.sizes, args.repeat))
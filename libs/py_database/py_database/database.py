@@ -3,12 +3,74 @@ from .model import *
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import text
+from sqlalchemy import BigInteger, text, event, inspect, make_url
 from sqlmodel import SQLModel, Field
 from pydantic.fields import FieldInfo
+from py_core.config import AACessTalkConfig
 
-def create_database_engine(db_path: str, verbose: bool = False) -> AsyncEngine:
-    return create_async_engine(f"sqlite+aiosqlite:///{db_path}", echo=verbose)
+
+def make_database_url(db_path_or_url: str) -> str:
+    # Plain file paths are regarded as SQLite databases.
+    if "://" in db_path_or_url:
+        return db_path_or_url
+    else:
+        return f"sqlite+aiosqlite:///{db_path_or_url}"
+
+
+def create_database_engine(db_path_or_url: str, verbose: bool = False,
+                           journal_mode: str | None = None,
+                           synchronous: str | None = None,
+                           busy_timeout_ms: int | None = None,
+                           mmap_size: int | None = None,
+                           cache_size_kib: int | None = None,
+                           pool_size: int | None = None,
+                           max_overflow: int | None = None,
+                           pool_timeout: float | None = None
+                           ) -> AsyncEngine:
+    """
+    Create an async engine from a SQLite file path or a database URL (e.g., postgresql+asyncpg://...).
+    Unspecified settings fall back to AACessTalkConfig.
+    For SQLite, WAL journal lets readers proceed while a writer holds the lock, and busy_timeout makes writers wait
+    for each other instead of failing with "database is locked".
+    """
+
+    url = make_url(make_database_url(db_path_or_url))
+    is_sqlite = url.get_backend_name() == "sqlite"
+
+    engine_kwargs = dict(echo=verbose)
+    if not is_sqlite or url.database not in (None, "", ":memory:"):
+        # In-memory databases use a static pool which does not take sizing.
+        engine_kwargs.update(
+            pool_size=pool_size if pool_size is not None else AACessTalkConfig.database_pool_size,
+            max_overflow=max_overflow if max_overflow is not None else AACessTalkConfig.database_max_overflow,
+            pool_timeout=pool_timeout if pool_timeout is not None else AACessTalkConfig.database_pool_timeout,
+        )
+    if not is_sqlite:
+        engine_kwargs.update(pool_pre_ping=True)
+
+    engine = create_async_engine(url, **engine_kwargs)
+
+    if is_sqlite:
+        journal_mode = journal_mode or AACessTalkConfig.database_journal_mode
+        synchronous = synchronous or AACessTalkConfig.database_synchronous
+        busy_timeout_ms = busy_timeout_ms if busy_timeout_ms is not None else AACessTalkConfig.database_busy_timeout_ms
+        mmap_size = mmap_size if mmap_size is not None else AACessTalkConfig.database_mmap_size
+        cache_size_kib = cache_size_kib if cache_size_kib is not None else AACessTalkConfig.database_cache_size_kib
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def _set_sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+                cursor.execute(f"PRAGMA synchronous={synchronous}")
+                cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+                cursor.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+                # Negative value denotes the size in KiB rather than in pages.
+                cursor.execute(f"PRAGMA cache_size={-int(cache_size_kib)}")
+            finally:
+                cursor.close()
+
+    return engine
 
 
 def make_async_session_maker(engine: AsyncEngine) -> sessionmaker[AsyncSession]:
@@ -18,11 +80,11 @@ async def column_exists_in_db(
     engine: AsyncEngine, model: SQLModel, column_name: str
 ) -> bool:
     async with engine.connect() as connection:
-        result = await connection.execute(text(f"PRAGMA table_info({model.__tablename__})"))
-
-        columns = [row[1] for row in result]
+        columns = await connection.run_sync(
+            lambda sync_connection: inspect(sync_connection).get_columns(model.__tablename__)
+        )
 
-        return column_name in columns
+        return column_name in [column["name"] for column in columns]
 
 
 async def add_column_to_table(
@@ -32,21 +94,59 @@ async def add_column_to_table(
     column_params: str,
     default_value: Optional[any],
 ):
-    async with engine.connect() as connection:
+    async with engine.begin() as connection:
+        preparer = connection.dialect.identifier_preparer
+        default_clause = ""
+        if default_value is not None:
+            if isinstance(default_value, str):
+                default_clause = "DEFAULT '" + default_value.replace("'", "''") + "'"
+            else:
+                default_clause = f"DEFAULT {default_value}"
         await connection.execute(
             text(
-                f"ALTER TABLE {model.__tablename__}\nADD COLUMN {column_name} {column_params} {('DEFAULT ' + default_value) if default_value is not None else ''}"
+                f"ALTER TABLE {preparer.quote(model.__tablename__)}\nADD COLUMN {preparer.quote(column_name)} {column_params} {default_clause}"
             )
         )
 
 
+def _create_missing_indexes(connection):
+    # create_all() skips existing tables, so indexes declared later are not created on existing databases.
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+
+def _widen_bigint_columns(connection):
+    # Timestamp columns were created as INTEGER before they were declared BigInteger, which overflows on Postgres.
+    # SQLite integers are 64-bit regardless of the declared type.
+    if connection.dialect.name != "postgresql":
+        return
+
+    inspector = inspect(connection)
+    preparer = connection.dialect.identifier_preparer
+    for table in SQLModel.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing_types = {column["name"]: column["type"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if (isinstance(column.type, BigInteger) and column.name in existing_types
+                    and not isinstance(existing_types[column.name], BigInteger)):
+                print(f"Widen {table.name}.{column.name} to BIGINT.")
+                connection.execute(text(
+                    f"ALTER TABLE {preparer.quote(table.name)} ALTER COLUMN {preparer.quote(column.name)} TYPE BIGINT"))
+
+
 async def migrate(engine: AsyncEngine):
     print("Run migration...")
 
+    async with engine.begin() as connection:
+        await connection.run_sync(_create_missing_indexes)
+        await connection.run_sync(_widen_bigint_columns)
+
     if (await column_exists_in_db(engine, DyadORM, "locale")) is False:
         # Add locale column
         await add_column_to_table(
-            engine, DyadORM, "locale", "VARCHAR(7) NOT NULL", "SimplifiedChinese"
+            engine, DyadORM, "locale", "VARCHAR(18) NOT NULL", "SimplifiedChinese"
         )
 
     return
@@ -3,7 +3,8 @@ from typing import Optional
 from datetime import datetime
 from pydantic import BaseModel
 from sqlmodel import SQLModel, Column, Field, Relationship, JSON, UniqueConstraint
-from sqlalchemy import DateTime, func
+from sqlalchemy import BigInteger, DateTime, Index, func
+from sqlalchemy.dialects.postgresql import JSONB
 
 from py_core.system.model import (UserLocale, id_generator, DialogueRole, DialogueMessage,
                                   CardInfoListTypeAdapter, CardInfo,
@@ -13,6 +14,8 @@ from py_core.system.model import (UserLocale, id_generator, DialogueRole, Dialog
                                   ParentGuideElement,
                                   ParentType,
                                   ParentExampleMessage, CardIdentity,
+                                  DialogueInspectionRecord,
+                                  ParentGuideFeedbackRecord,
                                   SessionInfo,
                                   SessionStatus,
                                   DialogueTurn,
@@ -28,6 +31,10 @@ from py_core.system.session_topic import SessionTopicCategory, SessionTopicInfo
 from chatlib.utils.time import get_timestamp
 
 
+# Binary JSON on Postgres; plain JSON elsewhere.
+JSONVariant = JSON().with_variant(JSONB(), "postgresql")
+
+
 class IdTimestampMixin(BaseModel):
     id: str = Field(primary_key=True, default_factory=id_generator)
     created_at: Optional[datetime] = Field(
@@ -72,8 +79,8 @@ class SessionORM(SQLModel, IdTimestampMixin, DyadIdMixin, table=True):
     subtopic_description: Optional[str] = None
 
     local_timezone: str = Field(nullable=False)
-    started_timestamp: int = Field(default_factory=get_timestamp, index=True)
-    ended_timestamp: int | None = Field(default=None, index=True)
+    started_timestamp: int = Field(default_factory=get_timestamp, index=True, sa_type=BigInteger)
+    ended_timestamp: int | None = Field(default=None, index=True, sa_type=BigInteger)
 
     def to_data_model(self) -> SessionInfo:
         return SessionInfo(
@@ -95,18 +102,30 @@ class SessionIdMixin(BaseModel):
 
 
 class TimestampColumnMixin(BaseModel):
-    timestamp: int = Field(default_factory=get_timestamp, index=True)
+    # Epoch milliseconds overflow a 32-bit INTEGER, which is what int maps to on Postgres.
+    timestamp: int = Field(default_factory=get_timestamp, index=True, sa_type=BigInteger)
+
+
+def make_latest_row_indexes(tablename: str) -> tuple[Index, ...]:
+    # Serve "latest row of a session (and a turn)" lookups without scanning or sorting the rows of other sessions.
+    return (
+        Index(f"ix_{tablename}_session_turn_timestamp", "session_id", "turn_id", "timestamp"),
+        Index(f"ix_{tablename}_session_timestamp", "session_id", "timestamp"),
+    )
 
 
 class DialogueTurnORM(SQLModel, IdTimestampMixin, SessionIdMixin, table=True):
     __tablename__: str = "dialogue_turn"
+    __table_args__ = (
+        Index("ix_dialogue_turn_session_started_timestamp", "session_id", "started_timestamp"),
+    )
 
     role: DialogueRole = Field(allow_mutation=False)
 
     audio_filename: str | None = Field(default=None)
 
-    started_timestamp: int = Field(default_factory=get_timestamp, index=True, allow_mutation=False)
-    ended_timestamp: int | None = Field(default=None, index=True)
+    started_timestamp: int = Field(default_factory=get_timestamp, index=True, allow_mutation=False, sa_type=BigInteger)
+    ended_timestamp: int | None = Field(default=None, index=True, sa_type=BigInteger)
 
     @classmethod
     def from_data_model(cls, model: DialogueTurn, session_id: str) -> 'DialogueTurnORM':
@@ -124,6 +143,7 @@ class DialogueMessageContentType(StrEnum):
 
 class DialogueMessageORM(SQLModel, IdTimestampMixin, SessionIdMixin, TurnIdMixin, TimestampColumnMixin, table=True):
     __tablename__: str = "message"
+    __table_args__ = make_latest_row_indexes("message")
 
     role: DialogueRole
     content_type: DialogueMessageContentType
@@ -153,8 +173,9 @@ class DialogueMessageORM(SQLModel, IdTimestampMixin, SessionIdMixin, TurnIdMixin
 
 class ChildCardRecommendationResultORM(SQLModel, IdTimestampMixin, SessionIdMixin, TurnIdMixin, TimestampColumnMixin, table=True):
     __tablename__: str = "child_card_recommendation_result"
+    __table_args__ = make_latest_row_indexes("child_card_recommendation_result")
 
-    cards: list[CardInfo] = Field(sa_column=Column(JSON), default=[])
+    cards: list[CardInfo] = Field(sa_column=Column(JSONVariant), default=[])
 
     def to_data_model(self) -> ChildCardRecommendationResult:
         return ChildCardRecommendationResult(**self.model_dump(exclude={"cards"}), cards=self.cards)
@@ -167,8 +188,9 @@ class ChildCardRecommendationResultORM(SQLModel, IdTimestampMixin, SessionIdMixi
 
 class InterimCardSelectionORM(SQLModel, IdTimestampMixin, SessionIdMixin, TurnIdMixin, TimestampColumnMixin, table=True):
     __tablename__:str = "interim_card_selection"
+    __table_args__ = make_latest_row_indexes("interim_card_selection")
 
-    cards: list[CardIdentity] = Field(sa_column=Column(JSON), default=[])
+    cards: list[CardIdentity] = Field(sa_column=Column(JSONVariant), default=[])
 
     def to_data_model(self) -> InterimCardSelection:
         return InterimCardSelection(**self.model_dump(exclude={"cards"}), cards=self.cards)
@@ -180,8 +202,9 @@ class InterimCardSelectionORM(SQLModel, IdTimestampMixin, SessionIdMixin, TurnId
 
 class ParentGuideRecommendationResultORM(SQLModel, IdTimestampMixin, SessionIdMixin, TurnIdMixin, TimestampColumnMixin, table=True):
     __tablename__:str = "parent_guide_recommendation_result"
+    __table_args__ = make_latest_row_indexes("parent_guide_recommendation_result")
 
-    guides: list[ParentGuideElement] = Field(sa_column=Column(JSON), default=[])
+    guides: list[ParentGuideElement] = Field(sa_column=Column(JSONVariant), default=[])
 
     def to_data_model(self) -> ParentGuideRecommendationResult:
         return ParentGuideRecommendationResult(**self.model_dump())
@@ -194,6 +217,9 @@ class ParentGuideRecommendationResultORM(SQLModel, IdTimestampMixin, SessionIdMi
 
 class ParentExampleMessageORM(SQLModel, IdTimestampMixin, SessionIdMixin, table=True):
     __tablename__:str = "parent_example_message"
+    __table_args__ = (
+        Index("ix_parent_example_message_recommendation_guide", "recommendation_id", "guide_id"),
+    )
 
     recommendation_id: str = Field(foreign_key=f"{ParentGuideRecommendationResultORM.__tablename__}.id")
     guide_id: str = Field(nullable=False, index=True)
@@ -209,12 +235,47 @@ class ParentExampleMessageORM(SQLModel, IdTimestampMixin, SessionIdMixin, table=
         return ParentExampleMessageORM(**data_model.model_dump(), session_id=session_id)
 
 
+class DialogueInspectionRecordORM(SQLModel, IdTimestampMixin, SessionIdMixin, TimestampColumnMixin, table=True):
+    __tablename__: str = "dialogue_inspection_record"
+
+    # Not a foreign key; the inspection may finish before its message is committed.
+    message_id: str = Field(index=True)
+
+    categories: list[str] = Field(sa_column=Column(JSONVariant), default=[])
+    rationale: Optional[str] = Field(default=None)
+    feedback: Optional[str] = Field(default=None)
+
+    def to_data_model(self) -> DialogueInspectionRecord:
+        return DialogueInspectionRecord(**self.model_dump())
+
+    @classmethod
+    def from_data_model(cls, session_id: str, data_model: DialogueInspectionRecord) -> 'DialogueInspectionRecordORM':
+        return DialogueInspectionRecordORM(**data_model.model_dump(), session_id=session_id)
+
+
+class ParentGuideFeedbackRecordORM(SQLModel, IdTimestampMixin, SessionIdMixin, TimestampColumnMixin, table=True):
+    __tablename__: str = "parent_guide_feedback_record"
+
+    # Not a foreign key; the pending record is added along with the recommendation.
+    recommendation_id: str = Field(index=True)
+
+    resolved: bool = Field(default=False)
+    guide: Optional[ParentGuideElement] = Field(sa_column=Column(JSONVariant, nullable=True), default=None)
+
+    def to_data_model(self) -> ParentGuideFeedbackRecord:
+        return ParentGuideFeedbackRecord(**self.model_dump())
+
+    @classmethod
+    def from_data_model(cls, session_id: str, data_model: ParentGuideFeedbackRecord) -> 'ParentGuideFeedbackRecordORM':
+        return ParentGuideFeedbackRecordORM(**data_model.model_dump(), session_id=session_id)
+
+
 class InteractionORM(SQLModel, IdTimestampMixin, SessionIdMixin, table=True):
     __tablename__: str = "interaction"
 
     type: InteractionType = Field(nullable=False)
     turn_id: str = Field(nullable=False)
-    metadata_json: dict[str, dict | int | float | str | None] = Field(sa_column=Column(JSON, name="metadata"), default=None)
+    metadata_json: dict[str, dict | int | float | str | None] = Field(sa_column=Column(JSONVariant, name="metadata"), default=None)
 
     @classmethod
     def from_data_model(cls, interaction: Interaction, session_id: str) -> 'InteractionORM':
@@ -1,19 +1,36 @@
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator
+
 from pydantic import validate_call
-from sqlmodel import select, col, update
+from sqlmodel import select, col
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from py_core.system.model import DialogueTurn, Interaction, ParentGuideRecommendationResult, ChildCardRecommendationResult, Dialogue, \
-    DialogueMessage, ParentExampleMessage, InterimCardSelection, SessionInfo
-from py_core.system.storage import SessionStorage
+    DialogueMessage, ParentExampleMessage, InterimCardSelection, SessionInfo, DialogueInspectionRecord, \
+    ParentGuideFeedbackRecord
+from py_core.system.storage import RestorableSessionStorage
 from py_database.model import (DialogueMessageORM, DialogueTurnORM, InteractionORM, SessionORM,
                                ChildCardRecommendationResultORM,
                                InterimCardSelectionORM,
                                ParentGuideRecommendationResultORM,
-                               ParentExampleMessageORM, SessionIdMixin)
+                               ParentExampleMessageORM, DialogueInspectionRecordORM,
+                               ParentGuideFeedbackRecordORM, SessionIdMixin)
 from py_database.storage_base import SQLStorageBase
 
 
-class SQLSessionStorage(SessionStorage, SQLStorageBase):
+@dataclass
+class _ActiveTransaction:
+    db: AsyncSession
+    owner: asyncio.Task | None
+
+
+class SQLSessionStorage(RestorableSessionStorage, SQLStorageBase):
+
+    # Messages are timestamped by the app clock when created, so a message may be committed after a newer one was fetched.
+    # Each incremental fetch of the dialogue re-reads this window before the last seen timestamp to pick such rows up.
+    dialogue_refetch_window_ms: int = 60 * 1000
 
     @classmethod
     async def _load_session_info(cls, session_id: str) -> SessionInfo | None:
@@ -22,11 +39,9 @@ class SQLSessionStorage(SessionStorage, SQLStorageBase):
 
     @classmethod        
     async def __load_session_info_impl(cls, db: AsyncSession, session_id: str) -> SessionInfo | None:
-        print("Find session with id", session_id)
         statement = select(SessionORM).where(SessionORM.id == session_id)
         results = await db.exec(statement)
         session_orm = results.first()
-        print("Session orm:", session_orm)
         if session_orm is not None:
             return session_orm.to_data_model()
         else:
@@ -37,21 +52,96 @@ class SQLSessionStorage(SessionStorage, SQLStorageBase):
     def __init__(self, session_id: str):
         super().__init__(session_id)
 
+        # Incremental view of the dialogue. Only rows around or after the last seen timestamp are fetched.
+        self.__dialogue: Dialogue = []
+        self.__dialogue_message_ids: set[str] = set()
+        self.__dialogue_last_timestamp: int | None = None
+
+        self.__transaction: _ActiveTransaction | None = None
+
+    def __reset_dialogue_view(self):
+        self.__dialogue = []
+        self.__dialogue_message_ids = set()
+        self.__dialogue_last_timestamp = None
+
+    def __get_transaction_session(self) -> AsyncSession | None:
+        # Only the task that opened the unit of work joins it. Other tasks (e.g., background generations) use their own sessions.
+        if self.__transaction is not None and self.__transaction.owner is asyncio.current_task():
+            return self.__transaction.db
+        else:
+            return None
+
+    @asynccontextmanager
+    async def transaction(self) -> AsyncIterator[None]:
+        if self.__get_transaction_session() is not None:
+            # Nested units of work join the outer one.
+            yield
+            return
 
-    async def add_dialogue_message(self, message: DialogueMessage):
         async with self.get_sessionmaker() as db:
-            async with db.begin():
-                db.add(DialogueMessageORM.from_data_model(self.session_id, message))
+            try:
+                async with db.begin():
+                    self.__transaction = _ActiveTransaction(db=db, owner=asyncio.current_task())
+                    try:
+                        yield
+                    finally:
+                        self.__transaction = None
+            except BaseException:
+                # The dialogue view may contain rows read within the rolled-back transaction.
+                self.__reset_dialogue_view()
+                raise
+
+    @asynccontextmanager
+    async def __read_session(self) -> AsyncIterator[AsyncSession]:
+        db = self.__get_transaction_session()
+        if db is not None:
+            yield db
+        else:
+            async with self.get_sessionmaker() as db:
+                yield db
+
+    @asynccontextmanager
+    async def __write_session(self) -> AsyncIterator[AsyncSession]:
+        db = self.__get_transaction_session()
+        if db is not None:
+            yield db
+            # Keep the statement order of the unit of work.
+            await db.flush()
+        else:
+            async with self.get_sessionmaker() as db:
+                async with db.begin():
+                    yield db
+
+    async def get_session_info(self) -> SessionInfo:
+        async with self.__read_session() as db:
+            return await self.__load_session_info_impl(db, self.session_id)
+
+
+    async def add_dialogue_message(self, message: DialogueMessage):
+        async with self.__write_session() as db:
+            db.add(DialogueMessageORM.from_data_model(self.session_id, message))
 
     async def get_dialogue(self) -> Dialogue:
-        async with self.get_sessionmaker() as db:
-            statement = select(DialogueMessageORM).where(DialogueMessageORM.session_id == self.session_id).order_by(
-                col(DialogueMessageORM.timestamp).desc())
+        async with self.__read_session() as db:
+            statement = select(DialogueMessageORM).where(DialogueMessageORM.session_id == self.session_id)
+            if self.__dialogue_last_timestamp is not None:
+                statement = statement.where(
+                    DialogueMessageORM.timestamp >= self.__dialogue_last_timestamp - self.dialogue_refetch_window_ms)
+            statement = statement.order_by(col(DialogueMessageORM.timestamp).asc())
             results = await db.exec(statement)
-            return [msg.to_data_model() for msg in results]
+
+            new_messages = [orm.to_data_model() for orm in results if orm.id not in self.__dialogue_message_ids]
+            if len(new_messages) > 0:
+                self.__dialogue.extend(new_messages)
+                self.__dialogue_message_ids.update(message.id for message in new_messages)
+                # A late-committed row may be older than the ones already in the view.
+                self.__dialogue.sort(key=lambda message: message.timestamp)
+                self.__dialogue_last_timestamp = self.__dialogue[-1].timestamp
+
+            return list(self.__dialogue)
 
     async def get_latest_dialogue_message(self) -> DialogueMessage | None:
-        async with self.get_sessionmaker() as db:
+        async with self.__read_session() as db:
             statement = select(DialogueMessageORM).where(DialogueMessageORM.session_id == self.session_id).order_by(
                 col(DialogueMessageORM.timestamp).desc()).limit(1)
             results = await db.exec(statement)
@@ -63,17 +153,15 @@ class SQLSessionStorage(SessionStorage, SQLStorageBase):
                 return None
 
     async def add_card_recommendation_result(self, result: ChildCardRecommendationResult):
-        async with self.get_sessionmaker() as db:
-            async with db.begin():
-                db.add(ChildCardRecommendationResultORM.from_data_model(self.session_id, result))
+        async with self.__write_session() as db:
+            db.add(ChildCardRecommendationResultORM.from_data_model(self.session_id, result))
 
     async def add_parent_guide_recommendation_result(self, result: ParentGuideRecommendationResult):
-        async with self.get_sessionmaker() as db:
-            async with db.begin():
-                db.add(ParentGuideRecommendationResultORM.from_data_model(self.session_id, result))
+        async with self.__write_session() as db:
+            db.add(ParentGuideRecommendationResultORM.from_data_model(self.session_id, result))
         
     async def get_card_recommendation_result(self, recommendation_id: str) -> ChildCardRecommendationResult | None:
-        async with self.get_sessionmaker() as db:
+        async with self.__read_session() as db:
             statement = select(ChildCardRecommendationResultORM).where(
                 ChildCardRecommendationResultORM.id == recommendation_id)
             result = await db.exec(statement)
@@ -82,7 +170,7 @@ class SQLSessionStorage(SessionStorage, SQLStorageBase):
 
     async def get_parent_guide_recommendation_result(self,
                                                      recommendation_id: str) -> ParentGuideRecommendationResult | None:
-        async with self.get_sessionmaker() as db:
+        async with self.__read_session() as db:
             statement = select(ParentGuideRecommendationResultORM).where(
                 ParentGuideRecommendationResultORM.id == recommendation_id)
             result = await db.exec(statement)
@@ -90,12 +178,11 @@ class SQLSessionStorage(SessionStorage, SQLStorageBase):
             return orm.to_data_model() if orm is not None else None
 
     async def add_parent_example_message(self, message: ParentExampleMessage):
-        async with self.get_sessionmaker() as db:
-            async with db.begin():
-                db.add(ParentExampleMessageORM.from_data_model(self.session_id, message))
+        async with self.__write_session() as db:
+            db.add(ParentExampleMessageORM.from_data_model(self.session_id, message))
 
     async def get_parent_example_message(self, recommendation_id: str, guide_id: str) -> ParentExampleMessage | None:
-        async with self.get_sessionmaker() as db:
+        async with self.__read_session() as db:
             statement = (select(ParentExampleMessageORM)
                         .where(ParentExampleMessageORM.recommendation_id == recommendation_id)
                         .where(ParentExampleMessageORM.guide_id == guide_id))
@@ -103,10 +190,38 @@ class SQLSessionStorage(SessionStorage, SQLStorageBase):
             orm: ParentExampleMessageORM | None = result.first()
             return orm.to_data_model() if orm is not None else None
 
+    async def add_dialogue_inspection_record(self, record: DialogueInspectionRecord):
+        async with self.__write_session() as db:
+            db.add(DialogueInspectionRecordORM.from_data_model(self.session_id, record))
+
+    async def get_dialogue_inspection_record(self, message_id: str) -> DialogueInspectionRecord | None:
+        async with self.__read_session() as db:
+            statement = (select(DialogueInspectionRecordORM)
+                         .where(DialogueInspectionRecordORM.message_id == message_id)
+                         .order_by(col(DialogueInspectionRecordORM.timestamp).desc())
+                         .limit(1))
+            result = await db.exec(statement)
+            orm: DialogueInspectionRecordORM | None = result.first()
+            return orm.to_data_model() if orm is not None else None
+
+    async def add_parent_guide_feedback_record(self, record: ParentGuideFeedbackRecord):
+        async with self.__write_session() as db:
+            db.add(ParentGuideFeedbackRecordORM.from_data_model(self.session_id, record))
+
+    async def get_parent_guide_feedback_record(self, recommendation_id: str) -> ParentGuideFeedbackRecord | None:
+        async with self.__read_session() as db:
+            statement = (select(ParentGuideFeedbackRecordORM)
+                         .where(ParentGuideFeedbackRecordORM.recommendation_id == recommendation_id)
+                         .order_by(col(ParentGuideFeedbackRecordORM.timestamp).desc(),
+                                   col(ParentGuideFeedbackRecordORM.resolved).desc())
+                         .limit(1))
+            result = await db.exec(statement)
+            orm: ParentGuideFeedbackRecordORM | None = result.first()
+            return orm.to_data_model() if orm is not None else None
+
     async def add_card_selection(self, selection: InterimCardSelection):
-        async with self.get_sessionmaker() as db:
-            async with db.begin():
-                db.add(InterimCardSelectionORM.from_data_model(self.session_id, selection))
+        async with self.__write_session() as db:
+            db.add(InterimCardSelectionORM.from_data_model(self.session_id, selection))
 
     async def __get_latest_model(self, db: AsyncSession, model: type[SessionIdMixin], timestamp_column: any = None, turn_id: str | None = None) -> SessionIdMixin | None:
 
@@ -128,7 +243,7 @@ class SQLSessionStorage(SessionStorage, SQLStorageBase):
             return None
 
     async def get_latest_card_selection(self, turn_id=None) -> InterimCardSelection | None:
-        async with self.get_sessionmaker() as db:
+        async with self.__read_session() as db:
             d = await self.__get_latest_model(db, InterimCardSelectionORM, turn_id=turn_id)
             if d is not None and isinstance(d, InterimCardSelectionORM):
                 return d.to_data_model()
@@ -136,7 +251,7 @@ class SQLSessionStorage(SessionStorage, SQLStorageBase):
                 return None
 
     async def get_latest_parent_guide_recommendation(self, turn_id=None) -> ParentGuideRecommendationResult | None:
-        async with self.get_sessionmaker() as db:
+        async with self.__read_session() as db:
             d = await self.__get_latest_model(db, ParentGuideRecommendationResultORM, turn_id=turn_id)
             if d is not None and isinstance(d, ParentGuideRecommendationResultORM):
                 return d.to_data_model()
@@ -144,7 +259,7 @@ class SQLSessionStorage(SessionStorage, SQLStorageBase):
                 return None
 
     async def get_latest_child_card_recommendation(self, turn_id=None) -> ChildCardRecommendationResult | None:
-        async with self.get_sessionmaker() as db:
+        async with self.__read_session() as db:
             d = await self.__get_latest_model(db, ChildCardRecommendationResultORM, turn_id=turn_id)
             if d is not None and isinstance(d, ChildCardRecommendationResultORM):
                 return d.to_data_model()
@@ -152,42 +267,32 @@ class SQLSessionStorage(SessionStorage, SQLStorageBase):
                 return None
 
     async def delete_entities(self):
-        async with self.get_sessionmaker() as db:
-            async with db.begin():
-                for model in [DialogueMessageORM, ChildCardRecommendationResultORM, InterimCardSelectionORM, ParentGuideRecommendationResultORM, ParentExampleMessageORM]:
-                    rows = await db.exec(select(model).where(model.session_id == self.session_id))
-                    for row in rows:
-                        await db.delete(row)
+        self.__reset_dialogue_view()
+
+        async with self.__write_session() as db:
+            for model in [DialogueInspectionRecordORM, ParentGuideFeedbackRecordORM, DialogueMessageORM, ChildCardRecommendationResultORM, InterimCardSelectionORM, ParentGuideRecommendationResultORM, ParentExampleMessageORM]:
+                rows = await db.exec(select(model).where(model.session_id == self.session_id))
+                for row in rows:
+                    await db.delete(row)
 
     async def update_session_info(self, info: SessionInfo):
-        async with self.get_sessionmaker() as db:
-            async with db.begin():
-                orig_orm = await self.__load_session_info_impl(db, info.id)
-                if orig_orm is None:
-                    db.add(SessionORM.from_data_model(info))
-                else:
-                    # Update
-                    statement = update(SessionORM).where(
-                        SessionORM.id == info.id
-                    ).values(**SessionORM.from_data_model(info).model_dump(exclude={"id", "dyad_id"}))
-                    await db.exec(statement)
+        async with self.__write_session() as db:
+            orm = SessionORM.from_data_model(info)
+            statement = self._make_upsert_statement(db, SessionORM,
+                                                    values=orm.model_dump(exclude={"created_at", "updated_at"}),
+                                                    update_values=orm.model_dump(exclude={"id", "dyad_id", "created_at", "updated_at"}))
+            await db.exec(statement)
 
     async def upsert_dialogue_turn(self, turn: DialogueTurn):
-        async with self.get_sessionmaker() as db:
-            async with db.begin():
-                orig_orm = await db.get(DialogueTurnORM, turn.id)
-                if orig_orm is not None:
-                    # Update
-                    statement = update(DialogueTurnORM).where(
-                        DialogueTurnORM.id == turn.id
-                    ).values(**turn.model_dump(exclude={"id"}))
-                    await db.exec(statement)
-                else:
-                    # Insert
-                    db.add(DialogueTurnORM.from_data_model(turn, self.session_id))
+        async with self.__write_session() as db:
+            orm = DialogueTurnORM.from_data_model(turn, self.session_id)
+            statement = self._make_upsert_statement(db, DialogueTurnORM,
+                                                    values=orm.model_dump(exclude={"created_at", "updated_at"}),
+                                                    update_values=turn.model_dump(exclude={"id"}))
+            await db.exec(statement)
 
     async def get_latest_turn(self) -> DialogueTurn | None:
-        async with self.get_sessionmaker() as db:
+        async with self.__read_session() as db:
             d = await self.__get_latest_model(db, DialogueTurnORM, DialogueTurnORM.started_timestamp)
             if d is not None and isinstance(d, DialogueTurnORM):
                 return d.to_data_model()
@@ -195,7 +300,6 @@ class SQLSessionStorage(SessionStorage, SQLStorageBase):
                 return None
 
     async def add_interaction(self, interaction: Interaction):
-        async with self.get_sessionmaker() as db:
-            async with db.begin():
-                db.add(InteractionORM.from_data_model(interaction, self.session_id))
+        async with self.__write_session() as db:
+            db.add(InteractionORM.from_data_model(interaction, self.session_id))
 
@@ -1,4 +1,8 @@
+from typing import Any
+
+from sqlmodel import SQLModel, func
 from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker
 
 class SQLStorageBase:
@@ -11,4 +15,20 @@ class SQLStorageBase:
 
     @classmethod
     def get_sessionmaker(cls)-> sessionmaker[AsyncSession]:
-        return cls.__sql_session_maker()
\ No newline at end of file
+        return cls.__sql_session_maker()
+
+    @staticmethod
+    def _make_upsert_statement(db: AsyncSession, model: type[SQLModel], values: dict[str, Any], update_values: dict[str, Any]):
+        # Single-statement INSERT ... ON CONFLICT (id) DO UPDATE, so that no read is needed before the write.
+        dialect_name = db.get_bind().dialect.name
+        if dialect_name == "postgresql":
+            insert = postgresql.insert
+        elif dialect_name == "sqlite":
+            insert = sqlite.insert
+        else:
+            raise NotImplementedError(f"Upsert is not supported for {dialect_name}.")
+
+        return insert(model).values(**values).on_conflict_do_update(
+            index_elements=[model.id],
+            set_={**update_values, "updated_at": func.now()}
+        )
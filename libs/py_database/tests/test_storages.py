@@ -0,0 +1,202 @@
+import asyncio
+
+from sqlalchemy import BigInteger, inspect, text
+from sqlmodel import SQLModel
+
+from py_core.system.guide_categories import DialogueInspectionCategory
+from py_core.system.model import (CardCategory, CardInfo, ChildCardRecommendationResult, ChildGender,
+                                  DialogueInspectionRecord, DialogueMessage, DialogueRole, DialogueTurn,
+                                  ParentGuideElement, ParentGuideFeedbackRecord, ParentType, SessionInfo,
+                                  SessionStatus, UserDefinedCardInfo)
+from py_core.system.session_topic import SessionTopicCategory, SessionTopicInfo
+from py_database import SQLSessionStorage, SQLUserStorage
+from py_database.database import (column_exists_in_db, create_database_engine, create_db_and_tables,
+                                  make_async_session_maker)
+from py_database.model import DyadORM
+
+
+async def _with_database(database_url: str, body):
+    engine = create_database_engine(database_url)
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.drop_all)
+        await create_db_and_tables(engine)
+
+        session_maker = make_async_session_maker(engine)
+        SQLSessionStorage.set_session_maker(session_maker)
+        SQLUserStorage.set_session_maker(session_maker)
+
+        async with session_maker() as db:
+            async with db.begin():
+                dyad = DyadORM(alias="test", child_name="Child", parent_type=ParentType.Mother,
+                               child_gender=ChildGender.Boy)
+                db.add(dyad)
+
+        await body(engine, dyad.id)
+    finally:
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.drop_all)
+        await engine.dispose()
+
+
+def test_migration_is_idempotent(database_url):
+    async def body(engine, dyad_id):
+        assert await column_exists_in_db(engine, DyadORM, "locale")
+        await create_db_and_tables(engine)
+
+    asyncio.run(_with_database(database_url, body))
+
+
+def test_timestamp_columns_are_widened(database_url):
+    async def body(engine, dyad_id):
+        if engine.dialect.name == "postgresql":
+            # As created before the timestamp columns were declared BigInteger.
+            async with engine.begin() as conn:
+                await conn.execute(text('ALTER TABLE message ALTER COLUMN "timestamp" TYPE INTEGER'))
+
+        await create_db_and_tables(engine)
+
+        async with engine.connect() as conn:
+            columns = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_columns("message"))
+        timestamp_column = next(column for column in columns if column["name"] == "timestamp")
+        assert isinstance(timestamp_column["type"], BigInteger)
+
+    asyncio.run(_with_database(database_url, body))
+
+
+def test_session_info_and_turn_upsert(database_url):
+    async def body(engine, dyad_id):
+        info = SessionInfo(dyad_id=dyad_id, topic=SessionTopicInfo(category=SessionTopicCategory.Plan),
+                           local_timezone="Asia/Shanghai")
+        storage = SQLSessionStorage(info.id)
+
+        await storage.update_session_info(info)
+        info.status = SessionStatus.Conversation
+        await storage.update_session_info(info)
+        assert (await storage.get_session_info()).status == SessionStatus.Conversation
+
+        turn = DialogueTurn(role=DialogueRole.Parent)
+        await storage.upsert_dialogue_turn(turn)
+        turn.ended_timestamp = turn.started_timestamp + 1
+        await storage.upsert_dialogue_turn(turn)
+
+        latest_turn = await storage.get_latest_turn()
+        assert latest_turn.id == turn.id
+        assert latest_turn.ended_timestamp == turn.ended_timestamp
+
+    asyncio.run(_with_database(database_url, body))
+
+
+def test_json_columns_and_transaction(database_url):
+    async def body(engine, dyad_id):
+        info = SessionInfo(dyad_id=dyad_id, topic=SessionTopicInfo(category=SessionTopicCategory.Free),
+                           local_timezone="Asia/Shanghai")
+        storage = SQLSessionStorage(info.id)
+        await storage.update_session_info(info)
+
+        turn = DialogueTurn(role=DialogueRole.Child)
+        recommendation = ChildCardRecommendationResult(turn_id=turn.id, cards=[
+            CardInfo(recommendation_id="rec", label="Apple", label_localized="苹果", category=CardCategory.Topic)
+        ])
+        async with storage.transaction():
+            await storage.upsert_dialogue_turn(turn)
+            await storage.add_card_recommendation_result(recommendation)
+
+        loaded = await storage.get_latest_child_card_recommendation(turn_id=turn.id)
+        assert loaded.cards[0].label_localized == "苹果"
+
+        try:
+            async with storage.transaction():
+                await storage.add_dialogue_message(
+                    DialogueMessage(role=DialogueRole.Child, content=recommendation.cards, turn_id=turn.id))
+                raise ValueError()
+        except ValueError:
+            pass
+
+        assert await storage.get_dialogue() == []
+
+    asyncio.run(_with_database(database_url, body))
+
+
+def test_dialogue_picks_up_late_committed_messages(database_url):
+    async def body(engine, dyad_id):
+        info = SessionInfo(dyad_id=dyad_id, topic=SessionTopicInfo(category=SessionTopicCategory.Plan),
+                           local_timezone="Asia/Shanghai")
+        storage = SQLSessionStorage(info.id)
+        await storage.update_session_info(info)
+
+        turn = DialogueTurn(role=DialogueRole.Parent)
+        await storage.upsert_dialogue_turn(turn)
+
+        # The older message is committed after the newer one was fetched.
+        older = DialogueMessage(role=DialogueRole.Parent, content="Older", turn_id=turn.id, timestamp=1000)
+        newer = DialogueMessage(role=DialogueRole.Parent, content="Newer", turn_id=turn.id, timestamp=2000)
+
+        await storage.add_dialogue_message(newer)
+        assert [m.id for m in await storage.get_dialogue()] == [newer.id]
+
+        await storage.add_dialogue_message(older)
+        assert [m.id for m in await storage.get_dialogue()] == [older.id, newer.id]
+
+        latest = DialogueMessage(role=DialogueRole.Parent, content="Latest", turn_id=turn.id, timestamp=3000)
+        await storage.add_dialogue_message(latest)
+        assert [m.id for m in await storage.get_dialogue()] == [older.id, newer.id, latest.id]
+
+    asyncio.run(_with_database(database_url, body))
+
+
+def test_user_defined_cards(database_url):
+    async def body(engine, dyad_id):
+        storage = SQLUserStorage(dyad_id)
+        card = UserDefinedCardInfo(label_localized="小狗", category=CardCategory.Topic,
+                                   image_filename=None, image_width=None, image_height=None)
+        await storage.register_user_defined_card(card)
+
+        queried = await storage.query_user_defined_card(CardCategory.Topic, "小狗")
+        assert queried.id == card.id
+
+    asyncio.run(_with_database(database_url, body))
+
+
+def test_dialogue_inspection_record(database_url):
+    async def body(engine, dyad_id):
+        info = SessionInfo(dyad_id=dyad_id, topic=SessionTopicInfo(category=SessionTopicCategory.Plan),
+                           local_timezone="Asia/Shanghai")
+        storage = SQLSessionStorage(info.id)
+        await storage.update_session_info(info)
+
+        assert await storage.get_dialogue_inspection_record("message") is None
+
+        await storage.add_dialogue_inspection_record(DialogueInspectionRecord(
+            message_id="message", categories=[DialogueInspectionCategory.Blame], feedback="Feedback"))
+
+        record = await SQLSessionStorage(info.id).get_dialogue_inspection_record("message")
+        assert record.categories == [DialogueInspectionCategory.Blame]
+        assert record.feedback == "Feedback"
+
+    asyncio.run(_with_database(database_url, body))
+
+
+def test_parent_guide_feedback_record(database_url):
+    async def body(engine, dyad_id):
+        info = SessionInfo(dyad_id=dyad_id, topic=SessionTopicInfo(category=SessionTopicCategory.Plan),
+                           local_timezone="Asia/Shanghai")
+        storage = SQLSessionStorage(info.id)
+        await storage.update_session_info(info)
+
+        assert await storage.get_parent_guide_feedback_record("recommendation") is None
+
+        pending = ParentGuideFeedbackRecord(recommendation_id="recommendation")
+        await storage.add_parent_guide_feedback_record(pending)
+        assert (await storage.get_parent_guide_feedback_record("recommendation")).resolved is False
+
+        guide = ParentGuideElement.feedback([DialogueInspectionCategory.Blame], "Feedback")
+        # Resolved within the same millisecond still wins over the pending record.
+        await storage.add_parent_guide_feedback_record(ParentGuideFeedbackRecord(
+            recommendation_id="recommendation", resolved=True, guide=guide, timestamp=pending.timestamp))
+
+        record = await SQLSessionStorage(info.id).get_parent_guide_feedback_record("recommendation")
+        assert record.resolved is True
+        assert record.guide == guide
+
+    asyncio.run(_with_database(database_url, body))